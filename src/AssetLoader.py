@@ -0,0 +1,148 @@
+# Background strand asset loading.
+# Parsing an asset and encoding it in the storage format run on a worker thread, the upload is recorded in slices of
+# at most Budgets.BYTE_SIZE_STRAND_UPLOAD_SLICE bytes, one per frame (update). The asset only becomes resident and
+# active once its last slice is scheduled, so the previous strands keep rendering until then. A new request supersedes
+# the load in flight.
+# The active strands are pinned in the pools during the upload. An asset that only fits in their place replaces them
+# in a single frame instead: evicted, uploaded whole and swapped in the same update, so no frame renders neither.
+
+import coalpy.gpu as gpu
+
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from src import Budgets
+from src import StrandDeviceMemory
+from src import StrandFactory
+from src import StrandOrder
+
+
+class LoadState(Enum):
+    IDLE = 0
+    PARSING = 1
+    UPLOADING = 2
+
+
+def parse(device_memory, asset, curve):
+    # Worker thread: the parsed (and reordered) strands and their encoded positions.
+    strands = StrandFactory.build_from_asset(asset, curve)
+
+    # build_from_asset reports a missing or unreadable file and returns no strands, they'd replace the active ones.
+    if strands.strand_count == 0:
+        raise ValueError("no strands in asset '{}'".format(asset))
+
+    words, bounds = device_memory.encode(strands.strand_count, strands.strand_particle_count,
+                                         strands.particle_positions)
+
+    return strands, words, bounds
+
+
+class AssetLoader:
+
+    def __init__(self, device_memory: StrandDeviceMemory.StrandDeviceMemory,
+                 slice_byte_size=Budgets.BYTE_SIZE_STRAND_UPLOAD_SLICE):
+        self.device_memory = device_memory
+        self.slice_byte_size = slice_byte_size
+
+        self.executor = ThreadPoolExecutor(1)
+
+        # Asset in flight and its residency key (see StrandOrder.get_asset_key).
+        self.asset = None
+        self.key = None
+        self.future = None
+        self.strands = None
+        self.upload = None
+
+        # Encoded strands that only fit in place of the active ones, see update.
+        self.encoded = None
+
+    @property
+    def state(self):
+        if self.upload is not None or self.encoded is not None:
+            return LoadState.UPLOADING
+
+        return LoadState.PARSING if self.future is not None else LoadState.IDLE
+
+    @property
+    def progress(self):
+        return self.upload.progress if self.upload is not None else 0.0
+
+    def request(self, asset, curve=StrandOrder.Curve.NONE):
+        self.cancel()
+
+        self.asset = asset
+        self.key = StrandOrder.get_asset_key(asset, curve)
+        self.future = self.executor.submit(parse, self.device_memory, asset, curve)
+
+    def cancel(self):
+        # The worker can't be interrupted, a parse in flight finishes and is dropped.
+        if self.future is not None:
+            self.future.cancel()
+
+        if self.upload is not None:
+            self.device_memory.cancel_upload(self.key)
+
+        self.asset = None
+        self.key = None
+        self.future = None
+        self.strands = None
+        self.upload = None
+        self.encoded = None
+
+    def update(self):
+        # Called once per frame, records the next upload slice. Returns the strands of the load that completed this
+        # frame (resident and active in the device memory), None otherwise.
+        if self.future is not None and self.future.done():
+            future = self.future
+            self.future = None
+
+            try:
+                # Any error of the worker (a missing or malformed file) ends the load, not the frame.
+                self.strands, words, bounds = future.result()
+            except Exception as e:
+                print("Could not load {}: {}".format(self.asset, e))
+                self.cancel()
+                return None
+
+            try:
+                self.upload = self.device_memory.begin_upload(self.key, self.strands.strand_count,
+                                                              self.strands.strand_particle_count, words, bounds,
+                                                              evict_active=False)
+            except ValueError:
+                self.encoded = (words, bounds)
+
+        slice_byte_size = self.slice_byte_size
+
+        if self.encoded is not None:
+            # Only fits in place of the active strands, the whole upload and the swap happen this frame.
+            try:
+                self.upload = self.device_memory.begin_upload(self.key, self.strands.strand_count,
+                                                              self.strands.strand_particle_count, *self.encoded)
+            except ValueError as e:
+                print("Could not load {}: {}".format(self.asset, e))
+                self.cancel()
+                return None
+
+            self.encoded = None
+            slice_byte_size = None
+
+        if self.upload is None:
+            return None
+
+        cmd = gpu.CommandList()
+        self.upload.record(cmd, slice_byte_size)
+        gpu.schedule(cmd)
+
+        if not self.upload.done:
+            return None
+
+        # The swap: the strands are resident and replace the active ones at once.
+        self.device_memory.end_upload(self.upload)
+        self.device_memory.use(self.key)
+
+        strands = self.strands
+        self.asset = None
+        self.key = None
+        self.strands = None
+        self.upload = None
+
+        return strands
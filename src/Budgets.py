@@ -1,4 +1,7 @@
 # GPU Memory Allocation Budgets, and Hardware Resource Limits.
+# The format byte sizes and packing bits come from the storage formats declared in Schema.py.
+
+from src import Schema
 
 # Geometry + Input
 # --------------------------------------------------------------
@@ -6,37 +9,50 @@
 # Primitive Cap
 MAX_SEGMENTS                    = 1 << 22
 
-# VBO
-BYTE_SIZE_VERTEX_POOL           = 32 * 1024 * 1024
-BYTE_SIZE_VERTEX_FORMAT         = 4 + 4
-
-# IBO
-BYTE_SIZE_INDEX_POOL            = 32 * 1024 * 1024
-BYTE_SIZE_INDEX_FORMAT          = 4
-
 # Strand Data
 BYTE_SIZE_STRAND_DATA_POOL      = 32 * 1024 * 1024
-BYTE_SIZE_STRAND_DATA_FORMAT    = 4 * 3
+BYTE_SIZE_STRAND_DATA_FORMAT    = Schema.STRAND_DATA.byte_size
+
+# Strand data uploaded per frame by background loads (see AssetLoader.py).
+BYTE_SIZE_STRAND_UPLOAD_SLICE   = 2 * 1024 * 1024
+
+# Quantized Strand Data (see StrandDeviceMemory.PositionFormat), the pool holds as many positions as the float pool.
+BYTE_SIZE_STRAND_BOUNDS_POOL    = 1 * 1024 * 1024
+BYTE_SIZE_STRAND_BOUNDS_FORMAT  = Schema.STRAND_BOUNDS.byte_size
+STRANDS_PER_CLUSTER             = 32
+
+# Strand Instances (see StrandScene.py), placed copies of the strand data.
+MAX_STRAND_INSTANCES            = 4096
+BYTE_SIZE_STRAND_INSTANCE_FORMAT = Schema.STRAND_INSTANCE.byte_size
 
 # Geometry Processing
 # --------------------------------------------------------------
 
 # Vertex Output
 BYTE_SIZE_VERTEX_OUTPUT_POOL    = 16 * 1024 * 1024
-BYTE_SIZE_VERTEX_OUTPUT_FORMAT  = (4 * 4) + 4
+BYTE_SIZE_VERTEX_OUTPUT_FORMAT  = Schema.VERTEX_OUTPUT.byte_size  # NDC xy, 24 bit depth and flags (see Formats.py)
 
 # Segment Setup
 BYTE_SIZE_SEGMENT_POOL          = 32 * 1024 * 1024
-BYTE_SIZE_SEGMENT_HEADER_FORMAT = 4 * 4
-BYTE_SIZE_SEGMENT_DATA_FORMAT   = 4 * 2
+BYTE_SIZE_SEGMENT_HEADER_FORMAT = Schema.SEGMENT_RECORD.byte_size  # Clipped NDC end points, 16 bit unorm
+BYTE_SIZE_SEGMENT_DATA_FORMAT   = Schema.SEGMENT_DATA.byte_size
+
+# Segment Compaction, the first segment index of every surviving segment (or curve).
+BYTE_SIZE_COMPACTED_SEGMENT_FORMAT = 4
 
 # Binning
 # --------------------------------------------------------------
 
 BYTE_SIZE_BIN_RECORD_POOL       = 128 * 1024 * 1024
-BYTE_SIZE_BIN_RECORD_FORMAT     = 4 + 4 + 4
+BYTE_SIZE_BIN_RECORD_FORMAT     = Schema.BIN_RECORD.byte_size
 TILE_SIZE_BIN                   = 16
 
+# Bits of the packed bin record: segment index, offset in the bin and bin index (of every view).
+BIN_RECORD_SEGMENT_BITS         = Schema.BIN_RECORD_SEGMENT_BITS
+BIN_RECORD_OFFSET_BITS          = Schema.BIN_RECORD_OFFSET_BITS
+BIN_RECORD_BIN_BITS             = Schema.BIN_RECORD_BIN_BITS
+MAX_BINS                        = 1 << BIN_RECORD_BIN_BITS
+
 # Work Queue
 # --------------------------------------------------------------
 
@@ -46,8 +62,8 @@ BYTE_SIZE_WORK_QUEUE_FORMAT     = 4
 # Brute
 # --------------------------------------------------------------
 
-# Color, coverage, depth, next
-BYTE_SIZE_FRAGMENT_DATA_FORMAT  = (4 * 4) + 4 + 4
+# Color, depth, next
+BYTE_SIZE_FRAGMENT_DATA_FORMAT  = Schema.FRAGMENT_DATA.byte_size
 
 # Allow roughly 4 fragment list depth for every pixel in a 1920x1080 resolution window.
 BYTE_SIZE_FRAGMENT_DATA_POOL    = 200 * 1024 * 1024
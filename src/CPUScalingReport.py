@@ -0,0 +1,97 @@
+# Reports how the CPU renderers scale with the worker count for a large still rendered on a CPU render node:
+# the process pool (RasterizerCPUTiled.py) and the thread pool (RasterizerCPUThreaded.py) fine resolve.
+
+import os
+import time
+import numpy as np
+
+from src import Camera
+from src import Vector
+from src import CurveReference
+from src import StrandFactory
+from src import RasterizerCPU
+from src import RasterizerCPUTiled
+from src import RasterizerCPUThreaded
+
+
+def build_context(strands, vertices, target, w, h, oit):
+    camera = Camera.Camera(w, h)
+    camera.pos = Vector.float3(0.0, 0.0, -10.690)
+    camera.transform.update_mats()
+
+    return RasterizerCPU.Context(
+        w, h,
+        camera.view_matrix,
+        camera.proj_matrix,
+        vertices,
+        strands.strand_count,
+        strands.strand_particle_count,
+        target,
+        oit
+    )
+
+
+def get_worker_counts():
+    counts = []
+    c = 1
+    while c < os.cpu_count():
+        counts.append(c)
+        c *= 2
+    return counts + [os.cpu_count()]
+
+
+def run(asset="fur_field", w=3840, h=2160, worker_counts=None, frame_count=3, oit=True):
+    strands = StrandFactory.build_from_asset(asset)
+    vertices = CurveReference.get_strand_vertices(strands)
+
+    # Single thread baseline.
+    rasterizer = RasterizerCPU.RasterizerCPU(w, h)
+    context = build_context(strands, vertices, np.zeros((h, w, 4), dtype='f'), w, h, oit)
+
+    t0 = time.perf_counter()
+    for i in range(frame_count):
+        rasterizer.go(context)
+    serial_ms = 1000.0 * (time.perf_counter() - t0) / frame_count
+
+    reference = context.target
+
+    print("{} ({}x{}{}, {} frames, {} cores), milliseconds per frame".format(
+        asset, w, h, ", OIT" if oit else "", frame_count, os.cpu_count()))
+    print("  {:<10} {:<8} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "mode", "workers", "setup", "fine", "total", "speedup", "efficiency"))
+    print("  {:<10} {:<8} {:>10} {:>10} {:>10.1f} {:>10.2f} {:>10}".format("serial", 1, "", "", serial_ms, 1.0, ""))
+
+    for mode, renderer_type in [("processes", RasterizerCPUTiled.RasterizerCPUTiled),
+                                ("threads", RasterizerCPUThreaded.RasterizerCPUThreaded)]:
+        for worker_count in (worker_counts or get_worker_counts()):
+            renderer = renderer_type(w, h, worker_count)
+
+            if renderer_type is RasterizerCPUTiled.RasterizerCPUTiled:
+                target = renderer.create_target()
+            else:
+                target = np.zeros((h, w, 4), dtype='f')
+
+            context = build_context(strands, vertices, target, w, h, oit)
+
+            # Warm up the pool (and the shared memory blocks).
+            renderer.go(context)
+
+            setup_ms, fine_ms = 0.0, 0.0
+            for i in range(frame_count):
+                renderer.go(context)
+                setup_ms += renderer.timings["setup"] / frame_count
+                fine_ms += renderer.timings["fine"] / frame_count
+
+            if not np.array_equal(context.target, reference):
+                print("  warning: {} {} don't match the serial image".format(worker_count, mode))
+
+            total_ms = setup_ms + fine_ms
+            print("  {:<10} {:<8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.2f} {:>9.0f}%".format(
+                mode, worker_count, setup_ms, fine_ms, total_ms, serial_ms / total_ms,
+                100.0 * serial_ms / total_ms / worker_count))
+
+            renderer.release()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,166 @@
+# NumPy reference of the cubic curve coverage in RasterCommon.hlsl, used to measure the
+# error and cost of the adaptive per-curve sample count against the fixed sample count.
+
+import math
+import numpy as np
+
+from src import Utility
+from src import StrandFactory
+
+# Sample count used as the ground truth distance to the curve.
+REFERENCE_SAMPLE_COUNT = 256
+
+
+def distance_to_segment_and_t_value_sq(p, a, b):
+    # Vectorized DistanceToSegmentAndTValueSq, p is (N, 2) and a, b are (2,).
+    ba = b - a
+    pa = p - a
+
+    denominator = np.dot(ba, ba)
+    t = np.clip((pa @ ba) / denominator, 0.0, 1.0) if denominator > 0 else np.zeros(len(p))
+
+    v = pa - t[:, None] * ba
+    return np.einsum('ij,ij->i', v, v), t
+
+
+def evaluate_cubic_bezier(control_points, t):
+    a, b, c, d = control_points
+    s = 1 - t
+    return (np.outer(s * s * s, a) + np.outer(3 * s * s * t, b) +
+            np.outer(3 * s * t * t, c) + np.outer(t * t * t, d))
+
+
+def distance_to_cubic_bezier_and_t_value(p, control_points, sample_count=10):
+    # Mirror of DistanceToCubicBezierAndTValue, p is (N, 2) and control_points is (4, 2).
+    sample_count = int(sample_count)
+    samples = evaluate_cubic_bezier(control_points, np.arange(sample_count) / (sample_count - 1.0))
+
+    res_d = np.full(len(p), 1e10)
+    res_t = np.zeros(len(p))
+
+    for i in range(1, sample_count):
+        d, _ = distance_to_segment_and_t_value_sq(p, samples[i - 1], samples[i])
+
+        closer = d < res_d
+        res_d[closer] = d[closer]
+        res_t[closer] = i / (sample_count - 1.0)
+
+    return np.sqrt(res_d), res_t
+
+
+def compute_curve_sample_count(control_points, w, h, error_bound, max_sample_count):
+    # Mirror of ComputeCurveSampleCount, control_points is (C, 4, 2) in NDC.
+    cp = control_points * (0.5 * np.array([w, h]))
+
+    d0 = cp[:, 0] - 2 * cp[:, 1] + cp[:, 2]
+    d1 = cp[:, 1] - 2 * cp[:, 2] + cp[:, 3]
+    m = np.sqrt(np.maximum(np.einsum('ij,ij->i', d0, d0), np.einsum('ij,ij->i', d1, d1)))
+
+    segments = np.ceil(np.sqrt(0.75 * m / max(error_bound, 1e-3)))
+
+    polygon_length = np.linalg.norm(np.diff(cp, axis=1), axis=2).sum(axis=1)
+    segments = np.minimum(segments, np.ceil(polygon_length))
+
+    return np.clip(segments.astype(np.int64) + 1, 2, max_sample_count)
+
+
+def get_curve_sample_count(control_points, w, h, sample_count, error_bound):
+    # Mirror of GetCurveSampleCount, a zero error bound selects the fixed sample count.
+    if error_bound <= 0:
+        return np.full(len(control_points), int(sample_count))
+
+    return compute_curve_sample_count(control_points, w, h, error_bound, sample_count)
+
+
+def get_strand_vertices(strands: StrandFactory.Strands):
+    # Gather the particle positions in vertex ID order (the order VertexSetup writes them in).
+    begin, stride, _ = Utility.get_strand_iterator(strands.memory_layout, np.arange(strands.strand_count)[:, None],
+                                                   strands.strand_count, strands.strand_particle_count)
+    order = (begin + stride * np.arange(strands.strand_particle_count)).reshape(-1)
+
+    return strands.particle_positions["strandPositionOS"][order]
+
+
+def get_curve_control_points(vertices, strand_count, strand_particle_count):
+    # Mirror of LoadControlPoints, every curve is made from three consecutive segments.
+    segments_per_strand = strand_particle_count - 1
+    segment_count = strand_count * segments_per_strand
+
+    s = np.arange(0, segment_count - 2, 3)
+    vi0 = (s // segments_per_strand) * strand_particle_count + (s % segments_per_strand)
+    vi2 = ((s + 2) // segments_per_strand) * strand_particle_count + ((s + 2) % segments_per_strand)
+
+    return np.stack([vertices[vi0], vertices[vi0 + 1], vertices[vi2], vertices[vi2 + 1]], axis=1)
+
+
+def fit_to_viewport(control_points, margin=0.9):
+    # Orthographic projection of the xy plane, scaled so the asset fills the viewport.
+    xy = control_points[..., 0:2]
+    lo = xy.reshape(-1, 2).min(axis=0)
+    hi = xy.reshape(-1, 2).max(axis=0)
+    scale = 2.0 * margin / max(np.max(hi - lo), 1e-6)
+    return (xy - 0.5 * (lo + hi)) * scale
+
+
+def gather_covered_pixels(control_points, w, h, coverage_width=2.0):
+    # Pixel centers (NDC) within the coverage width of each curve, with their ground truth distance.
+    px = 2.0 / h
+    pad = coverage_width * px
+
+    covered = []
+    for cp in control_points:
+        lo = cp.min(axis=0) - pad
+        hi = cp.max(axis=0) + pad
+
+        x = (np.arange(math.floor((lo[0] + 1) * 0.5 * w), math.ceil((hi[0] + 1) * 0.5 * w)) + 0.5) * (2.0 / w) - 1
+        y = (np.arange(math.floor((lo[1] + 1) * 0.5 * h), math.ceil((hi[1] + 1) * 0.5 * h)) + 0.5) * (2.0 / h) - 1
+        p = np.stack(np.meshgrid(x, y), axis=-1).reshape(-1, 2)
+
+        # Cheap pre-pass so the ground truth is only evaluated close to the curve.
+        coarse, _ = distance_to_cubic_bezier_and_t_value(p, cp, 32)
+        p = p[coarse < 2 * pad]
+
+        reference, _ = distance_to_cubic_bezier_and_t_value(p, cp, REFERENCE_SAMPLE_COUNT)
+        covered.append((p[reference < pad], reference[reference < pad]))
+
+    return covered
+
+
+def measure(control_points, covered, h, sample_counts):
+    # Mean and max absolute distance error (pixels) over the pixels a curve can cover.
+    px = 2.0 / h
+
+    errors = [np.zeros(0)]
+    for cp, (p, reference), sample_count in zip(control_points, covered, sample_counts):
+        distance, _ = distance_to_cubic_bezier_and_t_value(p, cp, sample_count)
+        errors.append(np.abs(distance - reference) / px)
+
+    errors = np.concatenate(errors)
+    if len(errors) == 0:
+        return 0.0, 0.0
+
+    return float(np.mean(errors)), float(np.max(errors))
+
+
+def report(asset, w=1280, h=720, fixed_sample_counts=(4, 8, 12, 20), error_bounds=(1.0, 0.5, 0.25, 0.1)):
+    strands = StrandFactory.build_from_asset(asset)
+    vertices = get_strand_vertices(strands)
+    control_points = fit_to_viewport(get_curve_control_points(vertices, strands.strand_count,
+                                                              strands.strand_particle_count))
+    covered = gather_covered_pixels(control_points, w, h)
+
+    print("{} ({} curves, {}x{})".format(asset, len(control_points), w, h))
+    print("  {:<20} {:>14} {:>16} {:>16}".format("mode", "samples/curve", "mean error (px)", "max error (px)"))
+
+    modes = [("fixed {}".format(n), n, 0.0) for n in fixed_sample_counts]
+    modes += [("adaptive {:.2f}px".format(e), max(fixed_sample_counts), e) for e in error_bounds]
+
+    for name, sample_count, error_bound in modes:
+        sample_counts = get_curve_sample_count(control_points, w, h, sample_count, error_bound)
+        mean_error, max_error = measure(control_points, covered, h, sample_counts)
+        print("  {:<20} {:>14.2f} {:>16.4f} {:>16.4f}".format(name, np.mean(sample_counts), mean_error, max_error))
+
+
+if __name__ == "__main__":
+    report("bezier_dev_multiple")
+    report("cubic_bezier_test")
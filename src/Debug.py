@@ -6,12 +6,13 @@ from dataclasses import dataclass
 from src import Rasterizer
 from src import Utility
 from src import Budgets
+from src import ShaderCache
 
-TextureFont = gpu.Texture(file="DebugFont.jpg")
-SamplerFont = gpu.Sampler(filter_type=gpu.FilterType.Linear)
+TextureFont = ShaderCache.LazyTexture(file="DebugFont.jpg")
+SamplerFont = ShaderCache.LazySampler(filter_type=gpu.FilterType.Linear)
 
-s_count_clipped_segments = gpu.Shader(file="debug/DebugCountClippedSegments.hlsl", name="CountClippedSegments", main_function="CountClippedSegments")
-s_segments_per_tile      = gpu.Shader(file="debug/DebugSegmentsPerTile.hlsl", name="SegmentsPerTile", main_function="SegmentsPerTile")
+s_count_clipped_segments = ShaderCache.LazyShader(file="debug/DebugCountClippedSegments.hlsl", name="CountClippedSegments", main_function="CountClippedSegments")
+s_segments_per_tile      = ShaderCache.LazyShader(file="debug/DebugSegmentsPerTile.hlsl", name="SegmentsPerTile", main_function="SegmentsPerTile")
 
 
 @dataclass
@@ -43,7 +44,7 @@ class Debug:
                 rasterizer.b_segment_output
             ],
             outputs=self.b_frustum_segment_output,
-            shader=s_count_clipped_segments
+            shader=s_count_clipped_segments.get()
         )
 
         # Read back and report the result.
@@ -63,7 +64,7 @@ class Debug:
         group_dim_x = math.ceil(context.w / Budgets.TILE_SIZE_BIN)
 
         cmd.dispatch(
-            shader=s_segments_per_tile,
+            shader=s_segments_per_tile.get(),
 
             constants=[
                 group_dim_x,
@@ -72,12 +73,12 @@ class Debug:
             ],
 
             inputs=[
-                TextureFont,
+                TextureFont.get(),
                 rasterizer.b_bin_counters
             ],
 
             outputs=context.target,
-            samplers=SamplerFont,
+            samplers=SamplerFont.get(),
 
             x=math.ceil(context.w / Budgets.TILE_SIZE_BIN),
             y=math.ceil(context.h / Budgets.TILE_SIZE_BIN),
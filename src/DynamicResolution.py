@@ -0,0 +1,79 @@
+# Dynamic resolution scaling.
+# Holds a rasterizer time budget on heavy grooms by adjusting the internal render resolution, the frame is rendered into
+# the top left of the target at the reduced size and upscaled into the display texture (see FrameCache.present). The
+# raster cost is roughly proportional to the pixel (and so bin) count, so the scale is steered by the square root of the
+# budget over the measured time. The time is the GPU time of the rasterizer alone (see GpuTimer.py): the frame time also
+# holds the UI, the present and the wait for vsync, which never drop below the refresh interval however small the
+# resolution. The budget is below the refresh interval, to leave room for the rest of the frame. The internal size snaps
+# to whole bins and only changes past a dead band: each new size re-records the frame graph plan, while the resolution
+# dependent buffers only grow and are shared by all the smaller sizes
+# (see Rasterizer.update_resolution_dependent_buffers).
+
+import math
+import dataclasses
+
+from src import Budgets
+
+
+class DynamicResolution:
+
+    def __init__(self, budget_ms=12.0, min_scale=0.25, max_scale=1.0, smoothing=0.1, dead_band=0.1):
+        self.budget_ms = budget_ms
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+
+        # Weight of a new sample in the frame time average.
+        self.smoothing = smoothing
+
+        # Relative frame time error tolerated before the scale changes.
+        self.dead_band = dead_band
+
+        # Samples skipped after a change, the first frames at a new size also record its plan.
+        self.settle_frames = 2
+
+        self.scale = max_scale
+        self.frame_ms = None
+        self.skip = 0
+
+    def reset(self):
+        self.scale = self.max_scale
+        self.frame_ms = None
+        self.skip = 0
+
+    def update(self, frame_ms, scale=None):
+        # Feed the time of a frame rendered at scale (the current one if None), returns the new scale. The times are
+        # read back a few frames late, the ones of a previous scale are dropped.
+        if scale is not None and scale != self.scale:
+            return self.scale
+
+        if self.skip > 0:
+            self.skip -= 1
+            return self.scale
+
+        if self.frame_ms is None:
+            self.frame_ms = frame_ms
+        else:
+            self.frame_ms += self.smoothing * (frame_ms - self.frame_ms)
+
+        error = self.budget_ms / max(self.frame_ms, 1e-3)
+
+        scale = min(max(self.scale * math.sqrt(error), self.min_scale), self.max_scale)
+
+        if abs(error - 1.0) > self.dead_band and scale != self.scale:
+            self.scale = scale
+
+            # The average was measured at the old scale.
+            self.frame_ms = None
+            self.skip = self.settle_frames
+
+        return self.scale
+
+    def get_resolution(self, w, h):
+        # Internal resolution, in whole bins and never larger than the window.
+        tile = Budgets.TILE_SIZE_BIN
+        return (min(w, max(tile, tile * round(w * self.scale / tile))),
+                min(h, max(tile, tile * round(h * self.scale / tile))))
+
+    def apply(self, context):
+        w, h = self.get_resolution(context.w, context.h)
+        return dataclasses.replace(context, w=w, h=h)
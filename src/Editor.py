@@ -6,12 +6,18 @@ import numpy as np
 import sys
 import pathlib
 
+from src import AssetLoader
 from src import StrandFactory
 from src import StrandDeviceMemory
+from src import StrandOrder
+from src import StrandScene
 from src import Camera as c
 from src import Vector
 from src import Utility
 from src import Debug
+from src import TransientPool
+from src import Rasterizer
+from src import RasterizerBinned
 
 
 class Editor:
@@ -42,23 +48,53 @@ class Editor:
         # strand generation settings
         self.generation_settings = StrandFactory.Settings()
         self.strands_asset_name = ""
+        self.strand_order = StrandOrder.Curve.NONE
         self.device_memory = deviceMemory
         self.strands = strands
 
+        # assets load in the background, the current strands render until the new ones are uploaded
+        self.asset_loader = AssetLoader.AssetLoader(deviceMemory)
+
+        # Residency key of self.strands, the last parsed asset (switching to a resident asset doesn't parse it), and
+        # the asset and strand order of every key requested, to load them again (see rebuild_position_format).
+        self.strands_key = deviceMemory.active.key if deviceMemory.active is not None else None
+        self.asset_sources = {}
+
+        # instancing settings, copies of the strands on a grid (see StrandScene.py)
+        self.scene = StrandScene.StrandScene(deviceMemory)
+        self.instance_count = 1
+        self.instance_spacing = 1.5
+        self.instance_distance_lod = False
+        self.instance_lod_distance = 10.0
+        self.instance_error = ""
+
         # rasterizer settings
         self.debug_bin_overlay = 0.0
         self.tesselation = False
         self.tesselation_sample_count = 12
+        self.tesselation_adaptive = False
+        self.tesselation_error_bound = 0.25
         self.oit = True
         self.oit_heatmap_overlay = 0.0
         self.oit_opacity = 0.21 
+        self.oit_mode = Rasterizer.OITMode.SLICES
+        self.oit_kbuffer_size = 8
+        self.oit_slice_count = 128
+        self.idle_frame_reuse = True
+        self.progressive_refinement = True
+        self.dynamic_resolution = False
+        self.dynamic_resolution_budget = 12.0
+        self.internal_resolution = (0, 0)
+
+        # Whether the camera changed this frame.
+        self.camera_moving = False
 
         # ui panels states
         self.panel_camera  = True 
         self.panel_raster  = True
 
         try:
-            self.obj_file_list = [s for s in os.listdir("src/data/") if s.endswith(".obj")]
+            self.obj_file_list = [s for s in os.listdir("src/data/") if s.endswith((".obj", ".hair"))]
         except Exception as e:
             self.obj_file_list = []
             print("Could not create list of object files: " + e)
@@ -86,6 +122,8 @@ class Editor:
         self.editor_camera.h = h
         self.update_inputs(input_states)
 
+        prev_view_matrix = self.editor_camera.view_matrix.copy()
+
         if (self.pressed_can_move):
             cam_t = self.editor_camera.transform
             new_pos = self.editor_camera.pos
@@ -112,6 +150,11 @@ class Editor:
             self.editor_camera.transform.update_mats()
             self.position_mouse_last = (curr_mouse[2], curr_mouse[3])
 
+        self.camera_moving = not np.array_equal(prev_view_matrix, self.editor_camera.view_matrix)
+
+        if self.camera_moving and self.instance_distance_lod and self.scene.instances:
+            self.rebuild_instances()
+
     def update_mouse_pos(self, window):
         pos = window.get_mouse_position()
         self.mouse_pos = (pos[0], pos[1])
@@ -160,23 +203,82 @@ class Editor:
             if imgui.begin_combo("Strand asset", curr_asset):
                 for a in self.obj_file_list:
                     if imgui.selectable(a, curr_asset == a):
-                        curr_asset = a[:-4]
+                        curr_asset = os.path.splitext(a)[0]
                 self.strands_asset_name = curr_asset
                 imgui.end_combo()
             self.strands_asset_name = curr_asset
+            if imgui.begin_combo("Strand order", self.strand_order.name):
+                for curve in StrandOrder.Curve:
+                    if imgui.selectable(curve.name, self.strand_order == curve):
+                        self.strand_order = curve
+                imgui.end_combo()
             imgui.same_line()
             if imgui.button("Load"):
                 self.rebuild_strands_asset(self.strands_asset_name)
+            if self.asset_loader.state == AssetLoader.LoadState.PARSING:
+                imgui.text("Loading {} - parsing".format(self.asset_loader.asset))
+            elif self.asset_loader.state == AssetLoader.LoadState.UPLOADING:
+                imgui.text("Loading {} - uploading {:.0f}%".format(
+                    self.asset_loader.asset, 100.0 * self.asset_loader.progress))
+            position_format = self.device_memory.position_format
+            if imgui.begin_combo("Position format", position_format.name):
+                for f in StrandDeviceMemory.PositionFormat:
+                    if imgui.selectable(f.name, position_format == f):
+                        position_format = f
+                imgui.end_combo()
+            if position_format != self.device_memory.position_format:
+                self.rebuild_position_format(position_format)
+            imgui.text("Resident ({:.1f} / {:.0f} MB) - {}".format(
+                self.device_memory.resident_byte_size / (1024 * 1024),
+                self.device_memory.residency_budget / (1024 * 1024),
+                ", ".join(str(key) for key in self.device_memory.allocations)))
+
+        if imgui.collapsing_header("Instances"):
+            imgui.push_id("I")
+            # Up to the copies the pipeline budgets fit at full detail.
+            max_instance_count = min(100, self.scene.get_max_instance_count())
+            instance_count = int(imgui.slider_float(" Count", self.instance_count, 1, max_instance_count, "%.0f"))
+            instance_count = min(instance_count, max_instance_count)
+            instance_spacing = imgui.slider_float(" Spacing", self.instance_spacing, 0.5, 5, "%.2f")
+            instance_distance_lod = imgui.checkbox("Distance LOD", self.instance_distance_lod)
+            instance_lod_distance = self.instance_lod_distance
+
+            if instance_distance_lod:
+                instance_lod_distance = imgui.slider_float(" Full Detail Distance", instance_lod_distance, 1, 50, "%.1f")
+
+            settings = (instance_count, instance_spacing, instance_distance_lod, instance_lod_distance)
+
+            if settings != (self.instance_count, self.instance_spacing, self.instance_distance_lod,
+                            self.instance_lod_distance):
+                (self.instance_count, self.instance_spacing,
+                 self.instance_distance_lod, self.instance_lod_distance) = settings
+                self.rebuild_instances()
+
+            if self.instance_error:
+                imgui.text("Could not place the instances: {}".format(self.instance_error))
+            imgui.pop_id()
 
         if imgui.collapsing_header("Stats"):
             imgui.text("Total Segments ---------------- " + str(stats.segmentCount))
             imgui.text("Frustum Culled (Pass / Fail) -- {} / {}".format(stats.segmentCountPassedFrustumCull,
                                                                       stats.segmentCount - stats.segmentCountPassedFrustumCull))
             imgui.text("Debug Coordinate -------------- {}, {}".format(self.mouse_pos[0], self.mouse_pos[1]))
+            imgui.text("Transient Memory (Peak / Sum) - {:.0f} / {:.0f} MB".format(
+                TransientPool.default_pool.peak_footprint() / (1 << 20),
+                TransientPool.default_pool.summed_footprint() / (1 << 20)))
 
             debug_bin_overlay = imgui.slider_float(" Bin Overlay", self.debug_bin_overlay, 0, 1, "%.2f")
             self.debug_bin_overlay = debug_bin_overlay
 
+            self.idle_frame_reuse = imgui.checkbox("Reuse Idle Frames", self.idle_frame_reuse)
+            self.progressive_refinement = imgui.checkbox("Progressive Refinement", self.progressive_refinement)
+            self.dynamic_resolution = imgui.checkbox("Dynamic Resolution", self.dynamic_resolution)
+
+            if self.dynamic_resolution:
+                self.dynamic_resolution_budget = imgui.slider_float(" Raster Budget (ms)",
+                                                                    self.dynamic_resolution_budget, 4, 50, "%.1f")
+                imgui.text("Internal Resolution - {} x {}".format(*self.internal_resolution))
+
         if imgui.collapsing_header("Tesselation"):
             imgui.push_id("T")
             self.tesselation = imgui.checkbox("Enable", self.tesselation)
@@ -184,6 +286,12 @@ class Editor:
             if self.tesselation:
                 curve_samples = imgui.slider_float(" Samples", self.tesselation_sample_count, 2, 20, "%.0f")
                 self.tesselation_sample_count = int(curve_samples)
+
+                self.tesselation_adaptive = imgui.checkbox("Adaptive", self.tesselation_adaptive)
+
+                if self.tesselation_adaptive:
+                    error_bound = imgui.slider_float(" Error Bound (px)", self.tesselation_error_bound, 0.05, 2, "%.2f")
+                    self.tesselation_error_bound = error_bound
             imgui.pop_id()
 
         if imgui.collapsing_header("Order Independent Transparency"):
@@ -193,19 +301,101 @@ class Editor:
                 oit_opacity = imgui.slider_float(" Opacity", self.oit_opacity, 0, 1, "%.2f")
                 self.oit_opacity = oit_opacity
 
+                if imgui.begin_combo(" Mode", self.oit_mode.name):
+                    for mode in Rasterizer.OITMode:
+                        if imgui.selectable(mode.name, self.oit_mode == mode):
+                            self.oit_mode = mode
+                    imgui.end_combo()
+
+                if self.oit_mode in (Rasterizer.OITMode.SLICES, Rasterizer.OITMode.ADAPTIVE_SLICES):
+                    slice_count = imgui.slider_float(" Slices", self.oit_slice_count, 1, 128, "%.0f")
+                    self.oit_slice_count = int(slice_count)
+
+                if self.oit_mode == Rasterizer.OITMode.KBUFFER:
+                    if imgui.begin_combo(" K", str(self.oit_kbuffer_size)):
+                        for k in RasterizerBinned.OIT_KBUFFER_SIZES:
+                            if imgui.selectable(str(k), self.oit_kbuffer_size == k):
+                                self.oit_kbuffer_size = k
+                        imgui.end_combo()
+
                 oit_overlay = imgui.slider_float(" Fragments-per-Pixel Overlay", self.oit_heatmap_overlay, 0, 1, "%.2f")
                 self.oit_heatmap_overlay = oit_overlay
 
         imgui.end()
 
     def rebuild_strands_asset(self, asset):
-        # Create a default strand
         self.strands_asset_name = asset
-        self.strands = StrandFactory.build_from_asset(asset)
 
-        # Layout the initial memory and bind the position data
-        self.device_memory.layout(self.strands.strand_count, self.strands.strand_particle_count)
-        self.device_memory.bind_strand_position_data(self.strands.particle_positions)
+        key = StrandOrder.get_asset_key(asset, self.strand_order)
+        self.asset_sources[key] = (asset, self.strand_order)
+
+        if self.device_memory.is_resident(key):
+            # Still in the pools, switching only changes the offsets vertex setup reads the strands at (self.strands
+            # keeps the last parsed asset).
+            self.asset_loader.cancel()
+            self.device_memory.use(key)
+
+            # The instances address the strands of the previous layout.
+            self.rebuild_instances()
+        else:
+            # Parsed and uploaded in the background, see update_assets.
+            self.asset_loader.request(asset, self.strand_order)
+
+    def update_assets(self):
+        # Advances the background load, swaps to the loaded strands once they are resident.
+        key = self.asset_loader.key
+        strands = self.asset_loader.update()
+
+        if strands is not None:
+            self.strands = strands
+            self.strands_key = key
+
+            # The instances address the strands of the previous layout.
+            self.rebuild_instances()
+
+    def rebuild_position_format(self, position_format):
+        # The pools are rebuilt empty in the new format (and vertex setup switches permutation), the strands are
+        # uploaded again.
+        active_key = self.device_memory.active.key if self.device_memory.active is not None else None
+        loading_key = self.asset_loader.key
+
+        # A load in flight encoded the strands in the previous format.
+        self.asset_loader.cancel()
+        self.device_memory.set_position_format(position_format)
+
+        if active_key is not None and active_key == self.strands_key:
+            self.device_memory.layout(self.strands.strand_count, self.strands.strand_particle_count)
+            self.device_memory.bind_strand_position_data(self.strands.particle_positions, key=active_key)
+
+        # The load in flight starts over, or the active asset (not parsed since it was switched to) loads again.
+        reload_key = loading_key if loading_key is not None else active_key
+
+        if reload_key != self.strands_key and reload_key in self.asset_sources:
+            self.asset_loader.request(*self.asset_sources[reload_key])
+
+        self.rebuild_instances()
+
+    def rebuild_instances(self):
+        # A swapped in asset can fit fewer copies than the count picked for the previous one.
+        self.instance_count = min(self.instance_count, self.scene.get_max_instance_count())
+        self.scene.clear()
+
+        if self.instance_count > 1:
+            for transform in StrandScene.get_grid_transforms(self.instance_count, self.instance_spacing):
+                self.scene.add_instance(transform)
+
+        if self.instance_distance_lod:
+            self.scene.update_distance_lod(self.editor_camera.pos, self.instance_lod_distance)
+
+        try:
+            self.scene.bind()
+            self.instance_error = ""
+        except ValueError as e:
+            # Over the pipeline budgets, draw the strands once and show it in the panel.
+            self.instance_error = str(e)
+            self.instance_count = 1
+            self.scene.clear()
+            self.scene.bind()
 
     def render(self, stats: Debug.Stats, imgui: g.ImguiBuilder):
         self.render_main_menu_bar(imgui)
@@ -0,0 +1,90 @@
+# Reports the packed post-setup formats (Formats.py) against the float formats they replace: a NumPy round trip of the
+# vertex outputs, segment records and bin records of a frame of the CPU mirror (RasterizerCPU.py), and an estimate of
+# the bytes every stage moves. The fine stage is counted once per bin and segment (the threads of a bin share the
+# loads in cache).
+
+import numpy as np
+
+from src import Budgets
+from src import Formats
+from src import CurveReference
+from src import StrandFactory
+from src import RasterizerCPU
+from src import CPUScalingReport
+
+
+def get_traffic(vertex_count, segment_count, surviving_count, record_count, vertex_size, header_size, record_size):
+    # Bytes read and written by every stage, (stage, bytes) pairs.
+    return [
+        ("vertex setup",  vertex_count * vertex_size),
+        ("segment setup", segment_count * 2 * vertex_size + surviving_count * header_size),
+        ("bin",           surviving_count * header_size + record_count * (2 * vertex_size + record_size)),
+        ("work queue",    record_count * record_size),
+        ("fine",          record_count * 2 * vertex_size)
+    ]
+
+
+def check_round_trip(rasterizer, w, h):
+    buffers = rasterizer.buffers
+
+    # Vertex outputs, the depth is compared on the vertices in front of the camera.
+    positions_cs = buffers["vertex_output"]
+    ndc, depth, culled = Formats.unpack_vertex_output(Formats.pack_vertex_output(positions_cs))
+
+    assert np.array_equal(culled, positions_cs[:, 3] > 0)
+
+    front = ~culled
+    assert np.array_equal(ndc[front], buffers["vertex_ndc"][front, 0:2])
+
+    reference_depth = buffers["vertex_ndc"][front, 2]
+    depth_error = np.abs(depth[front] - reference_depth).max() if front.any() else 0.0
+    depth_range = np.ptp(reference_depth) if front.any() else 0.0
+
+    # Segment records of the surviving segments, in pixels.
+    header = buffers["segment_header"][buffers["segment_output"] != 0]
+    decoded = Formats.unpack_segment_records(Formats.pack_segment_records(header))
+    pixel_error = (np.abs(decoded - header) * 0.5 * np.array([w, h, w, h])).max() if len(header) else 0.0
+
+    # Bin records are exact, including the largest values of every field.
+    segment_index, bin_index, bin_offset = RasterizerCPU.get_bin_records(buffers)
+    segment_index = np.append(segment_index, Budgets.MAX_SEGMENTS - 1)
+    bin_index = np.append(bin_index, Budgets.MAX_BINS - 1)
+    bin_offset = np.append(bin_offset, (1 << Budgets.BIN_RECORD_OFFSET_BITS) - 1)
+
+    unpacked = Formats.unpack_bin_records(Formats.pack_bin_records(segment_index, bin_index, bin_offset))
+    assert all(np.array_equal(a, b) for a, b in zip(unpacked, (segment_index, bin_index, bin_offset)))
+
+    return depth_error, depth_range, pixel_error
+
+
+def run(assets=("fur_field", "cube_hair"), w=1920, h=1080):
+    for asset in assets:
+        strands = StrandFactory.build_from_asset(asset)
+        vertices = CurveReference.get_strand_vertices(strands)
+
+        rasterizer = RasterizerCPU.RasterizerCPU(w, h)
+        context = CPUScalingReport.build_context(strands, vertices, np.zeros((h, w, 4), dtype='f'), w, h, False)
+        rasterizer.setup(context)
+
+        depth_error, depth_range, pixel_error = check_round_trip(rasterizer, w, h)
+
+        counts = (len(vertices), len(rasterizer.buffers["segment_output"]),
+                  int(rasterizer.buffers["segment_output"].sum()), len(rasterizer.buffers["work_queue"]))
+
+        before = get_traffic(*counts, Formats.BYTE_SIZE_VERTEX_OUTPUT_FORMAT_FLOAT,
+                             Formats.BYTE_SIZE_SEGMENT_HEADER_FORMAT_FLOAT, Formats.BYTE_SIZE_BIN_RECORD_FORMAT_FLOAT)
+        after = get_traffic(*counts, Budgets.BYTE_SIZE_VERTEX_OUTPUT_FORMAT,
+                            Budgets.BYTE_SIZE_SEGMENT_HEADER_FORMAT, Budgets.BYTE_SIZE_BIN_RECORD_FORMAT)
+
+        print("{} ({}x{}, {} vertices, {} segments, {} surviving, {} bin records)".format(asset, w, h, *counts))
+        print("  round trip: depth error {:.2e} (depth range {:.2e}), segment record error {:.4f} px, "
+              "bin records exact".format(depth_error, depth_range, pixel_error))
+        print("  {:<14} {:>12} {:>12} {:>8}".format("stage", "float (KB)", "packed (KB)", "ratio"))
+
+        for (stage, a), (_, b) in zip(before + [("total", sum(t for _, t in before))],
+                                      after + [("total", sum(t for _, t in after))]):
+            print("  {:<14} {:>12.1f} {:>12.1f} {:>7.0f}%".format(stage, a / 1024, b / 1024, 100.0 * b / max(a, 1)))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,86 @@
+# NumPy mirrors of the packed post-setup formats of RasterCommon.hlsl, the records are arrays of the Schema.py dtypes.
+# VertexOutput: NDC xy (float), NDC depth as a 24 bit unorm of depth - 1 (the depth in front of the near plane is in
+# [1, 2], see Transform.projection_matrix) and 8 bits of flags. The UV is procedural and not stored.
+# SegmentRecord: the clipped NDC end points, inside the window, as 16 bit unorms of [-1, 1].
+# BinRecord: segment index, offset in the bin and bin index packed in 64 bits.
+
+import numpy as np
+
+from src import Schema
+
+VERTEX_DEPTH_BITS = Schema.VERTEX_DEPTH_BITS
+VERTEX_DEPTH_MAX = (1 << VERTEX_DEPTH_BITS) - 1
+VERTEX_FLAG_CULLED = 1 << VERTEX_DEPTH_BITS
+
+# Byte sizes of the formats they replace (float4 clip position and float UV, float2 x 2, uint x 3).
+BYTE_SIZE_VERTEX_OUTPUT_FORMAT_FLOAT = (4 * 4) + 4
+BYTE_SIZE_SEGMENT_HEADER_FORMAT_FLOAT = 4 * 4
+BYTE_SIZE_BIN_RECORD_FORMAT_FLOAT = 4 + 4 + 4
+
+
+def pack_vertex_output(positions_cs):
+    # (n, 4) clip space positions, returns Schema.VERTEX_OUTPUT records.
+    positions_cs = np.asarray(positions_cs, dtype='f')
+    culled = positions_cs[:, 3] > 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ndc = positions_cs[:, 0:3] / positions_cs[:, 3:4]
+
+    ndc[culled] = 0
+    depth = np.round(np.clip(ndc[:, 2] - 1.0, 0, 1) * VERTEX_DEPTH_MAX).astype(np.uint32)
+
+    records = Schema.VERTEX_OUTPUT.zeros(len(positions_cs))
+    records["positionNDC"] = ndc[:, 0:2]
+    records["depthFlags"] = np.where(culled, VERTEX_FLAG_CULLED, depth)
+    return records
+
+
+def unpack_vertex_output(records):
+    # Returns the NDC xy, the NDC depth and the culled flag of every vertex.
+    depth_flags = records["depthFlags"]
+    depth = (1.0 + (depth_flags & VERTEX_DEPTH_MAX).astype('f') / VERTEX_DEPTH_MAX).astype('f')
+    return records["positionNDC"], depth, (depth_flags & VERTEX_FLAG_CULLED) != 0
+
+
+def pack_segment_records(end_points):
+    # (n, 4) clipped NDC end points x0, y0, x1, y1, returns Schema.SEGMENT_RECORD records.
+    q = np.round(np.clip(np.asarray(end_points, dtype='f') * 0.5 + 0.5, 0, 1) * 65535.0).astype(np.uint32)
+
+    records = Schema.SEGMENT_RECORD.zeros(len(q))
+    records["v0"] = q[:, 0] | (q[:, 1] << 16)
+    records["v1"] = q[:, 2] | (q[:, 3] << 16)
+    return records
+
+
+def unpack_segment_records(records):
+    v0, v1 = records["v0"], records["v1"]
+    q = np.stack([v0 & 0xffff, v0 >> 16, v1 & 0xffff, v1 >> 16], axis=1)
+    return (q.astype('f') * (2.0 / 65535.0) - 1.0).astype('f')
+
+
+def pack_bin_records(segment_index, bin_index, bin_offset):
+    # Returns Schema.BIN_RECORD records, the low bits of the bin offset share the first word with the segment index.
+    segment_index = np.asarray(segment_index, dtype=np.uint32)
+    bin_index = np.asarray(bin_index, dtype=np.uint32)
+    bin_offset = np.asarray(bin_offset, dtype=np.uint32)
+
+    low_bits = 32 - Schema.BIN_RECORD_SEGMENT_BITS
+    high_bits = Schema.BIN_RECORD_OFFSET_BITS - low_bits
+
+    records = Schema.BIN_RECORD.zeros(len(segment_index))
+    records["low"] = segment_index | (bin_offset << Schema.BIN_RECORD_SEGMENT_BITS)
+    records["high"] = (bin_offset >> low_bits) | (bin_index << high_bits)
+    return records
+
+
+def unpack_bin_records(records):
+    # Returns the segment index, bin index and bin offset of every record.
+    low_bits = 32 - Schema.BIN_RECORD_SEGMENT_BITS
+    high_bits = Schema.BIN_RECORD_OFFSET_BITS - low_bits
+    low, high = records["low"], records["high"]
+
+    segment_index = low & ((1 << Schema.BIN_RECORD_SEGMENT_BITS) - 1)
+    bin_offset = (low >> Schema.BIN_RECORD_SEGMENT_BITS) | ((high & ((1 << high_bits) - 1)) << low_bits)
+    bin_index = high >> high_bits
+
+    return segment_index, bin_index, bin_offset
@@ -0,0 +1,89 @@
+# Idle frame reuse.
+# In the editor the camera is usually still, yet every frame would clear the target and run the whole raster pipeline
+# (and the blocking stats read back) to produce the same image. The frame is rendered into a cached target instead and
+# keyed on its inputs: the context (matrices, resolution, strand memory version, raster settings) plus any extra state
+# that draws into the image. While the key doesn't change the cached image is re-presented with a single copy.
+
+import dataclasses
+import numpy as np
+import coalpy.gpu as gpu
+
+from src import Utility
+from src import StrandDeviceMemory
+
+
+def to_key(value):
+    if isinstance(value, np.ndarray):
+        return value.tobytes()
+
+    if isinstance(value, (list, tuple)):
+        return tuple(to_key(v) for v in value)
+
+    if isinstance(value, StrandDeviceMemory.StrandDeviceMemory):
+        # The buffers are updated in place, key on the version.
+        return id(value), value.version
+
+    return value
+
+
+def get_frame_key(context, extra=()):
+    # Hashable key of everything the image depends on, the command list and the target aren't inputs.
+    return tuple((f.name, to_key(getattr(context, f.name)))
+                 for f in dataclasses.fields(context) if f.name not in ("cmd", "target")) + tuple(extra)
+
+
+class FrameCache:
+
+    def __init__(self):
+        self.target = None
+        self.w = 0
+        self.h = 0
+
+        # Key and (caller defined) results of the cached frame.
+        self.key = None
+        self.results = None
+
+        # Size of the cached frame, smaller than the target when rendered at a reduced internal resolution.
+        self.frame_w = 0
+        self.frame_h = 0
+
+        # Stats.
+        self.reused_frames = 0
+        self.rendered_frames = 0
+
+    def get_target(self, w, h):
+        # Frames are rendered into this target, and then presented.
+        if self.target is None or w != self.w or h != self.h:
+            self.target = gpu.Texture(name="FrameCacheTarget", width=w, height=h, format=gpu.Format.RGBA_8_UNORM)
+            self.w = w
+            self.h = h
+            self.key = None
+
+        return self.target
+
+    def is_valid(self, key):
+        if key is not None and key == self.key:
+            self.reused_frames += 1
+            return True
+
+        self.rendered_frames += 1
+        return False
+
+    def store(self, key, results=None, frame_w=None, frame_h=None):
+        self.key = key
+        self.results = results
+        self.frame_w = frame_w if frame_w is not None else self.w
+        self.frame_h = frame_h if frame_h is not None else self.h
+
+    def invalidate(self):
+        self.key = None
+
+    def present(self, cmd, output_target, w, h):
+        cmd.begin_marker("PresentFrameCache")
+
+        if self.frame_w == w and self.frame_h == h:
+            cmd.copy_resource(source=self.target, destination=output_target)
+        else:
+            Utility.upscale(cmd, self.target, self.frame_w, self.frame_h, output_target, w, h)
+
+        cmd.end_marker()
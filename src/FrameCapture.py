@@ -0,0 +1,309 @@
+# Capture and offline replay of a binned rasterizer frame.
+# capture() runs one RasterizerBinned.go frame stage by stage and reads back the buffers every stage writes before a
+# later stage can alias them (see TransientPool.py): vertex outputs, segment outputs, headers and data, bin records,
+# counters, offsets, depth ranges and the work queue. They are stored in the storage formats of Schema.py, with the
+# context, in a compressed NumPy archive. replay() re-executes stages on the NumPy mirror (RasterizerCPU.py) from the
+# archive, so a frame can be profiled without the asset or a GPU. The vertex setup can't be replayed, the strand
+# positions are not captured.
+#
+# Replay a capture: python -m src.FrameCapture <archive> [stage ...]
+
+import sys
+import time
+import dataclasses
+import numpy as np
+import coalpy.gpu as gpu
+
+from src import Budgets
+from src import Schema
+from src import Formats
+from src import Rasterizer
+from src import RasterizerCPU
+
+# Bumped whenever the archive layout changes.
+CAPTURE_VERSION = 1
+
+# Stages replay() can execute, in pipeline order. The CPU mirror bins and builds the work queue in one stage, the
+# work_queue stage rebuilds it from the captured bin records instead.
+REPLAY_STAGES = ["segment_setup", "bin", "work_queue", "fine"]
+
+# Bin depth range clear values, see RasterizerBinned.get_buffer_clears.
+BIN_MIN_Z_CLEAR = (1 << 31) - 1
+BIN_MAX_Z_CLEAR = 0
+
+
+@dataclasses.dataclass
+class Capture:
+    context: dict  # Rasterizer.Context fields (the scalars and matrices), see get_context_fields.
+    buffers: dict  # Captured buffers, named after the RasterizerCPU buffers, in the Schema.py formats.
+
+
+def get_context_fields(context, rasterizer):
+    return dict(
+        w=context.w,
+        h=context.h,
+        matrix_v=np.asarray(context.matrix_v, dtype='f'),
+        matrix_p=np.asarray(context.matrix_p, dtype='f'),
+        strand_count=context.strand_count,
+        segment_count=context.segment_count,
+        strand_particle_count=context.strand_particle_count,
+        tesselation=context.tesselation,
+        tesselation_sample_count=context.tesselation_sample_count,
+        tesselation_error_bound=context.tesselation_error_bound,
+        oit=context.oit,
+        oit_opacity=context.oit_opacity,
+        oit_overlay=context.oit_overlay,
+        oit_slice_count=context.oit_slice_count,
+        oit_mode=context.oit_mode.value,
+        oit_kbuffer_size=context.oit_kbuffer_size,
+        position_format=context.strands.position_format.value,
+        segment_compaction=rasterizer.segment_compaction
+    )
+
+
+def download(resource, dtype, count):
+    request = gpu.ResourceDownloadRequest(resource)
+    request.resolve()
+    return np.frombuffer(request.data_as_bytearray(), dtype=dtype, count=count).copy()
+
+
+def capture(rasterizer, context, path):
+    # Captures a RasterizerBinned frame into path. context.cmd is scheduled by the capture, along with every stage.
+    if getattr(rasterizer, "view_count", 1) != 1:
+        raise ValueError("Multi-view frames can't be captured, capture a single view rasterizer.")
+
+    vertex_count = context.strand_count * context.strand_particle_count
+    segment_count = context.segment_count
+    buffers = {}
+
+    def run_stage(*stages):
+        stage_context = dataclasses.replace(context, cmd=gpu.CommandList())
+        for stage in stages:
+            stage(stage_context)
+        gpu.schedule(stage_context.cmd)
+
+    # 1) Geometry processing and segment setup (the start of RasterizerBinned.go), in the caller's command list.
+    rasterizer.new_frame(context)
+    rasterizer.vertex_setup(context)
+    rasterizer.segment_setup(context)
+    gpu.schedule(context.cmd)
+
+    bin_count = rasterizer.get_bin_count()
+
+    buffers["vertex_output"] = download(rasterizer.b_vertex_output, Schema.VERTEX_OUTPUT.dtype, vertex_count)
+    buffers["segment_output"] = download(rasterizer.b_segment_output, np.uint32, segment_count)
+    buffers["segment_header"] = download(rasterizer.b_segment_header.buffer, Schema.SEGMENT_RECORD.dtype,
+                                         segment_count)
+    buffers["segment_data"] = download(rasterizer.b_segment_data, Schema.SEGMENT_DATA.dtype, segment_count)
+
+    # 2) Compaction and binning.
+    run_stage(*([rasterizer.compact_segments] if rasterizer.segment_compaction else []), rasterizer.raster_bin)
+
+    # The counter keeps counting past the pool, only the stored records are read back.
+    record_count = min(int(download(rasterizer.b_bin_records_counter, np.uint32, 1)[0]),
+                       Budgets.BYTE_SIZE_BIN_RECORD_POOL // Budgets.BYTE_SIZE_BIN_RECORD_FORMAT)
+
+    buffers["bin_records"] = download(rasterizer.b_bin_records.buffer, Schema.BIN_RECORD.dtype, record_count)
+    buffers["bin_counters"] = download(rasterizer.b_bin_counters, np.uint32, bin_count)
+    buffers["bin_min_z"] = download(rasterizer.b_bin_min_z, np.uint32, bin_count)
+    buffers["bin_max_z"] = download(rasterizer.b_bin_max_z, np.uint32, bin_count)
+
+    # 3) Work queue.
+    run_stage(rasterizer.build_work_queue)
+
+    buffers["bin_offsets"] = download(rasterizer.b_bin_offsets, np.uint32, bin_count)
+    buffers["work_queue"] = download(rasterizer.b_work_queue.buffer, np.uint32, record_count)
+
+    # 4) Fine stage, so the frame is complete.
+    run_stage(rasterizer.raster_fine)
+
+    save(path, Capture(get_context_fields(context, rasterizer), buffers))
+
+
+def capture_cpu(rasterizer, context, path):
+    # Captures a frame of the NumPy mirror in the same formats, e.g. to check a replay against its source frame.
+    cpu_buffers = rasterizer.buffers
+    segment_index, bin_index, bin_offset = RasterizerCPU.get_bin_records(cpu_buffers)
+
+    empty = cpu_buffers["bin_counters"] == 0
+
+    buffers = dict(
+        vertex_output=Formats.pack_vertex_output(cpu_buffers["vertex_output"]),
+        segment_output=cpu_buffers["segment_output"].astype(np.uint32),
+        segment_header=Formats.pack_segment_records(cpu_buffers["segment_header"]),
+        segment_data=Schema.SEGMENT_DATA.view(cpu_buffers["segment_data"].astype(np.uint32)),
+        bin_records=Formats.pack_bin_records(segment_index, bin_index, bin_offset),
+        bin_counters=cpu_buffers["bin_counters"].astype(np.uint32),
+        bin_min_z=np.where(empty, BIN_MIN_Z_CLEAR, cpu_buffers["bin_min_z"].view(np.uint32)).astype(np.uint32),
+        bin_max_z=np.where(empty, BIN_MAX_Z_CLEAR, cpu_buffers["bin_max_z"].view(np.uint32)).astype(np.uint32),
+        bin_offsets=cpu_buffers["bin_offsets"].astype(np.uint32),
+        work_queue=cpu_buffers["work_queue"].astype(np.uint32)
+    )
+
+    fields = dict(
+        w=context.w,
+        h=context.h,
+        matrix_v=np.asarray(context.matrix_v, dtype='f'),
+        matrix_p=np.asarray(context.matrix_p, dtype='f'),
+        strand_count=context.strand_count,
+        segment_count=len(cpu_buffers["segment_output"]),
+        strand_particle_count=context.strand_particle_count,
+        tesselation=False,
+        tesselation_sample_count=0,
+        tesselation_error_bound=0.0,
+        oit=context.oit,
+        oit_opacity=context.oit_opacity,
+        oit_overlay=0.0,
+        oit_slice_count=context.oit_slice_count,
+        oit_mode=context.oit_mode.value,
+        oit_kbuffer_size=context.oit_kbuffer_size,
+        position_format=0,
+        segment_compaction=True
+    )
+
+    save(path, Capture(fields, buffers))
+
+
+def save(path, frame: Capture):
+    arrays = {"version": np.array(CAPTURE_VERSION)}
+    arrays.update({"context." + name: np.asarray(value) for name, value in frame.context.items()})
+    arrays.update({"buffer." + name: value for name, value in frame.buffers.items()})
+
+    np.savez_compressed(path, **arrays)
+
+
+def load(path) -> Capture:
+    with np.load(path) as archive:
+        version = int(archive["version"])
+
+        if version != CAPTURE_VERSION:
+            raise ValueError("{} is a version {} capture, expected version {}.".format(path, version, CAPTURE_VERSION))
+
+        context = {name[len("context."):]: archive[name] for name in archive.files if name.startswith("context.")}
+        buffers = {name[len("buffer."):]: archive[name] for name in archive.files if name.startswith("buffer.")}
+
+    # Scalars back to Python values.
+    context = {name: value.item() if value.ndim == 0 else value for name, value in context.items()}
+
+    return Capture(context, buffers)
+
+
+def get_cpu_context(frame: Capture):
+    # The RasterizerCPU context of the captured frame, with a cleared target.
+    fields = frame.context
+
+    return RasterizerCPU.Context(
+        fields["w"],
+        fields["h"],
+        fields["matrix_v"],
+        fields["matrix_p"],
+        None,  # The strand positions are not captured.
+        fields["strand_count"],
+        fields["strand_particle_count"],
+        np.zeros((fields["h"], fields["w"], 4), dtype='f'),
+        oit=fields["oit"],
+        oit_opacity=fields["oit_opacity"],
+        oit_slice_count=fields["oit_slice_count"],
+        oit_mode=Rasterizer.OITMode(fields["oit_mode"]),
+        oit_kbuffer_size=fields["oit_kbuffer_size"]
+    )
+
+
+def get_cpu_buffers(frame: Capture):
+    # Decodes the captured buffers into the RasterizerCPU buffers.
+    captured = frame.buffers
+    fields = frame.context
+
+    ndc, depth, culled = Formats.unpack_vertex_output(captured["vertex_output"])
+
+    counters = captured["bin_counters"]
+    empty = counters == 0
+
+    return dict(
+        vertex_ndc=np.concatenate([ndc, depth[:, None]], axis=1).astype('f'),
+        vertex_culled=culled,
+        vertex_tex_coord=RasterizerCPU.get_vertex_tex_coords(fields["strand_count"], fields["strand_particle_count"]),
+        segment_output=captured["segment_output"],
+        segment_header=Formats.unpack_segment_records(captured["segment_header"]),
+        segment_data=np.stack([captured["segment_data"]["vi0"], captured["segment_data"]["vi1"]], axis=1),
+        bin_counters=counters,
+        bin_offsets=captured["bin_offsets"],
+        bin_min_z=np.where(empty, np.inf, captured["bin_min_z"].view('f')).astype('f'),
+        bin_max_z=np.where(empty, -np.inf, captured["bin_max_z"].view('f')).astype('f'),
+        work_queue=captured["work_queue"]
+    )
+
+
+def replay(frame: Capture, stages=("bin", "fine")):
+    # Executes the stages on the captured inputs, returns the rasterizer (its buffers hold the outputs), the context
+    # (its target holds the image) and the milliseconds spent in every stage.
+    if frame.context["tesselation"] and any(stage in ("bin", "fine") for stage in stages):
+        raise ValueError("The CPU mirror only rasterizes linear segments, the capture is tesselated.")
+
+    context = get_cpu_context(frame)
+
+    rasterizer = RasterizerCPU.RasterizerCPU(context.w, context.h)
+    rasterizer.buffers = get_cpu_buffers(frame)
+
+    timings = {}
+
+    for stage in sorted(stages, key=REPLAY_STAGES.index):
+        t0 = time.perf_counter()
+
+        if stage == "segment_setup":
+            rasterizer.segment_setup(context)
+        elif stage == "bin":
+            rasterizer.raster_bin(context)
+        elif stage == "work_queue":
+            segment_index, bin_index, bin_offset = Formats.unpack_bin_records(frame.buffers["bin_records"])
+            rasterizer.buffers["bin_offsets"], rasterizer.buffers["work_queue"] = RasterizerCPU.build_work_queue(
+                rasterizer.buffers["bin_counters"], segment_index, bin_index, bin_offset)
+        else:
+            rasterizer.raster_fine(context)
+
+        timings[stage] = 1000.0 * (time.perf_counter() - t0)
+
+    return rasterizer, context, timings
+
+
+def get_mismatches(frame: Capture, rasterizer):
+    # Element counts of the replayed outputs that differ from the capture, per buffer. The work queue is compared as
+    # a set per bin, the order within a bin depends on the GPU atomics.
+    replayed = rasterizer.buffers
+    captured = get_cpu_buffers(frame)
+    mismatches = {}
+
+    for name in ["segment_output", "bin_counters", "bin_offsets"]:
+        if len(replayed[name]) != len(captured[name]):
+            mismatches[name] = max(len(replayed[name]), len(captured[name]))
+        else:
+            mismatches[name] = int(np.count_nonzero(replayed[name] != captured[name]))
+
+    if mismatches["bin_counters"] == 0:
+        bins = np.repeat(np.arange(len(captured["bin_counters"])), captured["bin_counters"].astype(np.int64))
+        order_captured = np.lexsort((captured["work_queue"], bins))
+        order_replayed = np.lexsort((replayed["work_queue"], bins))
+        mismatches["work_queue"] = int(np.count_nonzero(
+            captured["work_queue"][order_captured] != replayed["work_queue"][order_replayed]))
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python -m src.FrameCapture <archive> [{}]".format(" | ".join(REPLAY_STAGES)))
+        sys.exit(1)
+
+    frame = load(sys.argv[1])
+    replay_stages = sys.argv[2:] or ["bin", "fine"]
+
+    rasterizer, context, timings = replay(frame, replay_stages)
+
+    print("{} ({}x{}, {} segments, {} bin records)".format(sys.argv[1], context.w, context.h,
+                                                           frame.context["segment_count"],
+                                                           len(frame.buffers["bin_records"])))
+    for stage, ms in timings.items():
+        print("  {:<14} {:>10.2f} ms".format(stage, ms))
+
+    for name, count in get_mismatches(frame, rasterizer).items():
+        print("  {:<14} {:>10} mismatches".format(name, count))
@@ -0,0 +1,164 @@
+# Record-once frame graph.
+# Passes declare their inputs, outputs and the commands they emit once per plan. The recorded dispatches are replayed
+# every frame until the plan key changes (resolution, segment count, shader permutations), and constant buffers are only
+# uploaded when their contents change. Transient buffers (see TransientPool.py) are bound from their lifetimes in the pass
+# order when the graph compiles.
+
+import dataclasses
+import numpy as np
+
+from dataclasses import dataclass, field
+from typing import Callable
+from src import TransientPool
+
+
+class DispatchRecorder:
+    # Stand-in for a gpu.CommandList that captures the commands a pass emits.
+
+    def __init__(self):
+        self.commands = []
+
+    def dispatch(self, **kwargs):
+        # Cull empty launches (e.g. no segments) up front.
+        if 'indirect_args' not in kwargs and 0 in (kwargs.get('x', 1), kwargs.get('y', 1), kwargs.get('z', 1)):
+            return
+
+        self.commands.append(('dispatch', (), kwargs))
+
+    def begin_marker(self, name):
+        self.commands.append(('begin_marker', (name,), {}))
+
+    def end_marker(self):
+        self.commands.append(('end_marker', (), {}))
+
+    def upload_resource(self, **kwargs):
+        raise RuntimeError("Uploads can't be recorded, declare them as constants of the frame graph instead.")
+
+
+@dataclass
+class Pass:
+    name: str
+    record: Callable  # record(context), emits the pass commands into context.cmd
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    overwrites: bool = False  # True if the outputs are fully rewritten (clears), otherwise they are read-modify-write.
+
+
+class FrameGraph:
+
+    def __init__(self, name, declare: Callable, plan_key: Callable, constants: Callable,
+                 pool: TransientPool.TransientPool = TransientPool.default_pool):
+        # declare(graph, context) adds the passes, plan_key(context) identifies a recorded plan and
+        # constants(context) returns the (buffer, values) pairs for the frame.
+        self.name = name
+        self.declare = declare
+        self.plan_key = plan_key
+        self.constants = constants
+        self.pool = pool
+
+        self.passes = []
+        self.commands = []
+        self.key = None
+
+        # CPU shadow copy of every constant buffer, keyed by the buffer.
+        self.shadows = {}
+
+        # Stats of the last frame.
+        self.culled_passes = []
+        self.constant_uploads = 0
+
+    def add_pass(self, name, record, inputs=(), outputs=(), overwrites=False):
+        self.passes.append(Pass(name, record, list(inputs), list(outputs), overwrites))
+
+    def invalidate_constants(self):
+        # Needed whenever constant buffers are uploaded outside of the graph.
+        self.shadows = {}
+
+    def cull(self, exports):
+        # Walk the passes backwards, a pass is live if one of its outputs is read by a later live pass or exported.
+        live_resources = {id(r) for r in exports}
+        live_passes = []
+
+        for p in reversed(self.passes):
+            if not any(id(r) in live_resources for r in p.outputs):
+                continue
+
+            live_passes.append(p)
+
+            # Fully rewritten outputs are dead before the pass, read-modify-write outputs (atomics) stay live.
+            if p.overwrites:
+                for r in p.outputs:
+                    live_resources.discard(id(r))
+            else:
+                for r in p.outputs:
+                    live_resources.add(id(r))
+
+            for r in p.inputs:
+                live_resources.add(id(r))
+
+        live_passes.reverse()
+        return live_passes
+
+    def get_transient_lifetimes(self):
+        # (transient, first pass index, last pass index) over every declared pass, so that the immediate path (which
+        # doesn't cull) is also safe.
+        lifetimes = {}
+
+        for i, p in enumerate(self.passes):
+            for r in p.inputs + p.outputs:
+                if not isinstance(r, TransientPool.TransientBuffer):
+                    continue
+
+                first, _ = lifetimes.get(r, (i, i))
+                lifetimes[r] = (first, i)
+
+        return [(r, first, last) for r, (first, last) in lifetimes.items()]
+
+    def compile(self, context, exports):
+        self.passes = []
+        self.declare(self, context)
+
+        self.pool.allocate(self, self.get_transient_lifetimes())
+
+        live_passes = self.cull(list(exports) + [context.target])
+        self.culled_passes = [p.name for p in self.passes if not any(p is l for l in live_passes)]
+
+        # Record the live passes once, the commands are replayed every frame until the plan key changes.
+        recorder = DispatchRecorder()
+        recording_context = dataclasses.replace(context, cmd=recorder)
+
+        recorder.begin_marker(self.name)
+        for p in live_passes:
+            p.record(recording_context)
+        recorder.end_marker()
+
+        self.commands = recorder.commands
+
+    def update_constants(self, context):
+        self.constant_uploads = 0
+
+        for buffer, values in self.constants(context):
+            values = np.asarray(values, dtype='f')
+            shadow = self.shadows.get(buffer)
+
+            if shadow is not None and np.array_equal(shadow, values):
+                continue
+
+            context.cmd.upload_resource(source=values, destination=buffer)
+            self.shadows[buffer] = values
+            self.constant_uploads += 1
+
+    def prepare(self, context, exports=()):
+        # Compiles the plan if anything it depends on changed, this also binds the transient buffers.
+        key = (self.plan_key(context), tuple(id(r) for r in exports), self.pool.generation)
+
+        if key != self.key:
+            self.compile(context, exports)
+            self.key = (self.plan_key(context), tuple(id(r) for r in exports), self.pool.generation)
+
+    def execute(self, context, exports=()):
+        self.prepare(context, exports)
+        self.update_constants(context)
+
+        for method, args, kwargs in self.commands:
+            getattr(context.cmd, method)(*args, **kwargs)
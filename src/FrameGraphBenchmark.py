@@ -0,0 +1,99 @@
+# Measures the Python (CPU) cost per frame of recording the rasterizer work:
+# immediate mode (Rasterizer.go) versus the record-once frame graph (Rasterizer.record).
+
+import time
+import coalpy.gpu as gpu
+
+from src import Camera
+from src import Vector
+from src import StrandFactory
+from src import StrandDeviceMemory
+from src import Rasterizer
+from src import RasterizerBinned
+from src import RasterizerBrute
+
+
+def build_context(cmd, camera, device_memory, strands, target, w, h, oit=True):
+    return Rasterizer.Context(
+        cmd, w, h,
+        camera.view_matrix,
+        camera.proj_matrix,
+        device_memory,
+        strands.strand_count,
+        strands.strand_count * (strands.strand_particle_count - 1),
+        strands.strand_particle_count,
+        False,
+        12,
+        0.0,
+        oit,
+        0.21,
+        0.0,
+        128,
+        Rasterizer.OITMode.SLICES,
+        8,
+        target
+    )
+
+
+def measure(rasterizer, use_frame_graph, camera, device_memory, strands, target, w, h, frame_count, oit):
+    record_time = 0.0
+    schedule_time = 0.0
+
+    for i in range(frame_count):
+        t0 = time.perf_counter()
+
+        cmd = gpu.CommandList()
+        context = build_context(cmd, camera, device_memory, strands, target, w, h, oit)
+
+        if use_frame_graph:
+            rasterizer.record(context)
+        else:
+            rasterizer.go(context)
+
+        t1 = time.perf_counter()
+        gpu.schedule(cmd)
+        t2 = time.perf_counter()
+
+        record_time += t1 - t0
+        schedule_time += t2 - t1
+
+    return 1000.0 * record_time / frame_count, 1000.0 * schedule_time / frame_count
+
+
+def run(asset="fur_field", w=1280, h=720, frame_count=200):
+    device_memory = StrandDeviceMemory.StrandDeviceMemory()
+    strands = StrandFactory.build_from_asset(asset)
+    device_memory.layout(strands.strand_count, strands.strand_particle_count)
+    device_memory.bind_strand_position_data(strands.particle_positions)
+
+    camera = Camera.Camera(w, h)
+    camera.pos = Vector.float3(0.0, 0.0, -10.690)
+    camera.transform.update_mats()
+
+    target = gpu.Texture(name="BenchmarkTarget", width=w, height=h, format=gpu.Format.RGBA_8_UNORM)
+
+    print("{} ({}x{}, {} frames), milliseconds per frame".format(asset, w, h, frame_count))
+    print("  {:<24} {:<14} {:>10} {:>10}".format("rasterizer", "mode", "record", "schedule"))
+
+    for rasterizer_type in [RasterizerBinned.RasterizerBinned, RasterizerBrute.RasterizerBrute]:
+        for oit in ([True, False] if rasterizer_type is RasterizerBinned.RasterizerBinned else [True]):
+            for use_frame_graph in [False, True]:
+                # Separate instances, so neither path benefits from the other's state.
+                rasterizer = rasterizer_type(w, h)
+
+                record_ms, schedule_ms = measure(rasterizer, use_frame_graph, camera, device_memory, strands,
+                                                 target, w, h, frame_count, oit)
+
+                print("  {:<24} {:<14} {:>10.3f} {:>10.3f}".format(
+                    rasterizer_type.__name__ + (" (OIT)" if oit else ""),
+                    "frame graph" if use_frame_graph else "immediate",
+                    record_ms,
+                    schedule_ms
+                ))
+
+                if use_frame_graph and rasterizer.frame_graph.culled_passes:
+                    print("    culled: " + ", ".join(rasterizer.frame_graph.culled_passes))
+
+
+if __name__ == "__main__":
+    run()
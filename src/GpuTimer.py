@@ -0,0 +1,40 @@
+# GPU time of a marked span of the frame.
+# The markers of the command lists scheduled between begin and end are timestamped on the GPU (see
+# gpu.begin_collect_markers), the time of the markers with the timer's name is read back a few frames later without
+# blocking. Unlike the wall clock time between frames, it excludes the CPU side of the frame, the UI, the present and
+# the wait for vsync.
+
+import coalpy.gpu as gpu
+import numpy as np
+
+
+class GpuTimer:
+
+    def __init__(self, marker_name):
+        self.marker_name = marker_name
+
+        # Timed spans in flight: their markers, the timestamp read back and the tag passed to end.
+        self.queue = []
+
+    def begin(self):
+        gpu.begin_collect_markers()
+
+    def end(self, tag=None):
+        markers = gpu.end_collect_markers()
+        self.queue.append((markers, gpu.ResourceDownloadRequest(markers.timestamp_buffer), tag))
+
+    def poll(self):
+        # (milliseconds, tag) of the oldest span once its timestamps are read back, None while it's in flight.
+        if not self.queue or not self.queue[0][1].is_ready():
+            return None
+
+        markers, request, tag = self.queue.pop(0)
+        timestamps = np.frombuffer(request.data_as_bytearray(), dtype=np.uint64)
+
+        ticks = sum(int(timestamps[end]) - int(timestamps[begin])
+                    for (name, _, begin, end) in markers.markers if name == self.marker_name)
+
+        return 1000.0 * ticks / markers.timestamp_frequency, tag
+
+    def clear(self):
+        self.queue.clear()
@@ -0,0 +1,130 @@
+# Cem Yuksel's binary .hair format (http://www.cemyuksel.com/research/hairmodels).
+# A 128 byte header, then the optional arrays the header flags: the segment count of every strand (uint16), the points
+# (float3), the thickness, transparency (float) and color (float3) of every point. The points are read as a view of the
+# memory mapped file, the float storage format uploads that view as is (see StrandDeviceMemory.encode), so a large
+# asset loads at disk bandwidth.
+# The rasterizer lays strands out with a uniform particle count, files with strands of varying lengths are rejected.
+
+import sys
+import time
+import numpy as np
+
+from src import Schema
+from src import Utility
+
+SIGNATURE = b"HAIR"
+
+# Arrays present in the file, in file order.
+ARRAY_SEGMENTS     = 1 << 0
+ARRAY_POINTS       = 1 << 1
+ARRAY_THICKNESS    = 1 << 2
+ARRAY_TRANSPARENCY = 1 << 3
+ARRAY_COLORS       = 1 << 4
+
+HEADER = np.dtype([
+    ("signature",            'S4'),
+    ("hair_count",           '<u4'),
+    ("point_count",          '<u4'),
+    ("arrays",               '<u4'),
+    ("default_segments",     '<u4'),
+    ("default_thickness",    '<f4'),
+    ("default_transparency", '<f4'),
+    ("default_color",        '<f4', (3,)),
+    ("info",                 'S88')
+])
+
+
+def read(path):
+    # The strand count, strand particle count and Schema.STRAND_DATA records of the points (sequential layout, see
+    # StrandFactory.build_from_asset). The records are a read only view of the file, it stays mapped while they are
+    # referenced.
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+
+    if len(data) < HEADER.itemsize:
+        raise ValueError("{} is too small for a .hair header.".format(path))
+
+    header = data[:HEADER.itemsize].view(HEADER)[0]
+
+    if header["signature"] != SIGNATURE:
+        raise ValueError("{} is not a .hair file.".format(path))
+
+    hair_count = int(header["hair_count"])
+    point_count = int(header["point_count"])
+    arrays = int(header["arrays"])
+
+    if not arrays & ARRAY_POINTS:
+        raise ValueError("{} has no points.".format(path))
+
+    offset = HEADER.itemsize
+
+    if arrays & ARRAY_SEGMENTS:
+        segments = data[offset:offset + 2 * hair_count].view('<u2')
+        offset += 2 * hair_count
+
+        if len(segments) and np.any(segments != segments[0]):
+            raise ValueError("{} has strands of {} to {} segments, only uniform strands are supported.".format(
+                path, segments.min(), segments.max()))
+
+        segment_count = int(segments[0]) if len(segments) else 0
+    else:
+        segment_count = int(header["default_segments"])
+
+    strand_particle_count = segment_count + 1
+
+    if hair_count * strand_particle_count != point_count:
+        raise ValueError("{} has {} points for {} strands of {} points.".format(
+            path, point_count, hair_count, strand_particle_count))
+
+    positions = Schema.STRAND_DATA.view(data[offset:offset + Schema.STRAND_DATA.byte_size * point_count])
+
+    return hair_count, strand_particle_count, positions
+
+
+def write(path, strands, info="StrandRasterizer"):
+    # Saves StrandFactory.Strands (procedural or loaded).
+    # Points only, the strands are uniform so the segment counts are the header default.
+    header = np.zeros(1, dtype=HEADER)
+    header["signature"] = SIGNATURE
+    header["hair_count"] = strands.strand_count
+    header["point_count"] = strands.strand_count * strands.strand_particle_count
+    header["arrays"] = ARRAY_POINTS
+    header["default_segments"] = strands.strand_particle_count - 1
+    header["default_thickness"] = 1.0
+    header["default_transparency"] = 0.0
+    header["default_color"] = 1.0
+    header["info"] = info.encode()[:HEADER["info"].itemsize]
+
+    # Strand by strand, whatever the layout of the strands.
+    begin, stride, _ = Utility.get_strand_iterator(strands.memory_layout, np.arange(strands.strand_count)[:, None],
+                                                   strands.strand_count, strands.strand_particle_count)
+    order = (begin + stride * np.arange(strands.strand_particle_count)).reshape(-1)
+    points = np.ascontiguousarray(strands.particle_positions["strandPositionOS"][order], dtype='<f4')
+
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(points.tobytes())
+
+
+if __name__ == "__main__":
+    # StrandFactory reads .hair files through this module.
+    from src import StrandCache
+    from src import StrandFactory
+
+    # python -m src.HairFile <output.hair> [asset]: saves an asset, or the default procedural strands, and reads the
+    # file back.
+    if len(sys.argv) < 2:
+        print("usage: python -m src.HairFile <output.hair> [asset]")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    source = StrandFactory.build_from_asset(sys.argv[2]) if len(sys.argv) > 2 else StrandCache.build_procedural()
+    t1 = time.perf_counter()
+
+    write(sys.argv[1], source)
+
+    t2 = time.perf_counter()
+    strand_count, strand_particle_count, positions = read(sys.argv[1])
+    t3 = time.perf_counter()
+
+    print("{} strands of {} particles: built in {:.1f} ms, written in {:.1f} ms, read in {:.3f} ms".format(
+        strand_count, strand_particle_count, 1000 * (t1 - t0), 1000 * (t2 - t1), 1000 * (t3 - t2)))
@@ -0,0 +1,67 @@
+# Reports what instancing (StrandScene.py) costs for grids of copies of one asset: the strands, vertices and segments
+# the pipeline processes, whether they fit the pipeline budgets, and the strand memory and upload versus binding a
+# duplicated copy of the strand data per instance. Full detail copies are compared with the distance LOD seen from the
+# default camera.
+
+import numpy as np
+
+from src import Budgets
+from src import CurveReference
+from src import StrandFactory
+from src import StrandScene
+
+
+class DeviceMemoryLayout:
+    # The layout StrandScene reads from a StrandDeviceMemory, without allocating GPU buffers.
+    def __init__(self, strand_count, strand_particle_count):
+        self.strand_count = strand_count
+        self.strand_particle_count = strand_particle_count
+
+
+def get_fit(scene):
+    try:
+        scene.check_capacity()
+        return "yes"
+    except ValueError as e:
+        return "over vertex pool" if "vertex" in str(e) else "over segment cap"
+
+
+def run(asset="fur_field", copy_counts=(1, 10, 25, 100), spacing=1.5, camera_position=(0.0, 0.0, -10.690),
+        lod_distance=10.0):
+    strands = StrandFactory.build_from_asset(asset)
+    vertices = CurveReference.get_strand_vertices(strands)
+
+    position_bytes = len(vertices) * Budgets.BYTE_SIZE_STRAND_DATA_FORMAT
+    scene = StrandScene.StrandScene(DeviceMemoryLayout(strands.strand_count, strands.strand_particle_count))
+
+    # The instanced vertex setup mirror reproduces the strands for one untransformed full detail instance.
+    scene.add_instance(np.identity(4, dtype='f'))
+    assert np.array_equal(scene.get_instanced_vertices(vertices), vertices)
+
+    print("{} ({} strands, {} KB of positions)".format(asset, strands.strand_count, position_bytes // 1024))
+    print("  {:>6} {:<9} {:>9} {:>10} {:>10} {:>18} {:>14} {:>14}".format(
+        "copies", "lod", "strands", "vertices", "segments", "fits budgets", "instanced KB", "duplicated KB"))
+
+    for copy_count in copy_counts:
+        for distance_lod in [False, True]:
+            scene.clear()
+            for transform in StrandScene.get_grid_transforms(copy_count, spacing):
+                scene.add_instance(transform)
+
+            if distance_lod:
+                scene.update_distance_lod(camera_position, lod_distance)
+
+            strand_count = scene.get_strand_count()
+            instance_bytes = len(scene.get_instance_data()) * Budgets.BYTE_SIZE_STRAND_INSTANCE_FORMAT
+
+            # The mirror renders every rendered strand once.
+            assert len(scene.get_instanced_vertices(vertices)) == strand_count * strands.strand_particle_count
+
+            print("  {:>6} {:<9} {:>9} {:>10} {:>10} {:>18} {:>14.1f} {:>14.1f}".format(
+                copy_count, "distance" if distance_lod else "full", strand_count,
+                strand_count * strands.strand_particle_count, scene.get_segment_count(), get_fit(scene),
+                (position_bytes + instance_bytes) / 1024, copy_count * position_bytes / 1024))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,40 @@
+# Reports how the transient buffers of several rasterizers alias in the shared pool (peak versus summed footprint).
+
+import numpy as np
+import coalpy.gpu as gpu
+
+from src import Rasterizer
+from src import RasterizerBinned
+from src import RasterizerBrute
+from src import StrandDeviceMemory
+from src import TransientPool
+
+
+def run(w=1920, h=1080, viewport_count=2):
+    device_memory = StrandDeviceMemory.StrandDeviceMemory()
+    target = gpu.Texture(name="ReportTarget", width=w, height=h, format=gpu.Format.RGBA_8_UNORM)
+
+    rasterizers = [RasterizerBinned.RasterizerBinned(w, h) for _ in range(viewport_count)]
+    rasterizers.append(RasterizerBrute.RasterizerBrute(w, h))
+
+    for rasterizer in rasterizers:
+        context = Rasterizer.Context(
+            gpu.CommandList(), w, h,
+            np.identity(4, dtype='f'),
+            np.identity(4, dtype='f'),
+            device_memory,
+            1, 1, 2,
+            False, 12, 0.0,
+            True, 0.21, 0.0, 128, Rasterizer.OITMode.SLICES, 8,
+            target
+        )
+
+        # Compiling the graph binds its transient buffers.
+        rasterizer.frame_graph.prepare(context)
+
+    print("Transient buffers ({} binned viewports + 1 brute, {}x{})".format(viewport_count, w, h))
+    print(TransientPool.default_pool.report())
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,96 @@
+# Measures the cost per frame of rendering K turntable views of one asset:
+# K single-view binned rasterizers (one per view) versus one multi-view rasterizer writing to an atlas.
+
+import time
+import coalpy.gpu as gpu
+
+from src import StrandFactory
+from src import StrandDeviceMemory
+from src import Rasterizer
+from src import RasterizerBinned
+from src import RasterizerMultiView
+
+
+def build_context(cmd, views, device_memory, strands, target, w, h, multi_view, oit=True):
+    args = [
+        cmd, w, h,
+        views[0][0],
+        views[0][1],
+        device_memory,
+        strands.strand_count,
+        strands.strand_count * (strands.strand_particle_count - 1),
+        strands.strand_particle_count,
+        False,
+        12,
+        0.0,
+        oit,
+        0.21,
+        0.0,
+        128,
+        Rasterizer.OITMode.SLICES,
+        8,
+        target
+    ]
+
+    if not multi_view:
+        return Rasterizer.Context(*args)
+
+    return RasterizerMultiView.MultiViewContext(*args, views)
+
+
+def measure(frame_count, record_frame):
+    record_time = 0.0
+    schedule_time = 0.0
+
+    for i in range(frame_count):
+        t0 = time.perf_counter()
+
+        cmd = gpu.CommandList()
+        record_frame(cmd)
+
+        t1 = time.perf_counter()
+        gpu.schedule(cmd)
+        t2 = time.perf_counter()
+
+        record_time += t1 - t0
+        schedule_time += t2 - t1
+
+    return 1000.0 * record_time / frame_count, 1000.0 * schedule_time / frame_count
+
+
+def run(asset="long_hair", w=320, h=320, view_counts=(2, 4, 8), frame_count=100):
+    device_memory = StrandDeviceMemory.StrandDeviceMemory()
+    strands = StrandFactory.build_from_asset(asset)
+    device_memory.layout(strands.strand_count, strands.strand_particle_count)
+    device_memory.bind_strand_position_data(strands.particle_positions)
+
+    print("{} ({}x{} per view, {} frames), milliseconds per frame".format(asset, w, h, frame_count))
+    print("  {:<6} {:<12} {:>10} {:>10}".format("views", "mode", "record", "schedule"))
+
+    for view_count in view_counts:
+        views = RasterizerMultiView.get_turntable_views(view_count, w, h)
+        atlas = RasterizerMultiView.create_atlas(w, h, view_count)
+
+        # One rasterizer and context per view, each writing to its own target.
+        single_view_rasterizers = [RasterizerBinned.RasterizerBinned(w, h) for _ in range(view_count)]
+        single_view_targets = [
+            gpu.Texture(name="ViewTarget{}".format(i), width=w, height=h, format=gpu.Format.RGBA_8_UNORM)
+            for i in range(view_count)
+        ]
+
+        def record_single_view(cmd):
+            for i, rasterizer in enumerate(single_view_rasterizers):
+                rasterizer.record(build_context(cmd, views[i:i + 1], device_memory, strands, single_view_targets[i], w, h, False))
+
+        multi_view_rasterizer = RasterizerMultiView.RasterizerMultiView(w, h, view_count)
+
+        def record_multi_view(cmd):
+            multi_view_rasterizer.record(build_context(cmd, views, device_memory, strands, atlas, w, h, True))
+
+        for name, record_frame in [("per view", record_single_view), ("multi-view", record_multi_view)]:
+            record_ms, schedule_ms = measure(frame_count, record_frame)
+            print("  {:<6} {:<12} {:>10.3f} {:>10.3f}".format(view_count, name, record_ms, schedule_ms))
+
+
+if __name__ == "__main__":
+    run()
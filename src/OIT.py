@@ -0,0 +1,11 @@
+# Order independent transparency resolve modes of RasterFineOIT, shared by the GPU rasterizers (Rasterizer.OITMode)
+# and the NumPy mirror (RasterizerCPU.py), which imports without coalpy.
+
+from enum import Enum
+
+
+class OITMode(Enum):
+    SLICES  = 0  # Depth slices of the bin depth range.
+    KBUFFER = 1  # The K nearest fragments, with a tail blend.
+    WEIGHTED_BLENDED = 2  # Depth weighted average, no per-pixel fragment storage.
+    ADAPTIVE_SLICES = 3  # Depth slices distributed by a depth histogram of the bin.
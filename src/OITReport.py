@@ -0,0 +1,118 @@
+# Reports the image error and speed of the OIT resolves on the NumPy mirror (RasterizerCPU.py): the depth slices of
+# RasterFineOIT (linear and adaptive, at several slice counts) against the k-buffer and weighted blended modes. The
+# error is measured against an exact resolve, every fragment of a pixel sorted by depth and composited front to back.
+# The per-thread state of the GPU resolve is listed too, since it bounds how many threads can be resident.
+
+import time
+import dataclasses
+import numpy as np
+
+from src import CurveReference
+from src import StrandFactory
+from src import OIT
+from src import RasterizerCPU
+from src import CPUScalingReport
+
+# Keeps every fragment of a bin, the k-buffer resolve is then an exact sort.
+EXACT_KBUFFER_SIZE = 1 << 30
+
+
+def get_thread_state_bytes(oit_mode=OIT.OITMode.SLICES, oit_slice_count=RasterizerCPU.NUM_SLICES,
+                           oit_kbuffer_size=RasterizerCPU.KBUFFER_SIZE):
+    if oit_mode == OIT.OITMode.WEIGHTED_BLENDED:
+        # float4 accumulation and the revealage.
+        return 16 + 4
+
+    if oit_mode != OIT.OITMode.KBUFFER:
+        # uint slices[NUM_SLICES], float4 fragments[NUM_SLICES] and the uint4 slice mask (with a permutation of that
+        # capacity).
+        return oit_slice_count * (4 + 16) + 16
+
+    # float depths[K], float4 fragments[K], the float4 tail and its transmittance.
+    return oit_kbuffer_size * (4 + 16) + 16 + 4
+
+
+def get_modes(kbuffer_sizes, slice_counts):
+    # (name, context settings) of every resolve.
+    modes = []
+
+    for n in slice_counts:
+        modes.append(("slices {}".format(n), dict(oit_slice_count=n)))
+        modes.append(("adaptive {}".format(n), dict(oit_slice_count=n, oit_mode=OIT.OITMode.ADAPTIVE_SLICES)))
+
+    modes += [("k-buffer {}".format(k), dict(oit_mode=OIT.OITMode.KBUFFER, oit_kbuffer_size=k)) for k in kbuffer_sizes]
+    modes += [("weighted", dict(oit_mode=OIT.OITMode.WEIGHTED_BLENDED))]
+
+    return modes
+
+
+def measure(rasterizer, context, frame_count):
+    t0 = time.perf_counter()
+    for i in range(frame_count):
+        context.target[:] = 0
+        rasterizer.raster_fine(context)
+    return 1000.0 * (time.perf_counter() - t0) / frame_count
+
+
+def add_outlier_strands(vertices, strand_particle_count, count=10):
+    # Replaces the first strands by horizontal strands far behind the groom. They stretch the depth range of every bin
+    # they cross, the case the adaptive slices are for.
+    vertices = vertices.copy()
+    n = strand_particle_count
+    extent = vertices.max(axis=0) - vertices.min(axis=0)
+    far = vertices[:, 2].max() + 20 * extent[2]
+
+    for i in range(count):
+        strand = vertices[i * n:(i + 1) * n]
+        strand[:, 0] = np.linspace(-6 * extent[0], 6 * extent[0], n)
+        strand[:, 1] = vertices[:, 1].min() + extent[1] * (i + 0.5) / count
+        strand[:, 2] = far
+
+    return vertices
+
+
+def run(assets=("fur_field", "cube_hair"), w=1280, h=720, kbuffer_sizes=(4, 8, 16), slice_counts=(16, 32, 64, 128),
+        frame_count=3, opacity=0.21, outliers=(False, True)):
+    for asset, outlier in [(a, o) for a in assets for o in outliers]:
+        strands = StrandFactory.build_from_asset(asset)
+        vertices = CurveReference.get_strand_vertices(strands)
+
+        if outlier:
+            vertices = add_outlier_strands(vertices, strands.strand_particle_count)
+            asset += " + outliers"
+
+        rasterizer = RasterizerCPU.RasterizerCPU(w, h)
+        context = CPUScalingReport.build_context(strands, vertices, np.zeros((h, w, 4), dtype='f'), w, h, True)
+        context.oit_opacity = opacity
+
+        # The setup is shared by every resolve.
+        rasterizer.setup(context)
+
+        context.oit_mode = OIT.OITMode.KBUFFER
+        context.oit_kbuffer_size = EXACT_KBUFFER_SIZE
+        exact_ms = measure(rasterizer, context, 1)
+        exact = context.target[..., 0:3].copy()
+
+        # Error over the pixels with fragments.
+        written = np.any(exact > 0, axis=2)
+
+        print("{} ({}x{}, opacity {:.2f}), fine resolve against an exact sort ({:.1f} ms)".format(
+            asset, w, h, opacity, exact_ms))
+        print("  {:<12} {:>14} {:>10} {:>12} {:>12}".format("mode", "state (bytes)", "ms", "rmse", "max error"))
+
+        for mode, settings in get_modes(kbuffer_sizes, slice_counts):
+            defaults = dict(oit_mode=OIT.OITMode.SLICES, oit_slice_count=RasterizerCPU.NUM_SLICES,
+                            oit_kbuffer_size=RasterizerCPU.KBUFFER_SIZE)
+            context = dataclasses.replace(context, **{**defaults, **settings})
+            ms = measure(rasterizer, context, frame_count)
+
+            error = np.abs(context.target[..., 0:3] - exact)[written]
+            rmse = np.sqrt(np.mean(error ** 2)) if error.size else 0.0
+            max_error = error.max() if error.size else 0.0
+
+            print("  {:<12} {:>14} {:>10.1f} {:>12.5f} {:>12.5f}".format(
+                mode, get_thread_state_bytes(**settings), ms, rmse, max_error))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,66 @@
+# Sub-allocation of a fixed size pool (see StrandDeviceMemory.py).
+# A free list of (offset, size) ranges sorted by offset: allocations take the first range that fits, frees merge with
+# their neighbours so the pool does not fragment into ranges nothing fits in anymore.
+
+
+class FreeListAllocator:
+
+    def __init__(self, capacity, alignment=1):
+        self.capacity = capacity
+        self.alignment = alignment
+        self.free_ranges = [(0, capacity)]
+
+    def align(self, size):
+        return -(-size // self.alignment) * self.alignment
+
+    @property
+    def free_size(self):
+        return sum(size for _, size in self.free_ranges)
+
+    @property
+    def largest_free_size(self):
+        return max((size for _, size in self.free_ranges), default=0)
+
+    def allocate(self, size):
+        # Offset of the range, None if no free range fits (the free size may still be larger, see largest_free_size).
+        size = self.align(size)
+        if size == 0:
+            return 0
+
+        for i, (offset, free_size) in enumerate(self.free_ranges):
+            if free_size < size:
+                continue
+
+            if free_size == size:
+                del self.free_ranges[i]
+            else:
+                self.free_ranges[i] = (offset + size, free_size - size)
+
+            return offset
+
+        return None
+
+    def free(self, offset, size):
+        size = self.align(size)
+        if size == 0:
+            return
+
+        i = 0
+        while i < len(self.free_ranges) and self.free_ranges[i][0] < offset:
+            i += 1
+
+        # Merge with the next range, then with the previous one.
+        if i < len(self.free_ranges) and offset + size == self.free_ranges[i][0]:
+            size += self.free_ranges[i][1]
+            del self.free_ranges[i]
+
+        if i > 0 and self.free_ranges[i - 1][0] + self.free_ranges[i - 1][1] == offset:
+            offset = self.free_ranges[i - 1][0]
+            size += self.free_ranges[i - 1][1]
+            i -= 1
+            del self.free_ranges[i]
+
+        self.free_ranges.insert(i, (offset, size))
+
+    def clear(self):
+        self.free_ranges = [(0, self.capacity)]
@@ -3,13 +3,14 @@
 import coalpy.gpu as g
 
 from src import Utility as utils
+from src import ShaderCache
 
 g_group_size = 128
-g_prefix_sum_group                    = g.Shader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumOnGroup")
-g_prefix_sum_group_exclusive          = g.Shader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumOnGroup", defines=["EXCLUSIVE_PREFIX"])
-g_prefix_sum_next_input               = g.Shader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumNextInput")
-g_prefix_sum_resolve_parent           = g.Shader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumResolveParent")
-g_prefix_sum_resolve_parent_exclusive = g.Shader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumResolveParent", defines=["EXCLUSIVE_PREFIX"])
+g_prefix_sum_group                    = ShaderCache.LazyShader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumOnGroup")
+g_prefix_sum_group_exclusive          = ShaderCache.LazyShader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumOnGroup", defines=["EXCLUSIVE_PREFIX"])
+g_prefix_sum_next_input               = ShaderCache.LazyShader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumNextInput")
+g_prefix_sum_resolve_parent           = ShaderCache.LazyShader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumResolveParent")
+g_prefix_sum_resolve_parent_exclusive = ShaderCache.LazyShader(file="utility/PrefixSum.hlsl", main_function="csPrefixSumResolveParent", defines=["EXCLUSIVE_PREFIX"])
 
 
 def allocate_args(input_counts):
@@ -46,7 +47,7 @@ def run(cmd_list, input_buffer, prefix_sum_args, is_exclusive=False, input_count
 
         cmd_list.dispatch(
             x=group_count, y=1, z=1,
-            shader=g_prefix_sum_group_exclusive if is_exclusive and iteration == 0 and group_count == 1 else g_prefix_sum_group,
+            shader=(g_prefix_sum_group_exclusive if is_exclusive and iteration == 0 and group_count == 1 else g_prefix_sum_group).get(),
             inputs=input_buffer if iteration == 0 else reduction_buffer_in,
             outputs=reduction_buffer_out,
             constants=[input_count, 0, output_offset, 0])
@@ -56,7 +57,7 @@ def run(cmd_list, input_buffer, prefix_sum_args, is_exclusive=False, input_count
             next_group_count = utils.divup(group_count, g_group_size)
             cmd_list.dispatch(
                 x=next_group_count, y=1, z=1,
-                shader=g_prefix_sum_next_input,
+                shader=g_prefix_sum_next_input.get(),
                 inputs=reduction_buffer_out,
                 outputs=reduction_buffer_in,
                 constants=[0, output_offset, 0, 0])
@@ -72,14 +73,14 @@ def run(cmd_list, input_buffer, prefix_sum_args, is_exclusive=False, input_count
         if i == len(pass_list) - 1 and is_exclusive:
             cmd_list.dispatch(
                 x=utils.divup(count, g_group_size), y=1, z=1,
-                shader=g_prefix_sum_resolve_parent_exclusive,
+                shader=g_prefix_sum_resolve_parent_exclusive.get(),
                 inputs=input_buffer,
                 outputs=reduction_buffer_out,
                 constants=const)
         else:
             cmd_list.dispatch(
                 x=utils.divup(count, g_group_size), y=1, z=1,
-                shader=g_prefix_sum_resolve_parent,
+                shader=g_prefix_sum_resolve_parent.get(),
                 outputs=reduction_buffer_out,
                 constants=const)
     return reduction_buffer_out
@@ -0,0 +1,72 @@
+# Progressive refinement.
+# While the camera moves the frame is rasterized at a reduced internal resolution, with fewer curve samples and OIT
+# slices, and upscaled to the window. Once input stops the image refines level by level to full quality over the next
+# few frames (which the frame cache then keeps re-presenting). Every level renders with the same rasterizer, so the
+# bin and resolution dependent buffers are allocated once at full resolution and shared by the smaller levels.
+
+import math
+import dataclasses
+
+from dataclasses import dataclass
+from src import RasterizerBinned
+
+
+@dataclass
+class Level:
+    scale: float  # Internal resolution scale.
+    tesselation_sample_count: int  # Cap of the curve sample count, None keeps the requested count.
+    oit_slice_count: int
+
+
+# Coarsest to full quality, the last level is the final image.
+LEVELS = [
+    Level(0.5,  4,    RasterizerBinned.OIT_SLICE_COUNTS[0]),
+    Level(0.75, 8,    RasterizerBinned.OIT_SLICE_COUNTS[1]),
+    Level(1.0,  None, RasterizerBinned.OIT_SLICE_COUNTS[2])
+]
+
+
+class ProgressiveRefinement:
+
+    def __init__(self, levels=LEVELS, frames_per_level=2):
+        self.levels = levels
+        self.frames_per_level = frames_per_level
+
+        # Frames since the camera stopped moving.
+        self.idle_frames = frames_per_level * len(levels)
+
+    @property
+    def level_index(self):
+        return min(self.idle_frames // self.frames_per_level, len(self.levels) - 1)
+
+    @property
+    def level(self):
+        return self.levels[self.level_index]
+
+    @property
+    def is_final(self):
+        return self.level_index == len(self.levels) - 1
+
+    def update(self, moving):
+        if moving:
+            self.idle_frames = 0
+        else:
+            self.idle_frames += 1
+
+        return self.level
+
+    def apply(self, context, level=None):
+        # The context rendered at the given (by default the current) level.
+        level = level if level is not None else self.level
+
+        sample_count = context.tesselation_sample_count
+        if level.tesselation_sample_count is not None:
+            sample_count = min(sample_count, level.tesselation_sample_count)
+
+        return dataclasses.replace(
+            context,
+            w=max(1, math.floor(context.w * level.scale)),
+            h=max(1, math.floor(context.h * level.scale)),
+            tesselation_sample_count=sample_count,
+            oit_slice_count=min(context.oit_slice_count, level.oit_slice_count)
+        )
@@ -3,13 +3,35 @@ import sys
 import numpy as np
 import coalpy.gpu as gpu
 
+from enum import Enum
 from dataclasses import dataclass
 from src import Utility
 from src import Budgets
+from src import OIT
+from src import FrameGraph
+from src import ShaderCache
+from src import TransientPool
 from src import StrandDeviceMemory
 
-s_vertex_setup  = gpu.Shader(file="VertexSetup.hlsl",  name="VertexSetup",  main_function="VertexSetup")
-s_segment_setup = gpu.Shader(file="SegmentSetup.hlsl", name="SegmentSetup", main_function="SegmentSetup")
+s_segment_setup = ShaderCache.LazyShader(file="SegmentSetup.hlsl", name="SegmentSetup", main_function="SegmentSetup")
+
+# Vertex setup of every strand position format, keyed by (format, instanced), see get_vertex_setup_key.
+s_vertex_setup = {
+    (f, instanced): ShaderCache.LazyShader(file="VertexSetup.hlsl", name="VertexSetup", main_function="VertexSetup",
+                                           defines=([] if f == StrandDeviceMemory.PositionFormat.FLOAT32 else
+                                                    ["POSITION_FORMAT_" + f.name]) +
+                                                   (["INSTANCED"] if instanced else []))
+    for f in StrandDeviceMemory.PositionFormat for instanced in [False, True]
+}
+
+
+def get_vertex_setup_key(strands: StrandDeviceMemory.StrandDeviceMemory):
+    return strands.position_format, strands.instanced
+
+
+# See OIT.py, the CPU mirror uses the same modes.
+OITMode = OIT.OITMode
+
 
 @dataclass
 class Context:
@@ -24,9 +46,13 @@ class Context:
     strand_particle_count: int
     tesselation: bool
     tesselation_sample_count: int
+    tesselation_error_bound: float  # Pixels, 0 selects the fixed sample count.
     oit : bool
     oit_opacity : float
     oit_overlay : float
+    oit_slice_count : int  # 1 to 128, see RasterizerBinned.OIT_SLICE_COUNTS.
+    oit_mode : OITMode
+    oit_kbuffer_size : int  # One of RasterizerBinned.OIT_KBUFFER_SIZES.
     target: gpu.Texture
 
 
@@ -53,6 +79,14 @@ class Rasterizer:
         # Resolution Dependent
         self.update_resolution_dependent_buffers(w, h)
 
+        # Record-once frame graph, see record().
+        self.frame_graph = FrameGraph.FrameGraph(
+            type(self).__name__,
+            self.declare_passes,
+            self.plan_key,
+            self.get_constants
+        )
+
     def create_resource_buffers(self):
         self.b_vertex_output = gpu.Buffer(
             name="VertexOutputBuffer",
@@ -67,25 +101,24 @@ class Rasterizer:
             element_count=Budgets.MAX_SEGMENTS
         )
 
-        self.b_segment_header = gpu.Buffer(
-            name="SegmentHeaderBuffer",
-            type=gpu.BufferType.Structured,
-            stride=Budgets.BYTE_SIZE_SEGMENT_HEADER_FORMAT,
-            element_count=Budgets.MAX_SEGMENTS * Budgets.BYTE_SIZE_SEGMENT_HEADER_FORMAT
+        # Transient, only read by the binning / coverage pass.
+        self.b_segment_header = TransientPool.TransientBuffer(
+            "SegmentHeaderBuffer",
+            Budgets.MAX_SEGMENTS * Budgets.BYTE_SIZE_SEGMENT_HEADER_FORMAT
         )
 
         self.b_segment_data = gpu.Buffer(
             name="SegmentDataBuffer",
             type=gpu.BufferType.Structured,
             stride=Budgets.BYTE_SIZE_SEGMENT_DATA_FORMAT,
-            element_count=Budgets.MAX_SEGMENTS * Budgets.BYTE_SIZE_SEGMENT_DATA_FORMAT
+            element_count=Budgets.MAX_SEGMENTS
         )
 
     def create_constant_buffers(self):
         self.cb_vertex_setup = gpu.Buffer(
             name="ConstantBufferVertex",
             type=gpu.BufferType.Structured,
-            stride=((4 * 4) * 4) + ((4 * 4) * 4) + (4 * 4),  # Matrix V, Matrix P, Params
+            stride=((4 * 4) * 4) + ((4 * 4) * 4) + (4 * 4) + (4 * 4),  # Matrix V, Matrix P, Params, Allocation
             element_count=1,
             usage=gpu.BufferUsage.Constant
         )
@@ -98,10 +131,10 @@ class Rasterizer:
             usage=gpu.BufferUsage.Constant
         )
 
-    def update_constant_buffers(self, context):
-        # Vertex Setup
-        context.cmd.upload_resource(
-            source=np.array([
+    def get_constants(self, context):
+        return [
+            # Vertex Setup
+            (self.cb_vertex_setup, np.array([
                 # _MatrixV
                 context.matrix_v[0, 0:4],
                 context.matrix_v[1, 0:4],
@@ -115,27 +148,50 @@ class Rasterizer:
                 context.matrix_p[3, 0:4],
 
                 # _VertexParams
-                [context.strand_count, context.strand_particle_count, 0, 0],
-            ], dtype='f'),
+                [context.strand_count, context.strand_particle_count, context.strands.strands_per_cluster,
+                 context.strands.instance_count],
 
-            destination=self.cb_vertex_setup
-        )
+                # _StrandAllocation
+                [context.strands.position_offset, context.strands.cluster_offset, 0, 0],
+            ], dtype='f')),
 
-        # Segment Setup
-        context.cmd.upload_resource(
-            source=np.array([context.segment_count, 0, 0, 0], dtype='f'),
-            destination=self.cb_segment_setup
-        )
+            # Segment Setup
+            (self.cb_segment_setup, np.array([context.segment_count, 0, 0, context.strand_particle_count], dtype='f'))
+        ]
+
+    def update_constant_buffers(self, context):
+        context.cmd.begin_marker("Update Constant Buffers")
+
+        for buffer, values in self.get_constants(context):
+            context.cmd.upload_resource(
+                source=values,
+                destination=buffer
+            )
+
+        context.cmd.end_marker()
+
+        # The frame graph shadow copies are stale now.
+        self.frame_graph.invalidate_constants()
 
     def update_resolution_dependent_buffers(self, w, h):
         if w <= self.mW and h <= self.mH:
             return
 
-        self.mW = w
-        self.mH = h
+        # Resolution dependent buffers only grow, smaller resolutions share them.
+        self.mW = max(w, self.mW)
+        self.mH = max(h, self.mH)
+
+    def get_buffer_clears(self, context):
+        # List of (name, buffer, value, count, mode) cleared at the start of the frame.
+        return []
 
     def clear_buffers(self, context):
-        pass
+        context.cmd.begin_marker("Clear Buffers")
+
+        for _, buffer, value, count, mode in self.get_buffer_clears(context):
+            Utility.clear_buffer(context.cmd, value, count, buffer, mode)
+
+        context.cmd.end_marker()
 
     def vertex_setup(self, context):
         context.cmd.begin_marker("VertexSetupPass")
@@ -144,16 +200,13 @@ class Rasterizer:
         vertex_count = context.strand_particle_count * context.strand_count
 
         context.cmd.dispatch(
-            shader=s_vertex_setup,
+            shader=s_vertex_setup[get_vertex_setup_key(context.strands)].get(),
 
             constants=[
                 self.cb_vertex_setup
             ],
 
-            inputs=[
-                context.strands.b_vertices,
-                context.strands.b_strands
-            ],
+            inputs=context.strands.get_position_buffers(),
 
             outputs=[
                 self.b_vertex_output
@@ -170,20 +223,19 @@ class Rasterizer:
         groupSize = 512
 
         context.cmd.dispatch(
-            shader=s_segment_setup,
+            shader=s_segment_setup.get(),
 
             constants=[
                 self.cb_segment_setup
             ],
 
             inputs=[
-                self.b_vertex_output,
-                context.strands.b_indices,
+                self.b_vertex_output
             ],
 
             outputs=[
                 self.b_segment_output,
-                self.b_segment_header,
+                self.b_segment_header.buffer,
                 self.b_segment_data
             ],
 
@@ -194,6 +246,7 @@ class Rasterizer:
 
     def new_frame(self, context):
         self.update_resolution_dependent_buffers(context.w, context.h)
+        self.frame_graph.prepare(context)
         self.update_constant_buffers(context)
         self.clear_buffers(context)
 
@@ -201,3 +254,49 @@ class Rasterizer:
         self.new_frame(context)
         self.vertex_setup(context)
         self.segment_setup(context)
+
+    def plan_key(self, context):
+        # Everything the recorded dispatches (launch sizes, bindings, shader permutations) depend on.
+        return (
+            context.w,
+            context.h,
+            self.mW,
+            self.mH,
+            context.strand_count,
+            context.segment_count,
+            context.strand_particle_count,
+            id(context.strands),
+            id(context.strands.b_strands),
+            context.strands.position_format,
+            context.strands.instanced,
+            id(context.target)
+        )
+
+    def declare_passes(self, graph, context):
+        for name, buffer, value, count, mode in self.get_buffer_clears(context):
+            graph.add_pass(
+                "Clear" + name,
+                lambda c, b=buffer, v=value, n=count, m=mode: Utility.clear_buffer(c.cmd, v, n, b, m),
+                outputs=[buffer],
+                overwrites=True
+            )
+
+        graph.add_pass(
+            "VertexSetup",
+            self.vertex_setup,
+            inputs=context.strands.get_position_buffers(),
+            outputs=[self.b_vertex_output]
+        )
+
+        graph.add_pass(
+            "SegmentSetup",
+            self.segment_setup,
+            inputs=[self.b_vertex_output],
+            outputs=[self.b_segment_output, self.b_segment_header, self.b_segment_data]
+        )
+
+    def record(self, context, exports=()):
+        # Frame graph counterpart of go(). The passes are recorded once and replayed, only changed constants are
+        # uploaded and passes that don't contribute to the target (or the exported buffers) are culled.
+        self.update_resolution_dependent_buffers(context.w, context.h)
+        self.frame_graph.execute(context, exports)
@@ -6,20 +6,58 @@ from src import Utility
 from src import Budgets
 from src import PrefixSum
 from src import Rasterizer
+from src import ShaderCache
+from src import TransientPool
 
 # Stage Kernels
-s_raster_bin            = gpu.Shader(file="RasterBin.hlsl",     name="RasterBin",     main_function="RasterBin")
-s_raster_bin_tes        = gpu.Shader(file="RasterBin.hlsl",     name="RasterBin",     main_function="RasterBin", defines=["RASTER_CURVE"])
-s_raster_fine           = gpu.Shader(file="RasterFine.hlsl",    name="RasterFine",    main_function="RasterFine")
-s_raster_fine_tes       = gpu.Shader(file="RasterFine.hlsl",    name="RasterFine",    main_function="RasterFine", defines=["RASTER_CURVE"])
-s_raster_fine_oit       = gpu.Shader(file="RasterFineOIT.hlsl", name="RasterFineOIT", main_function="RasterFineOIT")
-s_raster_fine_oit_tes   = gpu.Shader(file="RasterFineOIT.hlsl", name="RasterFineOIT", main_function="RasterFineOIT", defines=["RASTER_CURVE"])
-s_build_work_queue_args = gpu.Shader(file="WorkQueue.hlsl",     name="WorkQueueArgs", main_function="BuildWorkQueueArgs")
-s_build_work_queue      = gpu.Shader(file="WorkQueue.hlsl",     name="WorkQueue",     main_function="BuildWorkQueue")
+s_raster_bin            = ShaderCache.LazyShader(file="RasterBin.hlsl",     name="RasterBin",     main_function="RasterBin")
+s_raster_bin_tes        = ShaderCache.LazyShader(file="RasterBin.hlsl",     name="RasterBin",     main_function="RasterBin", defines=["RASTER_CURVE"])
+s_raster_bin_compacted     = ShaderCache.LazyShader(file="RasterBin.hlsl", name="RasterBin", main_function="RasterBin", defines=["COMPACTED_SEGMENTS"])
+s_raster_bin_compacted_tes = ShaderCache.LazyShader(file="RasterBin.hlsl", name="RasterBin", main_function="RasterBin", defines=["COMPACTED_SEGMENTS", "RASTER_CURVE"])
+s_raster_fine           = ShaderCache.LazyShader(file="RasterFine.hlsl",    name="RasterFine",    main_function="RasterFine")
+s_raster_fine_tes       = ShaderCache.LazyShader(file="RasterFine.hlsl",    name="RasterFine",    main_function="RasterFine", defines=["RASTER_CURVE"])
+s_raster_fine_oit_wb     = ShaderCache.LazyShader(file="RasterFineOIT.hlsl", name="RasterFineOIT", main_function="RasterFineOIT", defines=["WEIGHTED_BLENDED"])
+s_raster_fine_oit_wb_tes = ShaderCache.LazyShader(file="RasterFineOIT.hlsl", name="RasterFineOIT", main_function="RasterFineOIT", defines=["WEIGHTED_BLENDED", "RASTER_CURVE"])
+
+# Slice capacities of the OIT permutations, keyed by (capacity, curves, adaptive). The slice count is a runtime option
+# (1 to 128), the smallest capacity that fits it is selected since the smaller ones need less per-thread state.
+OIT_SLICE_COUNTS = [32, 64, 128]
+
+s_raster_fine_oit_slices = {
+    (n, curves, adaptive): ShaderCache.LazyShader(file="RasterFineOIT.hlsl", name="RasterFineOIT",
+                                                  main_function="RasterFineOIT",
+                                                  defines=["NUM_SLICES={}".format(n)] +
+                                                          (["RASTER_CURVE"] if curves else []) +
+                                                          (["ADAPTIVE_SLICES"] if adaptive else []))
+    for n in OIT_SLICE_COUNTS for curves in [False, True] for adaptive in [False, True]
+}
+
+# Fragments kept per pixel by the k-buffer OIT mode, keyed by (size, curves).
+OIT_KBUFFER_SIZES = [4, 8, 16]
+
+s_raster_fine_oit_kbuffer = {
+    (k, curves): ShaderCache.LazyShader(file="RasterFineOIT.hlsl", name="RasterFineOIT", main_function="RasterFineOIT",
+                                        defines=["KBUFFER", "KBUFFER_SIZE={}".format(k)] + (["RASTER_CURVE"] if curves else []))
+    for k in OIT_KBUFFER_SIZES for curves in [False, True]
+}
+
+s_build_work_queue_args = ShaderCache.LazyShader(file="WorkQueue.hlsl",     name="WorkQueueArgs", main_function="BuildWorkQueueArgs")
+s_build_work_queue      = ShaderCache.LazyShader(file="WorkQueue.hlsl",     name="WorkQueue",     main_function="BuildWorkQueue")
+
+s_build_compaction_flags = ShaderCache.LazyShader(file="SegmentCompaction.hlsl", name="CompactionFlags", main_function="BuildCompactionFlags")
+s_compact_segments       = ShaderCache.LazyShader(file="SegmentCompaction.hlsl", name="CompactSegments", main_function="CompactSegments")
+s_build_compaction_args  = ShaderCache.LazyShader(file="SegmentCompaction.hlsl", name="CompactionArgs",  main_function="BuildCompactionArgs")
+
+
+def get_oit_slice_capacity(slice_count):
+    return next(n for n in OIT_SLICE_COUNTS if slice_count <= n)
 
 
 class RasterizerBinned(Rasterizer.Rasterizer):
-    def __init__(self, w, h):
+    def __init__(self, w, h, segment_compaction=True):
+
+        # Bin only the segments that passed the segment setup, see compact_segments().
+        self.segment_compaction = segment_compaction
 
         self.bin_w = math.ceil(w / Budgets.TILE_SIZE_BIN)
         self.bin_h = math.ceil(h / Budgets.TILE_SIZE_BIN)
@@ -34,10 +72,16 @@ class RasterizerBinned(Rasterizer.Rasterizer):
         self.b_work_queue = None
         self.b_work_queue_args = None
         self.b_prefix_sum_args = None
+        self.b_compaction_flags = None
+        self.b_compaction_offsets = None
+        self.b_compaction_prefix_sum_args = None
+        self.b_compacted_segments = None
+        self.b_compaction_args = None
 
         # Constant buffers
         self.cb_raster_bin = None
         self.cb_raster_fine = None
+        self.cb_segment_compaction = None
 
         # Will invoke the creation of resources
         super().__init__(w, h)
@@ -45,11 +89,10 @@ class RasterizerBinned(Rasterizer.Rasterizer):
     def create_resource_buffers(self):
         super().create_resource_buffers()
 
-        self.b_bin_records = gpu.Buffer(
-            name="BinRecords",
-            type=gpu.BufferType.Structured,
-            stride=Budgets.BYTE_SIZE_BIN_RECORD_FORMAT,
-            element_count=math.ceil(Budgets.BYTE_SIZE_BIN_RECORD_POOL / Budgets.BYTE_SIZE_BIN_RECORD_FORMAT)
+        # Transient, dead once the work queue is built.
+        self.b_bin_records = TransientPool.TransientBuffer(
+            "BinRecords",
+            Budgets.BYTE_SIZE_BIN_RECORD_POOL
         )
 
         self.b_bin_records_counter = gpu.Buffer(
@@ -59,11 +102,10 @@ class RasterizerBinned(Rasterizer.Rasterizer):
             element_count=1
         )
 
-        self.b_work_queue = gpu.Buffer(
-            name="WorkQueue",
-            type=gpu.BufferType.Standard,
-            format=gpu.Format.R32_UINT,
-            element_count=math.ceil(Budgets.BYTE_SIZE_WORK_QUEUE_POOL / Budgets.BYTE_SIZE_WORK_QUEUE_FORMAT)
+        # Transient, only read by the fine pass.
+        self.b_work_queue = TransientPool.TransientBuffer(
+            "WorkQueue",
+            Budgets.BYTE_SIZE_WORK_QUEUE_POOL
         )
 
         self.b_work_queue_args = gpu.Buffer(
@@ -73,13 +115,38 @@ class RasterizerBinned(Rasterizer.Rasterizer):
             element_count=1
         )
 
+        if not self.segment_compaction:
+            return
+
+        self.b_compaction_flags = gpu.Buffer(
+            name="CompactionFlags",
+            type=gpu.BufferType.Standard,
+            format=gpu.Format.R32_UINT,
+            element_count=Budgets.MAX_SEGMENTS
+        )
+
+        self.b_compaction_prefix_sum_args = PrefixSum.allocate_args(Budgets.MAX_SEGMENTS)
+
+        # Transient, dead once the segments are binned.
+        self.b_compacted_segments = TransientPool.TransientBuffer(
+            "CompactedSegments",
+            Budgets.MAX_SEGMENTS * Budgets.BYTE_SIZE_COMPACTED_SEGMENT_FORMAT
+        )
+
+        self.b_compaction_args = gpu.Buffer(
+            name="CompactionArgs",
+            type=gpu.BufferType.Standard,
+            format=gpu.Format.RGBA_32_UINT,
+            element_count=1
+        )
+
     def create_constant_buffers(self):
         super().create_constant_buffers()
 
         self.cb_raster_bin = gpu.Buffer(
             name="ConstantBufferRasterBin",
             type=gpu.BufferType.Structured,
-            stride=(4 * 4) * 2,
+            stride=(4 * 4) * 3,
             element_count=1,
             usage=gpu.BufferUsage.Constant
         )
@@ -87,64 +154,96 @@ class RasterizerBinned(Rasterizer.Rasterizer):
         self.cb_raster_fine = gpu.Buffer(
             name="ConstantBufferRasterFine",
             type=gpu.BufferType.Structured,
-            stride=(4 * 4) * 2,
+            stride=(4 * 4) * 3,
             element_count=1,
             usage=gpu.BufferUsage.Constant
         )
 
-    def update_resolution_dependent_buffers(self, w, h):
-        if w <= self.mW and h <= self.mH:
-            return
+        self.cb_segment_compaction = gpu.Buffer(
+            name="ConstantBufferSegmentCompaction",
+            type=gpu.BufferType.Structured,
+            stride=(4 * 4),
+            element_count=1,
+            usage=gpu.BufferUsage.Constant
+        )
+
+    def get_bin_count(self, bin_w=None, bin_h=None):
+        return (bin_w or self.bin_w) * (bin_h or self.bin_h)
+
+    def get_binned_segment_count(self, context):
+        # Length of the segment setup output the binning reads.
+        return context.segment_count
 
+    def get_compaction_element_count(self, context):
+        # Curves are compacted (and binned) as groups of 3 segments.
+        segment_count = self.get_binned_segment_count(context)
+        return math.ceil(segment_count / 3) if context.tesselation else segment_count
+
+    def update_resolution_dependent_buffers(self, w, h):
+        # The bin grid follows the resolution every frame, the bin buffers are only reallocated to grow.
         self.bin_w = math.ceil(w / Budgets.TILE_SIZE_BIN)
         self.bin_h = math.ceil(h / Budgets.TILE_SIZE_BIN)
 
+        if w <= self.mW and h <= self.mH:
+            return
+
         super().update_resolution_dependent_buffers(w, h)
 
+        bin_capacity = self.get_bin_count(math.ceil(self.mW / Budgets.TILE_SIZE_BIN),
+                                          math.ceil(self.mH / Budgets.TILE_SIZE_BIN))
+
+        if bin_capacity > Budgets.MAX_BINS:
+            raise ValueError("{} bins exceed the bin index of the bin records ({} bins).".format(
+                bin_capacity, Budgets.MAX_BINS))
+
         self.b_bin_counters = gpu.Buffer(
             name="BinCountBuffer",
             type=gpu.BufferType.Standard,
             format=gpu.Format.R32_UINT,
-            element_count=self.bin_w * self.bin_h
+            element_count=bin_capacity
         )
 
         self.b_bin_min_z = gpu.Buffer(
             name="BinMinZ",
             type=gpu.BufferType.Standard,
             format=gpu.Format.R32_UINT,
-            element_count=self.bin_w * self.bin_h
+            element_count=bin_capacity
         )
 
         self.b_bin_max_z = gpu.Buffer(
             name="BinMaxZ",
             type=gpu.BufferType.Standard,
             format=gpu.Format.R32_UINT,
-            element_count=self.bin_w * self.bin_h
+            element_count=bin_capacity
         )
 
-        self.b_prefix_sum_args = PrefixSum.allocate_args(self.bin_w * self.bin_h)
+        self.b_prefix_sum_args = PrefixSum.allocate_args(bin_capacity)
 
-    def update_constant_buffers(self, context):
-        context.cmd.begin_marker("Update Constant Buffers")
-
-        super().update_constant_buffers(context)
-
-        context.cmd.upload_resource(
-            source=np.array([
+    def get_constants(self, context):
+        return super().get_constants(context) + [
+            (self.cb_raster_bin, np.array([
                 context.segment_count,
                 context.w,
                 context.h,
                 Budgets.TILE_SIZE_BIN,
                 self.bin_w,
                 self.bin_h,
-                context.tesselation_sample_count
-
-            ], dtype='f'),
-            destination=self.cb_raster_bin
-        )
-
-        context.cmd.upload_resource(
-            source=np.array([
+                context.tesselation_sample_count,
+                context.tesselation_error_bound,
+                context.segment_count,  # Segment stride, only read by the multi-view permutation.
+                self.get_compaction_element_count(context),
+                0,
+                0
+            ], dtype='f')),
+
+            (self.cb_segment_compaction, np.array([
+                self.get_compaction_element_count(context),
+                3 if context.tesselation else 1,
+                0,
+                0
+            ], dtype='f')),
+
+            (self.cb_raster_fine, np.array([
                 context.w,
                 context.h,
                 Budgets.TILE_SIZE_BIN,
@@ -152,82 +251,137 @@ class RasterizerBinned(Rasterizer.Rasterizer):
                 self.bin_h,
                 context.tesselation_sample_count,
                 context.oit_opacity,
-                context.oit_overlay
-            ], dtype='f'),
-            destination=self.cb_raster_fine
-        )
-
-        context.cmd.end_marker()
-
-    def clear_buffers(self, context):
-        context.cmd.begin_marker("Clear Buffers")
-
-        super().clear_buffers(context)
-
-        Utility.clear_buffer(
-            context.cmd,
-            0,
-            1,
-            self.b_bin_records_counter,
-            Utility.ClearMode.UINT
-        )
-
-        Utility.clear_buffer(
-            context.cmd,
-            0,
-            self.bin_w * self.bin_h,
-            self.b_bin_counters,
-            Utility.ClearMode.UINT
+                context.oit_overlay,
+                context.tesselation_error_bound,
+                1,  # Atlas columns, only read by the multi-view permutation.
+                context.oit_slice_count,
+                context.strand_particle_count
+            ], dtype='f'))
+        ]
+
+    def get_buffer_clears(self, context):
+        bin_count = self.get_bin_count()
+
+        return super().get_buffer_clears(context) + [
+            ("BinRecordsCounter", self.b_bin_records_counter, 0,             1,         Utility.ClearMode.UINT),
+            ("BinCounters",       self.b_bin_counters,        0,             bin_count, Utility.ClearMode.UINT),
+            ("BinMinZ",           self.b_bin_min_z,           (1 << 31) - 1, bin_count, Utility.ClearMode.UINT),  # Max int
+            ("BinMaxZ",           self.b_bin_max_z,           0,             bin_count, Utility.ClearMode.UINT)
+        ]
+
+    def compact_segments(self, context):
+        context.cmd.begin_marker("CompactSegments")
+
+        element_count = self.get_compaction_element_count(context)
+
+        # 1) Flag the elements (segments, or curves) that passed the segment setup.
+        context.cmd.dispatch(
+            shader=s_build_compaction_flags.get(),
+            constants=[
+                self.cb_segment_compaction
+            ],
+            inputs=[
+                self.b_segment_output
+            ],
+            outputs=[
+                self.b_compaction_flags
+            ],
+            x=math.ceil(element_count / Budgets.NUM_LANE_PER_WAVE)
         )
 
-        Utility.clear_buffer(
+        # 2) Generate the offsets into the compacted list, by performing a prefix sum on the flags.
+        self.b_compaction_offsets = PrefixSum.run(
             context.cmd,
-            (1 << 31) - 1, # Max int
-            self.bin_w * self.bin_h,
-            self.b_bin_min_z,
-            Utility.ClearMode.UINT
+            self.b_compaction_flags,
+            self.b_compaction_prefix_sum_args,
+            False,
+            element_count
         )
 
-        Utility.clear_buffer(
-            context.cmd,
-            0,
-            self.bin_w * self.bin_h,
-            self.b_bin_max_z,
-            Utility.ClearMode.UINT
+        # 3) Scatter the surviving segments into the compacted list.
+        context.cmd.dispatch(
+            shader=s_compact_segments.get(),
+            constants=[
+                self.cb_segment_compaction
+            ],
+            inputs=[
+                self.b_compaction_flags,
+                self.b_compaction_offsets
+            ],
+            outputs=[
+                self.b_compacted_segments.buffer
+            ],
+            x=math.ceil(element_count / Budgets.NUM_LANE_PER_WAVE)
         )
 
-        context.cmd.end_marker()
-
-    def raster_bin(self, context):
-        context.cmd.begin_marker("BinPass")
-
+        # 4) Derive the binning launch size from the compacted segment count.
         context.cmd.dispatch(
-            shader=s_raster_bin_tes if context.tesselation else s_raster_bin,
-
+            shader=s_build_compaction_args.get(),
             constants=[
-                self.cb_raster_bin
+                self.cb_segment_compaction
             ],
-
             inputs=[
-                self.b_segment_output,
-                self.b_segment_data,
-                self.b_vertex_output,
-                self.b_segment_header
+                self.b_compaction_offsets
             ],
-
             outputs=[
-                self.b_bin_records,
-                self.b_bin_records_counter,
-                self.b_bin_counters,
-                self.b_bin_min_z,
-                self.b_bin_max_z
+                self.b_compaction_args
             ],
-
-            x=math.ceil(context.segment_count / Budgets.NUM_LANE_PER_WAVE)
+            x=1
         )
 
         context.cmd.end_marker()
-        
+
+    def get_raster_bin_shader(self, context):
+        if self.segment_compaction:
+            return s_raster_bin_compacted_tes if context.tesselation else s_raster_bin_compacted
+
+        return s_raster_bin_tes if context.tesselation else s_raster_bin
+
+    def raster_bin(self, context):
+        context.cmd.begin_marker("BinPass")
+
+        inputs = [
+            self.b_segment_output,
+            self.b_segment_data,
+            self.b_vertex_output,
+            self.b_segment_header.buffer
+        ]
+
+        outputs = [
+            self.b_bin_records.buffer,
+            self.b_bin_records_counter,
+            self.b_bin_counters,
+            self.b_bin_min_z,
+            self.b_bin_max_z
+        ]
+
+        if self.segment_compaction:
+            # Indirectly dispatch over the surviving segments only.
+            context.cmd.dispatch(
+                indirect_args=self.b_compaction_args,
+                shader=self.get_raster_bin_shader(context).get(),
+                constants=[
+                    self.cb_raster_bin
+                ],
+                inputs=inputs + [
+                    self.b_compacted_segments.buffer,
+                    self.b_compaction_offsets
+                ],
+                outputs=outputs
+            )
+        else:
+            context.cmd.dispatch(
+                shader=self.get_raster_bin_shader(context).get(),
+                constants=[
+                    self.cb_raster_bin
+                ],
+                inputs=inputs,
+                outputs=outputs,
+                x=math.ceil(context.segment_count / Budgets.NUM_LANE_PER_WAVE)
+            )
+
+        context.cmd.end_marker()
+
     def build_work_queue(self, context):
 
         context.cmd.begin_marker("BuildWorkQueue")
@@ -238,12 +392,12 @@ class RasterizerBinned(Rasterizer.Rasterizer):
             self.b_bin_counters,
             self.b_prefix_sum_args,
             True,
-            self.bin_w * self.bin_h
+            self.get_bin_count()
         )
 
         # 2) Derive a dispatch launch size from the amount of bin records.
         context.cmd.dispatch(
-            shader=s_build_work_queue_args,
+            shader=s_build_work_queue_args.get(),
             inputs=[
                 self.b_bin_records_counter
             ],
@@ -256,14 +410,14 @@ class RasterizerBinned(Rasterizer.Rasterizer):
         # 3) Indirectly dispatch the work queue construction.
         context.cmd.dispatch(
             indirect_args=self.b_work_queue_args,
-            shader=s_build_work_queue,
+            shader=s_build_work_queue.get(),
             inputs=[
                 self.b_bin_offsets,
-                self.b_bin_records,
+                self.b_bin_records.buffer,
                 self.b_bin_records_counter
             ],
             outputs=[
-                self.b_work_queue
+                self.b_work_queue.buffer
             ]
         )
 
@@ -272,20 +426,25 @@ class RasterizerBinned(Rasterizer.Rasterizer):
     def raster_fine(self, context):
         context.cmd.begin_marker("FinePass")
 
-        if context.oit:
-            shader = s_raster_fine_oit_tes if context.tesselation else s_raster_fine_oit
+        if context.oit and context.oit_mode == Rasterizer.OITMode.KBUFFER:
+            shader = s_raster_fine_oit_kbuffer[(context.oit_kbuffer_size, context.tesselation)]
+        elif context.oit and context.oit_mode == Rasterizer.OITMode.WEIGHTED_BLENDED:
+            shader = s_raster_fine_oit_wb_tes if context.tesselation else s_raster_fine_oit_wb
+        elif context.oit:
+            shader = s_raster_fine_oit_slices[(get_oit_slice_capacity(context.oit_slice_count), context.tesselation,
+                                               context.oit_mode == Rasterizer.OITMode.ADAPTIVE_SLICES)]
         else:
             shader = s_raster_fine_tes if context.tesselation else s_raster_fine
 
         context.cmd.dispatch(
-            shader=shader,
+            shader=shader.get(),
 
             constants=[
                 self.cb_raster_fine
             ],
 
             inputs=[
-                self.b_work_queue,
+                self.b_work_queue.buffer,
                 self.b_bin_offsets,
                 self.b_bin_counters,
                 self.b_segment_data,
@@ -310,13 +469,67 @@ class RasterizerBinned(Rasterizer.Rasterizer):
         # 1) Dispatch geometry processing and segment setup stages.
         super().go(context)
 
-        # 2) Binning Stage
+        # 2) Compaction of the surviving segments
+        if self.segment_compaction:
+            self.compact_segments(context)
+
+        # 3) Binning Stage
         self.raster_bin(context)
 
-        # 3) Work Queue
+        # 4) Work Queue
         self.build_work_queue(context)
 
-        # 4) Fine Stage
+        # 5) Fine Stage
         self.raster_fine(context)
 
         context.cmd.end_marker()
+
+    def plan_key(self, context):
+        return super().plan_key(context) + (context.tesselation, context.oit,
+                                            get_oit_slice_capacity(context.oit_slice_count),
+                                            context.oit_mode, context.oit_kbuffer_size)
+
+    def declare_passes(self, graph, context):
+        super().declare_passes(graph, context)
+
+        # Only the sliced and weighted blended OIT resolves read the bin depth range, otherwise it is left out so its
+        # clears are culled.
+        depth_range = context.oit and context.oit_mode != Rasterizer.OITMode.KBUFFER
+        bin_depth = [self.b_bin_min_z, self.b_bin_max_z] if depth_range else []
+
+        compacted_segments = []
+
+        if self.segment_compaction:
+            graph.add_pass(
+                "CompactSegments",
+                self.compact_segments,
+                inputs=[self.b_segment_output],
+                outputs=[self.b_compaction_flags, self.b_compaction_prefix_sum_args[0],
+                         self.b_compaction_prefix_sum_args[1], self.b_compacted_segments, self.b_compaction_args]
+            )
+
+            compacted_segments = [self.b_compacted_segments, self.b_compaction_prefix_sum_args[1],
+                                  self.b_compaction_args]
+
+        graph.add_pass(
+            "Bin",
+            self.raster_bin,
+            inputs=[self.b_segment_output, self.b_segment_data, self.b_vertex_output,
+                    self.b_segment_header] + compacted_segments,
+            outputs=[self.b_bin_records, self.b_bin_records_counter, self.b_bin_counters] + bin_depth
+        )
+
+        graph.add_pass(
+            "BuildWorkQueue",
+            self.build_work_queue,
+            inputs=[self.b_bin_counters, self.b_bin_records, self.b_bin_records_counter],
+            outputs=[self.b_prefix_sum_args[0], self.b_prefix_sum_args[1], self.b_work_queue_args, self.b_work_queue]
+        )
+
+        graph.add_pass(
+            "Fine",
+            self.raster_fine,
+            inputs=[self.b_work_queue, self.b_prefix_sum_args[1], self.b_bin_counters, self.b_segment_data,
+                    self.b_vertex_output] + bin_depth,
+            outputs=[context.target]
+        )
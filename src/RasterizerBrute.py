@@ -5,9 +5,11 @@ import coalpy.gpu as gpu
 from src import Utility
 from src import Budgets
 from src import Rasterizer
+from src import ShaderCache
+from src import TransientPool
 
-s_raster_coverage = gpu.Shader(file="brute/RasterCoverage.hlsl", name="RasterCoverage", main_function="RasterCoverage")
-s_raster_resolve  = gpu.Shader(file="brute/RasterResolve.hlsl",  name="RasterResolve",  main_function="RasterResolve")
+s_raster_coverage = ShaderCache.LazyShader(file="brute/RasterCoverage.hlsl", name="RasterCoverage", main_function="RasterCoverage")
+s_raster_resolve  = ShaderCache.LazyShader(file="brute/RasterResolve.hlsl",  name="RasterResolve",  main_function="RasterResolve")
 
 
 class RasterizerBrute(Rasterizer.Rasterizer):
@@ -34,11 +36,10 @@ class RasterizerBrute(Rasterizer.Rasterizer):
             element_count=1
         )
 
-        self.b_fragment_data = gpu.Buffer(
-            name="FragmentDataBuffer",
-            type=gpu.BufferType.Structured,
-            stride=Budgets.BYTE_SIZE_FRAGMENT_DATA_FORMAT,
-            element_count=math.ceil(Budgets.BYTE_SIZE_FRAGMENT_DATA_POOL / Budgets.BYTE_SIZE_FRAGMENT_DATA_FORMAT)
+        # Transient, only read by the resolve pass.
+        self.b_fragment_data = TransientPool.TransientBuffer(
+            "FragmentDataBuffer",
+            Budgets.BYTE_SIZE_FRAGMENT_DATA_POOL
         )
 
     def update_resolution_dependent_buffers(self, w, h):
@@ -47,10 +48,11 @@ class RasterizerBrute(Rasterizer.Rasterizer):
 
         super().update_resolution_dependent_buffers(w, h)
 
+        # Sized for the grown resolution, every resolution up to it indexes the buffer with its own width.
         self.b_head_pointer = gpu.Buffer(
             name="HeadPointerBuffer",
             type=gpu.BufferType.Raw,
-            element_count=w*h
+            element_count=self.mW * self.mH
         )
 
     def create_constant_buffers(self):
@@ -64,46 +66,22 @@ class RasterizerBrute(Rasterizer.Rasterizer):
             is_constant_buffer=True
         )
 
-    def update_constant_buffers(self, context):
-        context.cmd.begin_marker("Update Constant Buffers")
-
-        super().update_constant_buffers(context)
-
-        context.cmd.upload_resource(
-            source=np.array([context.segment_count, context.w, context.h, 0], dtype='f'),
-            destination=self.cb_brute
-        )
-
-        context.cmd.end_marker()
-
-    def clear_buffers(self, context):
-        context.cmd.begin_marker("Clear Buffers")
-
-        super().clear_buffers(context)
-
-        Utility.clear_buffer(
-            context.cmd,
-            0,
-            1,
-            self.b_fragment_counter,
-            Utility.ClearMode.UINT
-        )
-
-        Utility.clear_buffer(
-            context.cmd,
-            -1,
-            context.w * context.h,
-            self.b_head_pointer,
-            Utility.ClearMode.RAW
-        )
+    def get_constants(self, context):
+        return super().get_constants(context) + [
+            (self.cb_brute, np.array([context.segment_count, context.w, context.h, 0], dtype='f'))
+        ]
 
-        context.cmd.end_marker()
+    def get_buffer_clears(self, context):
+        return super().get_buffer_clears(context) + [
+            ("FragmentCounter", self.b_fragment_counter, 0,  1,                   Utility.ClearMode.UINT),
+            ("HeadPointer",     self.b_head_pointer,     -1, context.w * context.h, Utility.ClearMode.RAW)
+        ]
 
     def raster_coverage(self, context):
         context.cmd.begin_marker("Coverage")
 
         context.cmd.dispatch(
-            shader=s_raster_coverage,
+            shader=s_raster_coverage.get(),
 
             constants=[
                 self.cb_brute
@@ -111,7 +89,7 @@ class RasterizerBrute(Rasterizer.Rasterizer):
 
             inputs=[
                 self.b_segment_output,
-                self.b_segment_header,
+                self.b_segment_header.buffer,
                 self.b_segment_data,
                 self.b_vertex_output
             ],
@@ -119,7 +97,7 @@ class RasterizerBrute(Rasterizer.Rasterizer):
             outputs=[
                 self.b_fragment_counter,
                 self.b_head_pointer,
-                self.b_fragment_data,
+                self.b_fragment_data.buffer,
             ],
 
             x=math.ceil(context.segment_count / Budgets.NUM_LANE_PER_WAVE)
@@ -131,7 +109,7 @@ class RasterizerBrute(Rasterizer.Rasterizer):
         context.cmd.begin_marker("Resolve")
 
         context.cmd.dispatch(
-            shader=s_raster_resolve,
+            shader=s_raster_resolve.get(),
 
             constants=[
                 self.cb_brute
@@ -139,7 +117,7 @@ class RasterizerBrute(Rasterizer.Rasterizer):
 
             inputs=[
                 self.b_head_pointer,
-                self.b_fragment_data,
+                self.b_fragment_data.buffer,
             ],
 
             outputs=[
@@ -165,3 +143,20 @@ class RasterizerBrute(Rasterizer.Rasterizer):
         self.raster_resolve(context)
 
         context.cmd.end_marker()
+
+    def declare_passes(self, graph, context):
+        super().declare_passes(graph, context)
+
+        graph.add_pass(
+            "Coverage",
+            self.raster_coverage,
+            inputs=[self.b_segment_output, self.b_segment_header, self.b_segment_data, self.b_vertex_output],
+            outputs=[self.b_fragment_counter, self.b_head_pointer, self.b_fragment_data]
+        )
+
+        graph.add_pass(
+            "Resolve",
+            self.raster_resolve,
+            inputs=[self.b_head_pointer, self.b_fragment_data],
+            outputs=[context.target]
+        )
@@ -0,0 +1,545 @@
+# NumPy (CPU) mirror of the binned rasterizer, for render nodes without a GPU.
+# The stages of VertexSetup.hlsl, SegmentSetup.hlsl, SegmentCompaction.hlsl, RasterBin.hlsl (with the WorkQueue.hlsl
+# compaction) and RasterFine.hlsl / RasterFineOIT.hlsl (slices, k-buffer and weighted blended) are mirrored for linear
+# segments. Setup and binning are vectorized over every segment, the fine stage resolves a list of bins at a time so it
+# can be split across workers (see RasterizerCPUTiled.py and RasterizerCPUThreaded.py).
+
+import math
+import numpy as np
+
+from dataclasses import dataclass
+from src import Budgets
+from src import OIT
+
+# Cohen-Sutherland out codes, see SegmentSetup.hlsl.
+INSIDE = 0
+LEFT   = 1
+RIGHT  = 2
+BOTTOM = 4
+TOP    = 8
+
+# Padding (pixels) of the segment / bin overlap test, see SegmentsIntersectsBin.
+BIN_PAD = 10
+
+# Depth slices of the OIT resolve, fragments of the k-buffer and buckets of the adaptive slice histogram, see
+# RasterFineOIT.hlsl.
+NUM_SLICES = 128
+KBUFFER_SIZE = 8
+HISTOGRAM_SIZE = 64
+HISTOGRAM_EMPTY_BUCKETS = 16
+
+COLOR_ROOT = np.array([1, 0, 1], dtype='f')
+COLOR_TIP  = np.array([0, 1, 1], dtype='f')
+
+
+@dataclass
+class Context:
+    w: int
+    h: int
+    matrix_v: np.ndarray
+    matrix_p: np.ndarray
+    vertices: np.ndarray  # (strand_count * strand_particle_count, 3) object space positions, in vertex ID order.
+    strand_count: int
+    strand_particle_count: int
+    target: np.ndarray  # (h, w, 4) float32
+    oit: bool = False
+    oit_opacity: float = 0.21
+    oit_slice_count: int = NUM_SLICES
+    oit_mode: OIT.OITMode = OIT.OITMode.SLICES
+    oit_kbuffer_size: int = KBUFFER_SIZE  # Fragments kept by the k-buffer mode.
+
+
+def get_vertex_tex_coords(strand_count, strand_particle_count):
+    # Mirror of the procedural vertex UV packing in VertexSetup.hlsl.
+    unorm_u0 = int(65535 * 0.5)
+    unorm_vk = int(65535 / (strand_particle_count - 1))
+
+    k = np.arange(strand_particle_count, dtype=np.int64)
+    tex_coord = (((unorm_vk * k) << 16) | unorm_u0) / 0xffffffff
+
+    return np.tile(tex_coord, strand_count).astype('f')
+
+
+def get_segment_indices(strand_count, strand_particle_count):
+    # Mirror of the procedural indices in SegmentSetup.hlsl, (segment count, 2).
+    segments_per_strand = strand_particle_count - 1
+
+    s = np.arange(strand_count * segments_per_strand)
+    vi0 = (s // segments_per_strand) * strand_particle_count + (s % segments_per_strand)
+
+    return np.stack([vi0, vi0 + 1], axis=1).astype(np.uint32)
+
+
+def compact_segments(segment_output, segments_per_element=1):
+    # Mirror of SegmentCompaction.hlsl: the first segment of every element (segment, or curve of 3 segments) with a
+    # segment that passed the segment setup, in order.
+    element_count = math.ceil(len(segment_output) / segments_per_element)
+
+    padded = np.zeros(element_count * segments_per_element, dtype=np.uint32)
+    padded[:len(segment_output)] = segment_output
+
+    flags = padded.reshape(element_count, segments_per_element).any(axis=1)
+    offsets = np.cumsum(flags)  # Inclusive, see PrefixSum.py.
+
+    compacted = np.zeros(offsets[-1] if element_count else 0, dtype=np.uint32)
+    compacted[offsets[flags] - 1] = np.nonzero(flags)[0] * segments_per_element
+
+    return compacted
+
+
+def get_bin_records(buffers):
+    # The (segment, bin, offset in bin) records the work queue was built from, see RasterBin.hlsl.
+    counters = buffers["bin_counters"].astype(np.int64)
+    bin_index = np.repeat(np.arange(len(counters)), counters)
+    bin_offset = np.arange(counters.sum()) - np.repeat(buffers["bin_offsets"].astype(np.int64), counters)
+    return buffers["work_queue"], bin_index, bin_offset
+
+
+def build_work_queue(bin_counters, segment_index, bin_index, bin_offset):
+    # Mirror of WorkQueue.hlsl: the exclusive prefix sum of the bin counters and the scatter of the bin records.
+    bin_offsets = (np.cumsum(bin_counters, dtype=np.int64) - bin_counters).astype(np.uint32)
+
+    work_queue = np.zeros(len(segment_index), dtype=np.uint32)
+    work_queue[bin_offsets[bin_index].astype(np.int64) + bin_offset] = segment_index
+
+    return bin_offsets, work_queue
+
+
+def smoothstep(edge0, edge1, x):
+    t = np.clip((x - edge0) / (edge1 - edge0), 0.0, 1.0)
+    return t * t * (3 - 2 * t)
+
+
+def distance_to_segment_and_t_value(p, a, b):
+    # Vectorized DistanceToSegmentAndTValue, every argument is (..., 2) and broadcasts.
+    ba = b - a
+    pa = p - a
+
+    denominator = np.sum(ba * ba, axis=-1)
+    t = np.clip(np.sum(pa * ba, axis=-1) / np.where(denominator > 0, denominator, 1), 0.0, 1.0)
+
+    v = pa - t[..., None] * ba
+    return np.sqrt(np.sum(v * v, axis=-1)), t
+
+
+def compute_out_code(x, y):
+    code = np.zeros(x.shape, dtype=np.uint32)
+    code |= np.where(x < -1, LEFT, np.where(x > 1, RIGHT, INSIDE)).astype(np.uint32)
+    code |= np.where(y < -1, BOTTOM, np.where(y > 1, TOP, INSIDE)).astype(np.uint32)
+    return code
+
+
+def clip_segments_cohen_sutherland(x0, y0, x1, y1):
+    # Vectorized ClipSegmentCohenSutherland, returns the accept mask and the clipped end points.
+    x0, y0, x1, y1 = x0.copy(), y0.copy(), x1.copy(), y1.copy()
+
+    out_code0 = compute_out_code(x0, y0)
+    out_code1 = compute_out_code(x1, y1)
+
+    accept = np.zeros(x0.shape, dtype=bool)
+    pending = np.ones(x0.shape, dtype=bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        while pending.any():
+            accept |= pending & ((out_code0 | out_code1) == 0)
+            pending &= ((out_code0 | out_code1) != 0) & ((out_code0 & out_code1) == 0)
+
+            i = np.nonzero(pending)[0]
+            if len(i) == 0:
+                break
+
+            out_code_out = np.maximum(out_code0[i], out_code1[i])
+            dx = x1[i] - x0[i]
+            dy = y1[i] - y0[i]
+
+            top    = (out_code_out & TOP) != 0
+            bottom = ~top & ((out_code_out & BOTTOM) != 0)
+            right  = ~top & ~bottom & ((out_code_out & RIGHT) != 0)
+
+            edge_y = np.where(top, 1.0, -1.0)
+            edge_x = np.where(right, 1.0, -1.0)
+
+            horizontal = top | bottom
+            x = np.where(horizontal, x0[i] + dx * (edge_y - y0[i]) / dy, edge_x)
+            y = np.where(horizontal, edge_y, y0[i] + dy * (edge_x - x0[i]) / dx)
+
+            first = out_code_out == out_code0[i]
+
+            j = i[first]
+            x0[j], y0[j] = x[first], y[first]
+            out_code0[j] = compute_out_code(x0[j], y0[j])
+
+            j = i[~first]
+            x1[j], y1[j] = x[~first], y[~first]
+            out_code1[j] = compute_out_code(x1[j], y1[j])
+
+    return accept, x0, y0, x1, y1
+
+
+def get_fragments(buffers, w, h, bin_w, b, local_x, local_y):
+    # Pixels of bin b inside the target, and the coverage / depth / tex coord of every (pixel, bin segment) pair.
+    vertex_ndc = buffers["vertex_ndc"]
+    vertex_tex_coord = buffers["vertex_tex_coord"]
+    segment_data = buffers["segment_data"]
+    bin_offsets = buffers["bin_offsets"]
+    bin_counters = buffers["bin_counters"]
+
+    tile = Budgets.TILE_SIZE_BIN
+
+    x = (b % bin_w) * tile + local_x
+    y = (b // bin_w) * tile + local_y
+
+    # Writes outside of the target are dropped.
+    inside = (x < w) & (y < h)
+    x = x[inside]
+    y = y[inside]
+
+    segment_index = buffers["work_queue"][bin_offsets[b]:bin_offsets[b] + bin_counters[b]]
+    vi = segment_data[segment_index]
+
+    # We want the barycentric between the original segment vertices, not the clipped vertices.
+    p0 = vertex_ndc[vi[:, 0]]
+    p1 = vertex_ndc[vi[:, 1]]
+
+    # Convert the pixel coordinates to NDC.
+    uvh = np.stack([-1 + 2 * (x + 0.5) / w, -1 + 2 * (y + 0.5) / h], axis=1).astype('f')
+
+    distance, t = distance_to_segment_and_t_value(uvh[:, None, :], p0[None, :, 0:2], p1[None, :, 0:2])
+    coverage = 1 - smoothstep(0.0, 2 / h, distance)
+
+    z = (1 - t) * p0[None, :, 2] + t * p1[None, :, 2]
+    tex_coord = (1 - t) * vertex_tex_coord[vi[:, 0]][None, :] + t * vertex_tex_coord[vi[:, 1]][None, :]
+
+    return x, y, coverage, z, tex_coord
+
+
+def get_fragment_color(tex_coord):
+    return COLOR_ROOT + (COLOR_TIP - COLOR_ROOT) * tex_coord[..., None]
+
+
+def composite(color, alpha):
+    # Ordered transmittance function over (pixel, fragment) premultiplied colors, front to back along the fragments.
+    transmittance = np.cumprod(1 - alpha, axis=1)
+    transmittance_before = np.concatenate([np.ones((len(alpha), 1), dtype=transmittance.dtype),
+                                           transmittance[:, :-1]], axis=1)
+
+    return np.sum(color * transmittance_before[..., None], axis=1), transmittance[:, -1]
+
+
+def resolve_bin(buffers, w, h, bin_w, b, local_x, local_y, target):
+    # Mirror of RasterFine, the closest covering segment wins.
+    if buffers["bin_counters"][b] == 0:
+        x, y, _, _, _ = get_fragments(buffers, w, h, bin_w, b, local_x, local_y)
+        target[y, x] = (0, 0, 0, 1)
+        return
+
+    x, y, coverage, z, tex_coord = get_fragments(buffers, w, h, bin_w, b, local_x, local_y)
+
+    # The first one wins ties (strict greater than in the shader).
+    nearest = np.argmax(np.where(coverage > 0, z, -np.inf), axis=1)[:, None]
+    covered = np.take_along_axis(coverage, nearest, axis=1)[:, 0]
+    tex_coord = np.take_along_axis(tex_coord, nearest, axis=1)[:, 0]
+
+    target[y, x, 0:3] = get_fragment_color(tex_coord) * covered[:, None]
+    target[y, x, 3] = 1
+
+
+def get_depth_fraction(buffers, b, z):
+    # Depth within the bin depth range, from the max (0) to the min (1) z.
+    bin_min_z = buffers["bin_min_z"][b]
+    bin_max_z = buffers["bin_max_z"][b]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = (z - bin_max_z) / (bin_min_z - bin_max_z)
+    return np.clip(np.nan_to_num(fraction), 0, 1)
+
+
+def get_depth_cdf(buffers, w, h, bin_w, b):
+    # Mirror of BuildDepthHistogram, the cumulative depth distribution (HISTOGRAM_SIZE + 1 points, front to back) of
+    # the bin segments where they're closest to the bin center, blended with the linear one by the empty buckets.
+    bin_offset = buffers["bin_offsets"][b]
+    segment_index = buffers["work_queue"][bin_offset:bin_offset + buffers["bin_counters"][b]]
+    vi = buffers["segment_data"][segment_index]
+
+    p0 = buffers["vertex_ndc"][vi[:, 0]]
+    p1 = buffers["vertex_ndc"][vi[:, 1]]
+
+    tile_size_ss = 2.0 * Budgets.TILE_SIZE_BIN / np.array([w, h], dtype='f')
+    center = -1 + (np.array([b % bin_w, b // bin_w]) + 0.5) * tile_size_ss
+
+    _, t = distance_to_segment_and_t_value(center[None, :], p0[:, 0:2], p1[:, 0:2])
+    z = (1 - t) * p0[:, 2] + t * p1[:, 2]
+
+    bucket = np.minimum(get_depth_fraction(buffers, b, z) * HISTOGRAM_SIZE, HISTOGRAM_SIZE - 1).astype(np.int64)
+    histogram = np.bincount(bucket, minlength=HISTOGRAM_SIZE)
+
+    cdf = np.concatenate([[0], np.cumsum(histogram)]) / max(histogram.sum(), 1)
+
+    # A histogram without gaps gains nothing from the equalization, see HISTOGRAM_EMPTY_BUCKETS in RasterFineOIT.hlsl.
+    weight = min(np.count_nonzero(histogram == 0) / HISTOGRAM_EMPTY_BUCKETS, 1.0)
+
+    return (1 - weight) * np.linspace(0, 1, HISTOGRAM_SIZE + 1) + weight * cdf
+
+
+def get_slice_index(buffers, w, h, bin_w, b, z, slice_count, adaptive_slices):
+    # Mirror of ComputeSliceIndex.
+    fraction = get_depth_fraction(buffers, b, z)
+
+    if adaptive_slices:
+        # Slices equalized by the depth histogram of the bin.
+        cdf = get_depth_cdf(buffers, w, h, bin_w, b)
+        bucket = fraction * HISTOGRAM_SIZE
+        i = np.minimum(bucket, HISTOGRAM_SIZE - 1).astype(np.int64)
+        fraction = cdf[i] + (cdf[i + 1] - cdf[i]) * (bucket - i)
+
+    return np.minimum(fraction * slice_count, slice_count - 1).astype(np.int64)
+
+
+def resolve_bin_oit(buffers, w, h, bin_w, b, local_x, local_y, target, opacity, slice_count=NUM_SLICES,
+                    adaptive_slices=False):
+    # Mirror of RasterFineOIT. Fragments are blended front to back within their depth slice (in work queue order) and
+    # the slices are composited in order, which is one front to back composite over the fragments sorted by
+    # (slice, work queue order). Bins and pixels without fragments are left untouched.
+    if buffers["bin_counters"][b] == 0:
+        return
+
+    x, y, coverage, z, tex_coord = get_fragments(buffers, w, h, bin_w, b, local_x, local_y)
+
+    covered = coverage > 0
+    alpha = np.where(covered, coverage * opacity, 0)
+
+    slice_index = get_slice_index(buffers, w, h, bin_w, b, z, slice_count, adaptive_slices)
+
+    # Uncovered pairs sort last and don't contribute.
+    key = np.where(covered, slice_index, slice_count)
+    order = np.argsort(key, axis=1, kind='stable')
+
+    alpha = np.take_along_axis(alpha, order, axis=1)
+    color = get_fragment_color(np.take_along_axis(tex_coord, order, axis=1)) * alpha[..., None]
+
+    rgb, transmittance = composite(color, alpha)
+
+    written = covered.any(axis=1)
+    target[y[written], x[written], 0:3] = rgb[written]
+    target[y[written], x[written], 3] = transmittance[written]
+
+
+def resolve_bin_oit_kbuffer(buffers, w, h, bin_w, b, local_x, local_y, target, opacity, k):
+    # Mirror of the k-buffer mode of RasterFineOIT. The k nearest fragments (ties in work queue order, like the
+    # insertion sort) are composited front to back, followed by the tail: the alpha weighted average color of the
+    # remaining fragments with their combined opacity.
+    if buffers["bin_counters"][b] == 0:
+        return
+
+    x, y, coverage, z, tex_coord = get_fragments(buffers, w, h, bin_w, b, local_x, local_y)
+
+    covered = coverage > 0
+    alpha = np.where(covered, coverage * opacity, 0)
+
+    # Nearest (largest z) first, uncovered pairs sort last and don't contribute.
+    order = np.argsort(np.where(covered, -z, np.inf), axis=1, kind='stable')
+
+    alpha = np.take_along_axis(alpha, order, axis=1)
+    color = get_fragment_color(np.take_along_axis(tex_coord, order, axis=1)) * alpha[..., None]
+
+    rgb, transmittance = composite(color[:, :k], alpha[:, :k])
+
+    tail_alpha = np.sum(alpha[:, k:], axis=1)
+    tail_transmittance = np.prod(1 - alpha[:, k:], axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tail_color = np.sum(color[:, k:], axis=1) / tail_alpha[:, None]
+
+    tail = tail_alpha > 0
+    rgb[tail] += (tail_color * ((1 - tail_transmittance) * transmittance)[:, None])[tail]
+    transmittance[tail] *= tail_transmittance[tail]
+
+    written = covered.any(axis=1)
+    target[y[written], x[written], 0:3] = rgb[written]
+    target[y[written], x[written], 3] = transmittance[written]
+
+
+def get_blend_weight(bin_start, bin_end, z):
+    # Mirror of ComputeBlendWeight.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = np.clip(np.nan_to_num((z - bin_start) / (bin_end - bin_start)), 0, 1)
+    return np.clip(3e3 * (1 - d) ** 3, 1e-2, 3e3)
+
+
+def resolve_bin_oit_weighted_blended(buffers, w, h, bin_w, b, local_x, local_y, target, opacity):
+    # Mirror of the weighted blended mode of RasterFineOIT, order independent by construction.
+    if buffers["bin_counters"][b] == 0:
+        return
+
+    x, y, coverage, z, tex_coord = get_fragments(buffers, w, h, bin_w, b, local_x, local_y)
+
+    covered = coverage > 0
+    alpha = np.where(covered, coverage * opacity, 0)
+    weight = get_blend_weight(buffers["bin_max_z"][b], buffers["bin_min_z"][b], z) * alpha
+
+    accumulation = np.sum(get_fragment_color(tex_coord) * weight[..., None], axis=1)
+    revealage = np.prod(1 - alpha, axis=1)
+
+    rgb = accumulation / np.maximum(np.sum(weight, axis=1), 1e-5)[:, None] * (1 - revealage)[:, None]
+
+    written = covered.any(axis=1)
+    target[y[written], x[written], 0:3] = rgb[written]
+    target[y[written], x[written], 3] = revealage[written]
+
+
+def get_oit_settings(context):
+    # Keyword arguments of resolve_bins for the context.
+    return dict(oit=context.oit, opacity=context.oit_opacity, mode=context.oit_mode,
+                slice_count=context.oit_slice_count, kbuffer_size=context.oit_kbuffer_size)
+
+
+def resolve_bins(buffers, w, h, bin_w, bins, target, oit=False, opacity=1.0, mode=OIT.OITMode.SLICES,
+                 slice_count=NUM_SLICES, kbuffer_size=KBUFFER_SIZE):
+    # Resolves the bins (any iterable of bin indices) into target, (h, w, 4).
+    # buffers holds the arrays the fine pass reads (see RasterizerCPU.get_fine_buffers).
+    tile = Budgets.TILE_SIZE_BIN
+
+    # Pixel offsets within a tile.
+    local_y, local_x = np.mgrid[0:tile, 0:tile]
+    local_x = local_x.reshape(-1)
+    local_y = local_y.reshape(-1)
+
+    for b in bins:
+        if not oit:
+            resolve_bin(buffers, w, h, bin_w, b, local_x, local_y, target)
+        elif mode == OIT.OITMode.WEIGHTED_BLENDED:
+            resolve_bin_oit_weighted_blended(buffers, w, h, bin_w, b, local_x, local_y, target, opacity)
+        elif mode == OIT.OITMode.KBUFFER:
+            resolve_bin_oit_kbuffer(buffers, w, h, bin_w, b, local_x, local_y, target, opacity, kbuffer_size)
+        else:
+            resolve_bin_oit(buffers, w, h, bin_w, b, local_x, local_y, target, opacity, slice_count,
+                            mode == OIT.OITMode.ADAPTIVE_SLICES)
+
+
+class RasterizerCPU:
+
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+        self.bin_w = math.ceil(w / Budgets.TILE_SIZE_BIN)
+        self.bin_h = math.ceil(h / Budgets.TILE_SIZE_BIN)
+
+        # Outputs of the last frame, named after the GPU buffers they mirror.
+        self.buffers = {}
+
+    def get_bin_count(self):
+        return self.bin_w * self.bin_h
+
+    def vertex_setup(self, context):
+        positions = np.concatenate([context.vertices, np.ones((len(context.vertices), 1), dtype='f')], axis=1)
+
+        # mul(mul(p, V), P) with the matrices uploaded row by row into column major cbuffer matrices.
+        positions_cs = (positions @ context.matrix_v.T @ context.matrix_p.T).astype('f')
+
+        self.buffers["vertex_output"] = positions_cs
+        self.buffers["vertex_culled"] = positions_cs[:, 3] > 0  # Behind the camera, see PackVertexOutput.
+        self.buffers["vertex_tex_coord"] = get_vertex_tex_coords(context.strand_count, context.strand_particle_count)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.buffers["vertex_ndc"] = (positions_cs[:, 0:3] / positions_cs[:, 3:4]).astype('f')
+
+    def segment_setup(self, context):
+        segment_data = get_segment_indices(context.strand_count, context.strand_particle_count)
+
+        vertex_culled = self.buffers["vertex_culled"]
+        vertex_ndc = self.buffers["vertex_ndc"]
+
+        p0 = vertex_ndc[segment_data[:, 0]]
+        p1 = vertex_ndc[segment_data[:, 1]]
+
+        # Fast rejection for segments behind the near clipping plane.
+        in_front = ~vertex_culled[segment_data[:, 0]] & ~vertex_culled[segment_data[:, 1]]
+
+        accept, x0, y0, x1, y1 = clip_segments_cohen_sutherland(p0[:, 0], p0[:, 1], p1[:, 0], p1[:, 1])
+
+        self.buffers["segment_data"] = segment_data
+        self.buffers["segment_output"] = (in_front & accept).astype(np.uint32)
+        self.buffers["segment_header"] = np.stack([x0, y0, x1, y1], axis=1).astype('f')
+
+    def raster_bin(self, context):
+        w, h = context.w, context.h
+        tile = Budgets.TILE_SIZE_BIN
+
+        s = compact_segments(self.buffers["segment_output"])
+        self.buffers["compacted_segments"] = s
+
+        header = self.buffers["segment_header"][s]
+        v0 = header[:, 0:2]
+        v1 = header[:, 2:4]
+
+        # Transform the segment AABB: NDC -> Tiled Raster Space, clamped to the bin grid.
+        screen = np.array([w, h], dtype='f')
+        dim = np.array([self.bin_w, self.bin_h])
+        tiles_b = np.clip(((np.minimum(v0, v1) * 0.5 + 0.5) * screen / tile).astype(np.int64), 0, dim - 1)
+        tiles_e = np.clip(((np.maximum(v0, v1) * 0.5 + 0.5) * screen / tile).astype(np.int64), 0, dim - 1)
+
+        # Expand every segment into the bins of its AABB (x outer, y inner like the shader loops).
+        nx = tiles_e[:, 0] - tiles_b[:, 0] + 1
+        ny = tiles_e[:, 1] - tiles_b[:, 1] + 1
+        n = nx * ny
+
+        pair_segment = np.repeat(np.arange(len(s)), n)
+        local = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        x = tiles_b[pair_segment, 0] + local // ny[pair_segment]
+        y = tiles_b[pair_segment, 1] + local % ny[pair_segment]
+
+        # Per-bin coverage test, skipped when the AABB covers at most a couple of bins.
+        fast_path = ((tiles_e[:, 0] - tiles_b[:, 0]) * (tiles_e[:, 1] - tiles_b[:, 1]) <= 2)[pair_segment]
+
+        tile_size_ss = 2.0 * tile / screen
+        center = (np.stack([x, y], axis=1) + 0.5) * tile_size_ss - 1.0
+
+        distance, t = distance_to_segment_and_t_value(center, v0[pair_segment], v1[pair_segment])
+        keep = fast_path | (distance < (tile + BIN_PAD) / h)
+
+        pair_segment = pair_segment[keep]
+        bin_index = (y * self.bin_w + x)[keep]
+        t = np.where(fast_path, 0.0, t)[keep]
+
+        # Depth range of every bin.
+        vi = self.buffers["segment_data"][s[pair_segment]]
+        vertex_ndc = self.buffers["vertex_ndc"]
+        z = (1 - t) * vertex_ndc[vi[:, 0], 2] + t * vertex_ndc[vi[:, 1], 2]
+
+        bin_min_z = np.full(self.get_bin_count(), np.inf, dtype='f')
+        bin_max_z = np.full(self.get_bin_count(), -np.inf, dtype='f')
+        np.minimum.at(bin_min_z, bin_index, z)
+        np.maximum.at(bin_max_z, bin_index, z)
+
+        # Prefix sum of the bin counters and the work queue, segment indices grouped by bin.
+        bin_counters = np.bincount(bin_index, minlength=self.get_bin_count()).astype(np.uint32)
+        bin_offsets = (np.cumsum(bin_counters) - bin_counters).astype(np.uint32)
+        work_queue = s[pair_segment[np.argsort(bin_index, kind='stable')]].astype(np.uint32)
+
+        self.buffers["bin_counters"] = bin_counters
+        self.buffers["bin_offsets"] = bin_offsets
+        self.buffers["bin_min_z"] = bin_min_z
+        self.buffers["bin_max_z"] = bin_max_z
+        self.buffers["work_queue"] = work_queue
+
+    def get_fine_buffers(self):
+        # The arrays the fine stage reads, these are shared with the workers.
+        names = ["vertex_ndc", "vertex_tex_coord", "segment_data", "work_queue", "bin_offsets", "bin_counters",
+                 "bin_min_z", "bin_max_z"]
+        return {name: self.buffers[name] for name in names}
+
+    def setup(self, context):
+        # Everything up to (and including) the work queue.
+        self.vertex_setup(context)
+        self.segment_setup(context)
+        self.raster_bin(context)
+
+    def raster_fine(self, context, bin_begin=0, bin_end=None):
+        if bin_end is None:
+            bin_end = self.get_bin_count()
+
+        resolve_bins(self.buffers, context.w, context.h, self.bin_w, range(bin_begin, bin_end), context.target,
+                     **get_oit_settings(context))
+
+    def go(self, context):
+        self.setup(context)
+        self.raster_fine(context)
@@ -0,0 +1,67 @@
+# Thread pool fine resolve on the CPU.
+# A lighter alternative to the process pool of RasterizerCPUTiled.py: the fine stage of RasterizerCPU.py runs on a
+# ThreadPoolExecutor over batches of bins. The per-bin work is a handful of large NumPy operations (distances, coverage,
+# slice sort, transmittance products) that release the GIL, and the threads share the setup arrays and the target
+# without any pickling or shared memory. Bins are ordered by their segment count, heaviest first, so the expensive
+# bins don't end up last on a single thread.
+
+import os
+import time
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from src import RasterizerCPU
+
+
+def get_bin_batches(bin_counters, batch_count):
+    # Bins sorted by segment count (descending), cut into batches of similar cost. The heaviest bins land in the first
+    # (smallest) batches, the many light bins in the last ones.
+    order = np.argsort(-bin_counters.astype(np.int64), kind='stable')
+
+    cost = np.cumsum(bin_counters[order].astype(np.int64) + 1)
+    bounds = np.searchsorted(cost, np.linspace(0, cost[-1], batch_count + 1)[1:-1])
+    bounds = np.unique(np.concatenate([[0], bounds, [len(order)]]))
+
+    return [order[b:e] for b, e in zip(bounds[:-1], bounds[1:])]
+
+
+class RasterizerCPUThreaded:
+
+    def __init__(self, w, h, worker_count=None, batches_per_worker=8):
+        self.rasterizer = RasterizerCPU.RasterizerCPU(w, h)
+        self.worker_count = worker_count or os.cpu_count()
+        self.batches_per_worker = batches_per_worker
+
+        self.executor = ThreadPoolExecutor(self.worker_count)
+
+        # Milliseconds per stage of the last frame.
+        self.timings = {}
+
+    def go(self, context):
+        t0 = time.perf_counter()
+
+        self.rasterizer.setup(context)
+
+        t1 = time.perf_counter()
+
+        buffers = self.rasterizer.buffers
+        batches = get_bin_batches(buffers["bin_counters"], self.worker_count * self.batches_per_worker)
+
+        oit_settings = RasterizerCPU.get_oit_settings(context)
+
+        # Batches cover disjoint pixels of the target.
+        futures = [
+            self.executor.submit(RasterizerCPU.resolve_bins, buffers, context.w, context.h, self.rasterizer.bin_w,
+                                 batch, context.target, **oit_settings)
+            for batch in batches
+        ]
+
+        for future in futures:
+            future.result()
+
+        t2 = time.perf_counter()
+
+        self.timings = {"setup": 1000.0 * (t1 - t0), "fine": 1000.0 * (t2 - t1)}
+
+    def release(self):
+        self.executor.shutdown()
@@ -0,0 +1,146 @@
+# Process pool tiled rendering of a single frame on CPU render nodes.
+# The main process runs setup and binning (RasterizerCPU.py), publishes the arrays the fine stage reads in shared memory
+# and splits the bin grid into contiguous ranges of similar cost. Worker processes attach to the shared arrays and
+# resolve their ranges straight into one shared output image, only the shared memory names are pickled.
+
+import os
+import time
+import numpy as np
+import multiprocessing
+
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+from src import RasterizerCPU
+
+
+class SharedArrays:
+    # Named arrays backed by shared memory blocks. Blocks are reused across frames and only reallocated to grow.
+
+    def __init__(self):
+        self.blocks = {}
+        self.arrays = {}
+
+    def publish(self, name, shape, dtype):
+        byte_size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        block = self.blocks.get(name)
+
+        if block is None or block.size < byte_size:
+            # Views of the old block have to go before it can be closed.
+            self.arrays.pop(name, None)
+
+            if block is not None:
+                block.close()
+                block.unlink()
+
+            block = shared_memory.SharedMemory(create=True, size=byte_size)
+            self.blocks[name] = block
+
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        self.arrays[name] = array
+        return array
+
+    def get_descriptors(self):
+        # What a worker needs to attach, name -> (shared memory name, shape, dtype).
+        return {name: (self.blocks[name].name, array.shape, array.dtype.str) for name, array in self.arrays.items()}
+
+    def release(self):
+        self.arrays = {}
+
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+
+        self.blocks = {}
+
+
+# Shared memory blocks attached by this (worker) process, by shared memory name.
+s_attached = {}
+
+
+def attach(descriptors):
+    live = {shm_name for shm_name, _, _ in descriptors.values()}
+
+    # Drop the blocks the main process has replaced since the last task.
+    for shm_name in [n for n in s_attached if n not in live]:
+        s_attached.pop(shm_name).close()
+
+    arrays = {}
+    for name, (shm_name, shape, dtype) in descriptors.items():
+        block = s_attached.get(shm_name)
+
+        if block is None:
+            block = shared_memory.SharedMemory(name=shm_name)
+            s_attached[shm_name] = block
+
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    return arrays
+
+
+def resolve_task(descriptors, w, h, bin_w, bin_begin, bin_end, oit_settings):
+    arrays = attach(descriptors)
+    RasterizerCPU.resolve_bins(arrays, w, h, bin_w, range(bin_begin, bin_end), arrays["target"], **oit_settings)
+    return bin_end - bin_begin
+
+
+def split_bins(bin_counters, task_count):
+    # Contiguous bin ranges of similar cost, the segment count of a bin plus one so empty bins aren't free.
+    cost = np.cumsum(bin_counters.astype(np.int64) + 1)
+    bounds = np.searchsorted(cost, np.linspace(0, cost[-1], task_count + 1)[1:-1])
+    bounds = np.unique(np.concatenate([[0], bounds, [len(bin_counters)]]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+class RasterizerCPUTiled:
+
+    def __init__(self, w, h, worker_count=None, tasks_per_worker=4):
+        self.rasterizer = RasterizerCPU.RasterizerCPU(w, h)
+        self.worker_count = worker_count or os.cpu_count()
+        self.tasks_per_worker = tasks_per_worker
+
+        # Start the resource tracker before the workers, so they share it with this process instead of starting their
+        # own (which would unlink the blocks when a worker exits).
+        resource_tracker.ensure_running()
+
+        self.shared = SharedArrays()
+        self.pool = multiprocessing.Pool(self.worker_count)
+
+        # Milliseconds per stage of the last frame.
+        self.timings = {}
+
+    def create_target(self):
+        # The output image lives in shared memory, pass it as the context target.
+        target = self.shared.publish("target", (self.rasterizer.h, self.rasterizer.w, 4), 'f')
+        target[...] = 0
+        return target
+
+    def go(self, context):
+        if context.target is not self.shared.arrays.get("target"):
+            raise ValueError("The context target has to be created by RasterizerCPUTiled.create_target().")
+
+        t0 = time.perf_counter()
+
+        self.rasterizer.setup(context)
+
+        for name, array in self.rasterizer.get_fine_buffers().items():
+            self.shared.publish(name, array.shape, array.dtype)[...] = array
+
+        t1 = time.perf_counter()
+
+        descriptors = self.shared.get_descriptors()
+        ranges = split_bins(self.rasterizer.buffers["bin_counters"], self.worker_count * self.tasks_per_worker)
+
+        self.pool.starmap(resolve_task, [
+            (descriptors, context.w, context.h, self.rasterizer.bin_w, begin, end,
+             RasterizerCPU.get_oit_settings(context))
+            for begin, end in ranges
+        ])
+
+        t2 = time.perf_counter()
+
+        self.timings = {"setup": 1000.0 * (t1 - t0), "fine": 1000.0 * (t2 - t1)}
+
+    def release(self):
+        self.pool.close()
+        self.pool.join()
+        self.shared.release()
@@ -0,0 +1,337 @@
+# Multi-view binned rasterizer.
+# Renders K views (turntables, stereo, dataset capture) of the same strands in one pass over the shared
+# StrandDeviceMemory. Vertex setup, segment setup, binning and the fine pass each run as one batched dispatch with the
+# view in the y (or z) dimension, the bins of every view share one prefix sum and work queue, and every view is
+# written to its own w x h tile of an atlas target. Per-view fixed overhead (constant uploads, dispatches, clears,
+# frame graph bookkeeping) is paid once for all the views.
+
+import math
+import numpy as np
+import coalpy.gpu as gpu
+
+from dataclasses import dataclass
+from src import Budgets
+from src import Camera
+from src import Vector
+from src import Rasterizer
+from src import RasterizerBinned
+from src import ShaderCache
+
+s_segment_setup_mv      = ShaderCache.LazyShader(file="SegmentSetup.hlsl",  name="SegmentSetup",  main_function="SegmentSetup",  defines=["MULTI_VIEW"])
+s_raster_bin_mv         = ShaderCache.LazyShader(file="RasterBin.hlsl",     name="RasterBin",     main_function="RasterBin",     defines=["MULTI_VIEW"])
+s_raster_bin_tes_mv     = ShaderCache.LazyShader(file="RasterBin.hlsl",     name="RasterBin",     main_function="RasterBin",     defines=["MULTI_VIEW", "RASTER_CURVE"])
+s_raster_bin_compacted_mv     = ShaderCache.LazyShader(file="RasterBin.hlsl", name="RasterBin", main_function="RasterBin", defines=["MULTI_VIEW", "COMPACTED_SEGMENTS"])
+s_raster_bin_compacted_tes_mv = ShaderCache.LazyShader(file="RasterBin.hlsl", name="RasterBin", main_function="RasterBin", defines=["MULTI_VIEW", "COMPACTED_SEGMENTS", "RASTER_CURVE"])
+s_raster_fine_mv        = ShaderCache.LazyShader(file="RasterFine.hlsl",    name="RasterFine",    main_function="RasterFine",    defines=["MULTI_VIEW"])
+s_raster_fine_tes_mv    = ShaderCache.LazyShader(file="RasterFine.hlsl",    name="RasterFine",    main_function="RasterFine",    defines=["MULTI_VIEW", "RASTER_CURVE"])
+s_raster_fine_oit_mv    = ShaderCache.LazyShader(file="RasterFineOIT.hlsl", name="RasterFineOIT", main_function="RasterFineOIT", defines=["MULTI_VIEW"])
+s_raster_fine_oit_tes_mv = ShaderCache.LazyShader(file="RasterFineOIT.hlsl", name="RasterFineOIT", main_function="RasterFineOIT", defines=["MULTI_VIEW", "RASTER_CURVE"])
+
+s_vertex_setup_mv = {
+    key: ShaderCache.LazyShader(file="VertexSetup.hlsl", name="VertexSetup", main_function="VertexSetup",
+                                defines=["MULTI_VIEW"] + list(s.defines))
+    for key, s in Rasterizer.s_vertex_setup.items()
+}
+
+
+@dataclass
+class MultiViewContext(Rasterizer.Context):
+    # List of (matrix_v, matrix_p) pairs, one per view. matrix_v / matrix_p of the base context are ignored, and w / h
+    # are the size of a single view.
+    views: list
+
+
+def get_atlas_layout(view_count):
+    # Columns and rows of the atlas, as close to square as possible.
+    columns = math.ceil(math.sqrt(view_count))
+    rows = math.ceil(view_count / columns)
+    return columns, rows
+
+
+def get_view_origin(view, view_count, w, h):
+    # Top left pixel of a view in the atlas.
+    columns, _ = get_atlas_layout(view_count)
+    return (view % columns) * w, (view // columns) * h
+
+
+def create_atlas(w, h, view_count, name="MultiViewAtlas"):
+    columns, rows = get_atlas_layout(view_count)
+    return gpu.Texture(name=name, width=columns * w, height=rows * h, format=gpu.Format.RGBA_8_UNORM)
+
+
+def get_segment_stride(segment_count):
+    # Segments of each view start on a multiple of 3, so a curve never straddles two views.
+    return 3 * math.ceil(segment_count / 3)
+
+
+def get_turntable_views(view_count, w, h, radius=10.690, height=0.0):
+    # Cameras evenly spaced on a circle around the origin, looking at it.
+    views = []
+
+    for i in range(view_count):
+        camera = Camera.Camera(w, h)
+
+        # q_from_angle_axis takes the half angle.
+        camera.transform.rotation = Vector.q_from_angle_axis(math.pi * i / view_count, Vector.float3(0, 1, 0))
+        camera.pos = Vector.float3(0.0, height, 0.0) - radius * camera.transform.front
+        camera.transform.update_mats()
+
+        views.append((camera.view_matrix.copy(), camera.proj_matrix.copy()))
+
+    return views
+
+
+class RasterizerMultiView(RasterizerBinned.RasterizerBinned):
+    def __init__(self, w, h, view_count, segment_compaction=True):
+
+        self.view_count = view_count
+
+        # Resources
+        self.b_view_matrices = None
+
+        super().__init__(w, h, segment_compaction)
+
+    def create_resource_buffers(self):
+        super().create_resource_buffers()
+
+        # View and projection matrix of every view, interleaved.
+        self.b_view_matrices = gpu.Buffer(
+            name="ViewMatrices",
+            type=gpu.BufferType.Structured,
+            stride=(4 * 4) * 4,
+            element_count=2 * self.view_count
+        )
+
+    def get_bin_count(self, bin_w=None, bin_h=None):
+        # The bins of every view are laid out one after the other.
+        return self.view_count * super().get_bin_count(bin_w, bin_h)
+
+    def get_binned_segment_count(self, context):
+        # The segments of every view are compacted together, the padding of each view is culled by the segment setup.
+        return self.view_count * get_segment_stride(context.segment_count)
+
+    def check_capacity(self, context):
+        if len(context.views) != self.view_count:
+            raise ValueError("The rasterizer was created for {} views, the context has {}.".format(
+                self.view_count, len(context.views)))
+
+        vertex_count = context.strand_count * context.strand_particle_count
+        vertex_capacity = Budgets.BYTE_SIZE_VERTEX_OUTPUT_POOL // Budgets.BYTE_SIZE_VERTEX_OUTPUT_FORMAT
+
+        if self.view_count * vertex_count > vertex_capacity:
+            raise ValueError("{} views of {} vertices exceed the vertex output pool ({} vertices).".format(
+                self.view_count, vertex_count, vertex_capacity))
+
+        if self.view_count * get_segment_stride(context.segment_count) > Budgets.MAX_SEGMENTS:
+            raise ValueError("{} views of {} segments exceed the segment cap ({} segments).".format(
+                self.view_count, context.segment_count, Budgets.MAX_SEGMENTS))
+
+    def get_constants(self, context):
+        segment_stride = get_segment_stride(context.segment_count)
+        columns, _ = get_atlas_layout(self.view_count)
+
+        return [
+            # Vertex Setup, the matrices of the cbuffer are unused.
+            (self.cb_vertex_setup, np.array(
+                [[0, 0, 0, 0]] * 8 + [[context.strand_count, context.strand_particle_count,
+                                       context.strands.strands_per_cluster, context.strands.instance_count],
+                                      [context.strands.position_offset, context.strands.cluster_offset, 0, 0]],
+                dtype='f')),
+
+            (self.b_view_matrices, np.array([
+                [m[0, 0:4], m[1, 0:4], m[2, 0:4], m[3, 0:4]] for view in context.views for m in view
+            ], dtype='f')),
+
+            # Segment Setup
+            (self.cb_segment_setup, np.array([
+                context.segment_count,
+                context.strand_count * context.strand_particle_count,
+                segment_stride,
+                context.strand_particle_count
+            ], dtype='f')),
+
+            (self.cb_raster_bin, np.array([
+                context.segment_count,
+                context.w,
+                context.h,
+                Budgets.TILE_SIZE_BIN,
+                self.bin_w,
+                self.bin_h,
+                context.tesselation_sample_count,
+                context.tesselation_error_bound,
+                segment_stride,
+                self.get_compaction_element_count(context),
+                0,
+                0
+            ], dtype='f')),
+
+            (self.cb_segment_compaction, np.array([
+                self.get_compaction_element_count(context),
+                3 if context.tesselation else 1,
+                0,
+                0
+            ], dtype='f')),
+
+            (self.cb_raster_fine, np.array([
+                context.w,
+                context.h,
+                Budgets.TILE_SIZE_BIN,
+                self.bin_w,
+                self.bin_h,
+                context.tesselation_sample_count,
+                context.oit_opacity,
+                context.oit_overlay,
+                context.tesselation_error_bound,
+                columns,
+                context.oit_slice_count,
+                context.strand_particle_count
+            ], dtype='f'))
+        ]
+
+    def vertex_setup(self, context):
+        context.cmd.begin_marker("VertexSetupPass")
+
+        vertex_count = context.strand_particle_count * context.strand_count
+
+        context.cmd.dispatch(
+            shader=s_vertex_setup_mv[Rasterizer.get_vertex_setup_key(context.strands)].get(),
+
+            constants=[
+                self.cb_vertex_setup
+            ],
+
+            inputs=[
+                context.strands.b_strands,
+                self.b_view_matrices
+            ] + context.strands.get_position_buffers()[1:],
+
+            outputs=[
+                self.b_vertex_output
+            ],
+
+            x=math.ceil(vertex_count / Budgets.NUM_LANE_PER_WAVE),
+            y=self.view_count
+        )
+
+        context.cmd.end_marker()
+
+    def segment_setup(self, context):
+        context.cmd.begin_marker("SegmentSetupPass")
+
+        groupSize = 512
+
+        context.cmd.dispatch(
+            shader=s_segment_setup_mv.get(),
+
+            constants=[
+                self.cb_segment_setup
+            ],
+
+            inputs=[
+                self.b_vertex_output
+            ],
+
+            outputs=[
+                self.b_segment_output,
+                self.b_segment_header.buffer,
+                self.b_segment_data
+            ],
+
+            x=math.ceil(get_segment_stride(context.segment_count) / groupSize),
+            y=self.view_count
+        )
+
+        context.cmd.end_marker()
+
+    def get_raster_bin_shader(self, context):
+        if self.segment_compaction:
+            return s_raster_bin_compacted_tes_mv if context.tesselation else s_raster_bin_compacted_mv
+
+        return s_raster_bin_tes_mv if context.tesselation else s_raster_bin_mv
+
+    def raster_bin(self, context):
+        # The compacted segments of every view are binned by one indirect dispatch.
+        if self.segment_compaction:
+            return super().raster_bin(context)
+
+        context.cmd.begin_marker("BinPass")
+
+        context.cmd.dispatch(
+            shader=self.get_raster_bin_shader(context).get(),
+
+            constants=[
+                self.cb_raster_bin
+            ],
+
+            inputs=[
+                self.b_segment_output,
+                self.b_segment_data,
+                self.b_vertex_output,
+                self.b_segment_header.buffer
+            ],
+
+            outputs=[
+                self.b_bin_records.buffer,
+                self.b_bin_records_counter,
+                self.b_bin_counters,
+                self.b_bin_min_z,
+                self.b_bin_max_z
+            ],
+
+            x=math.ceil(context.segment_count / Budgets.NUM_LANE_PER_WAVE),
+            y=self.view_count
+        )
+
+        context.cmd.end_marker()
+
+    def raster_fine(self, context):
+        context.cmd.begin_marker("FinePass")
+
+        # Always the linear slices with the full capacity, the other OIT modes are only selectable in the editor.
+        if context.oit:
+            shader = s_raster_fine_oit_tes_mv if context.tesselation else s_raster_fine_oit_mv
+        else:
+            shader = s_raster_fine_tes_mv if context.tesselation else s_raster_fine_mv
+
+        context.cmd.dispatch(
+            shader=shader.get(),
+
+            constants=[
+                self.cb_raster_fine
+            ],
+
+            inputs=[
+                self.b_work_queue.buffer,
+                self.b_bin_offsets,
+                self.b_bin_counters,
+                self.b_segment_data,
+                self.b_vertex_output,
+                self.b_bin_min_z,
+                self.b_bin_max_z
+            ],
+
+            outputs=[
+                context.target
+            ],
+
+            x=self.bin_w,
+            y=self.bin_h,
+            z=self.view_count
+        )
+
+        context.cmd.end_marker()
+
+    def new_frame(self, context):
+        self.check_capacity(context)
+        super().new_frame(context)
+
+    def record(self, context, exports=()):
+        self.check_capacity(context)
+        super().record(context, exports)
+
+    def declare_passes(self, graph, context):
+        super().declare_passes(graph, context)
+
+        # The vertex setup also reads the view matrices.
+        vertex_setup = next(p for p in graph.passes if p.name == "VertexSetup")
+        vertex_setup.inputs.append(self.b_view_matrices)
@@ -0,0 +1,188 @@
+# GPU storage formats, declared once.
+# Every struct produces its NumPy structured dtype (uploads and readbacks are zero-copy views of it), its byte size
+# (Budgets.py) and its HLSL declaration in the generated shaders/Schema.hlsl, included by RasterCommon.hlsl. The
+# include is generated explicitly (write_hlsl) and checked before the first shader is built (check_hlsl).
+# Records the shaders pack by hand (the segment and bin records) only declare their words and byte size, the packing
+# lives next to the load and store functions in RasterCommon.hlsl and is mirrored in Formats.py.
+#
+# Run python -m src.Schema to regenerate the include.
+
+import os
+import re
+import numpy as np
+
+# HLSL type: (NumPy base type, shape).
+TYPES = {
+    "float":  ('f4', ()),
+    "float2": ('f4', (2,)),
+    "float3": ('f4', (3,)),
+    "float4": ('f4', (4,)),
+    "uint":   ('u4', ()),
+    "uint2":  ('u4', (2,)),
+    "int":    ('i4', ())
+}
+
+
+class Struct:
+
+    def __init__(self, name, fields, declare=True):
+        # fields: (HLSL type, name, comment) triples. Undeclared structs only get their byte size in HLSL.
+        self.name = name
+        self.fields = fields
+        self.declare = declare
+
+        # Structured and raw buffers are tightly packed, no padding between the fields.
+        self.dtype = np.dtype([(field_name, *TYPES[hlsl_type]) for hlsl_type, field_name, _ in fields])
+
+    @property
+    def byte_size(self):
+        return self.dtype.itemsize
+
+    @property
+    def define(self):
+        return "BYTE_SIZE_" + re.sub(r"(?<!^)(?=[A-Z])", "_", self.name).upper()
+
+    def zeros(self, count):
+        return np.zeros(count, dtype=self.dtype)
+
+    def view(self, data):
+        # Zero-copy view of contiguous data (a flat or (n, field count) array of the field type, words or bytes) as
+        # records. Only non-contiguous data is copied.
+        return np.ascontiguousarray(data).reshape(-1).view(self.dtype)
+
+    def hlsl(self):
+        lines = ["#define {} {}".format(self.define, self.byte_size)]
+
+        if self.declare:
+            width = max(len(hlsl_type) for hlsl_type, _, _ in self.fields)
+
+            lines += ["struct {}".format(self.name), "{"]
+            for hlsl_type, field_name, comment in self.fields:
+                if comment:
+                    lines.append("    // {}".format(comment))
+                lines.append("    {} {};".format(hlsl_type.ljust(width), field_name))
+            lines.append("};")
+
+        return "\n".join(lines)
+
+
+# Packing constants shared by the shaders and Formats.py.
+# --------------------------------------------------------------
+
+# Vertex output: NDC depth as a 24 bit unorm, the top 8 bits are flags.
+VERTEX_DEPTH_BITS       = 24
+
+# Bin record: segment index, offset in the bin and bin index (of every view).
+BIN_RECORD_SEGMENT_BITS = 22
+BIN_RECORD_OFFSET_BITS  = 22
+BIN_RECORD_BIN_BITS     = 20
+
+CONSTANTS = [
+    ("VERTEX_DEPTH_BITS",       VERTEX_DEPTH_BITS),
+    ("BIN_RECORD_SEGMENT_BITS", BIN_RECORD_SEGMENT_BITS),
+    ("BIN_RECORD_OFFSET_BITS",  BIN_RECORD_OFFSET_BITS),
+    ("BIN_RECORD_BIN_BITS",     BIN_RECORD_BIN_BITS)
+]
+
+# Structs
+# --------------------------------------------------------------
+
+STRAND_DATA = Struct("StrandData", [
+    ("float3", "strandPositionOS", None)
+])
+
+# Bounds of a cluster of strands, the quantized positions are relative to them (see StrandDeviceMemory.py).
+STRAND_BOUNDS = Struct("StrandBounds", [
+    ("float3", "positionMin", None),
+    ("float3", "extent",      None)
+])
+
+# Placement of a copy of the groom, see StrandScene.py. The rendered strands of every instance are contiguous.
+STRAND_INSTANCE = Struct("StrandInstance", [
+    ("float4", "objectToWorld0", "Rows of the object to world transform."),
+    ("float4", "objectToWorld1", None),
+    ("float4", "objectToWorld2", None),
+    ("uint",   "strandOffset",   "First rendered strand."),
+    ("uint",   "strandCount",    "Rendered strands, fewer than the groom at lower LODs."),
+    ("uint",   "strandStride",   "Step between the groom strands rendered."),
+    ("uint",   "padding",        None)
+])
+
+VERTEX_OUTPUT = Struct("VertexOutput", [
+    ("float2", "positionNDC", "Post perspective divide, see PackVertexOutput."),
+    ("uint",   "depthFlags",  None)
+])
+
+SEGMENT_DATA = Struct("SegmentData", [
+    ("uint", "vi0", "Vertex Indices"),
+    ("uint", "vi1", None)
+])
+
+# Clipped NDC end points, 16 bit unorms of [-1, 1], see StoreSegmentRecord.
+SEGMENT_RECORD = Struct("SegmentRecord", [
+    ("uint", "v0", None),
+    ("uint", "v1", None)
+], declare=False)
+
+# Segment index, offset in the bin and bin index, see StoreBinRecord.
+BIN_RECORD = Struct("BinRecord", [
+    ("uint", "low",  None),
+    ("uint", "high", None)
+], declare=False)
+
+FRAGMENT_DATA = Struct("FragmentData", [
+    ("float4", "color", None),
+    ("float",  "depth", None),
+    ("uint",   "next",  None)
+])
+
+STRUCTS = [STRAND_DATA, STRAND_BOUNDS, STRAND_INSTANCE, VERTEX_OUTPUT, SEGMENT_DATA, SEGMENT_RECORD, BIN_RECORD, FRAGMENT_DATA]
+
+# Generated include
+# --------------------------------------------------------------
+
+HLSL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shaders", "Schema.hlsl")
+
+
+def generate_hlsl():
+    width = max(len(name) for name, _ in CONSTANTS)
+
+    sections = [
+        "// Generated by Schema.py (python -m src.Schema), do not edit.",
+        "\n".join("#define {} {}".format(name.ljust(width), value) for name, value in CONSTANTS)
+    ]
+
+    sections += [struct.hlsl() for struct in STRUCTS]
+
+    return "\n\n".join(sections) + "\n"
+
+
+def check_hlsl(path=HLSL_PATH):
+    # Raises if the include is missing or no longer matches the declarations. The source tree is never written at run
+    # time, it may be read only.
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == generate_hlsl():
+                return
+
+    raise RuntimeError("{} does not match the formats declared in Schema.py, regenerate it with python -m "
+                       "src.Schema.".format(path))
+
+
+def write_hlsl(path=HLSL_PATH):
+    # Writes the include if it is missing or stale, returns whether it changed.
+    source = generate_hlsl()
+
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == source:
+                return False
+
+    with open(path, "w") as f:
+        f.write(source)
+
+    return True
+
+
+if __name__ == "__main__":
+    print("{} {}".format(HLSL_PATH, "updated" if write_hlsl() else "up to date"))
@@ -0,0 +1,101 @@
+# Reports what the segment compaction (SegmentCompaction.hlsl) saves the binning stage at several culling ratios, on
+# the NumPy mirror (RasterizerCPU.py). The culling ratio is set by panning the camera until that fraction of the
+# segments is clipped. Without compaction the binning launches a thread for every segment, with it only the surviving
+# segments (or curves) are launched, at the cost of the flag, prefix sum and scatter passes over every segment.
+
+import time
+import numpy as np
+
+from src import Camera
+from src import Vector
+from src import Budgets
+from src import CurveReference
+from src import StrandFactory
+from src import RasterizerCPU
+
+
+def build_context(strands, vertices, w, h, pan):
+    camera = Camera.Camera(w, h)
+    camera.pos = Vector.float3(pan, 0.0, -10.690)
+    camera.transform.update_mats()
+
+    return RasterizerCPU.Context(
+        w, h,
+        camera.view_matrix,
+        camera.proj_matrix,
+        vertices,
+        strands.strand_count,
+        strands.strand_particle_count,
+        np.zeros((h, w, 4), dtype='f')
+    )
+
+
+def get_culled_fraction(rasterizer, context):
+    rasterizer.vertex_setup(context)
+    rasterizer.segment_setup(context)
+    return 1.0 - np.mean(rasterizer.buffers["segment_output"])
+
+
+def find_pan(rasterizer, strands, vertices, w, h, culled, max_pan=20.0, iterations=24):
+    # Bisection on the camera pan, the culled fraction grows as the groom leaves the screen.
+    lo, hi = 0.0, max_pan
+
+    for i in range(iterations):
+        pan = 0.5 * (lo + hi)
+        if get_culled_fraction(rasterizer, build_context(strands, vertices, w, h, pan)) < culled:
+            lo = pan
+        else:
+            hi = pan
+
+    return hi
+
+
+def get_lane_count(count):
+    return Budgets.NUM_LANE_PER_WAVE * -(-count // Budgets.NUM_LANE_PER_WAVE)
+
+
+def run(assets=("fur_field", "cube_hair"), w=1280, h=720, culling_ratios=(0.0, 0.25, 0.5, 0.75, 0.9, 0.99),
+        frame_count=5):
+    for asset in assets:
+        strands = StrandFactory.build_from_asset(asset)
+        vertices = CurveReference.get_strand_vertices(strands)
+        rasterizer = RasterizerCPU.RasterizerCPU(w, h)
+
+        print("{} ({}x{}, {} segments)".format(asset, w, h, strands.strand_count * (strands.strand_particle_count - 1)))
+        print("  {:>8} {:>10} {:>12} {:>12} {:>10} {:>10} {:>10} {:>10}".format(
+            "culled", "surviving", "bin lanes", "compacted", "curves", "compacted", "compact", "bin ms"))
+
+        for culled in culling_ratios:
+            pan = find_pan(rasterizer, strands, vertices, w, h, culled) if culled > 0 else 0.0
+            context = build_context(strands, vertices, w, h, pan)
+
+            rasterizer.vertex_setup(context)
+            rasterizer.segment_setup(context)
+
+            segment_output = rasterizer.buffers["segment_output"]
+            segments = RasterizerCPU.compact_segments(segment_output)
+            curves = RasterizerCPU.compact_segments(segment_output, 3)
+
+            # The compaction keeps every surviving segment, in order.
+            assert np.array_equal(segments, np.nonzero(segment_output)[0])
+
+            t0 = time.perf_counter()
+            for i in range(frame_count):
+                RasterizerCPU.compact_segments(segment_output)
+            compact_ms = 1000.0 * (time.perf_counter() - t0) / frame_count
+
+            t0 = time.perf_counter()
+            for i in range(frame_count):
+                rasterizer.raster_bin(context)
+            bin_ms = 1000.0 * (time.perf_counter() - t0) / frame_count
+
+            curve_count = -(-len(segment_output) // 3)
+
+            print("  {:>7.1f}% {:>10} {:>12} {:>12} {:>10} {:>10} {:>10.2f} {:>10.2f}".format(
+                100.0 * (1.0 - len(segments) / len(segment_output)), len(segments),
+                get_lane_count(len(segment_output)), get_lane_count(len(segments)),
+                get_lane_count(curve_count), get_lane_count(len(curves)), compact_ms, bin_ms))
+
+
+if __name__ == "__main__":
+    run()
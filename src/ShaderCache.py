@@ -0,0 +1,99 @@
+# Lazily constructed shaders and textures.
+# GPU objects are created on first use and cached by (file, entry point, defines), so importing a module only pays for
+# the permutations it actually dispatches. warm_up() builds a list of them up front when first-use hitches matter.
+# The generated storage format include (Schema.hlsl) is checked against Schema.py before the first shader is built.
+# Declaring the objects doesn't need coalpy (the modules declaring them are imported by the CPU renderers too, see
+# src/__init__.py), constructing them does.
+
+try:
+    import coalpy.gpu as gpu
+except ImportError:
+    gpu = None
+
+from src import Schema
+
+# Constructed objects, keyed by (file, main function, defines) for shaders and by file for textures.
+s_cache = {}
+
+# Every declared shader, the default warm-up list.
+s_shaders = []
+
+# Whether Schema.hlsl was checked by this process.
+s_schema_checked = False
+
+
+def check_gpu():
+    if gpu is None:
+        raise RuntimeError("coalpy is not installed, GPU objects can't be constructed.")
+
+
+class LazyShader:
+
+    def __init__(self, file, main_function, name=None, defines=None):
+        self.file = file
+        self.main_function = main_function
+        self.name = name if name is not None else main_function
+        self.defines = tuple(defines) if defines else ()
+        s_shaders.append(self)
+
+    @property
+    def key(self):
+        return self.file, self.main_function, self.defines
+
+    def get(self) -> "gpu.Shader":
+        global s_schema_checked
+
+        shader = s_cache.get(self.key)
+
+        if shader is None:
+            check_gpu()
+
+            if not s_schema_checked:
+                Schema.check_hlsl()
+                s_schema_checked = True
+
+            if self.defines:
+                shader = gpu.Shader(file=self.file, name=self.name, main_function=self.main_function,
+                                    defines=list(self.defines))
+            else:
+                shader = gpu.Shader(file=self.file, name=self.name, main_function=self.main_function)
+
+            s_cache[self.key] = shader
+
+        return shader
+
+
+class LazyTexture:
+
+    def __init__(self, file):
+        self.file = file
+
+    def get(self) -> "gpu.Texture":
+        texture = s_cache.get(self.file)
+
+        if texture is None:
+            check_gpu()
+            texture = gpu.Texture(file=self.file)
+            s_cache[self.file] = texture
+
+        return texture
+
+
+class LazySampler:
+
+    def __init__(self, filter_type):
+        self.filter_type = filter_type
+        self.sampler = None
+
+    def get(self) -> "gpu.Sampler":
+        if self.sampler is None:
+            check_gpu()
+            self.sampler = gpu.Sampler(filter_type=self.filter_type)
+
+        return self.sampler
+
+
+def warm_up(shaders=None):
+    # Construct the given shaders (all declared shaders by default) ahead of their first dispatch.
+    for shader in (shaders if shaders is not None else s_shaders):
+        shader.get()
@@ -0,0 +1,117 @@
+# Memoized procedural strands.
+# StrandFactory.build_procedural is deterministic in its settings (including the seed), so the strands are cached by a
+# stable hash of the settings: in memory, least recently used first out once the cached positions exceed the byte
+# budget, and optionally on disk, where they survive the process. Cached strands are shared, their positions are read
+# only.
+# Bump GENERATOR_VERSION whenever the generation changes, it invalidates the disk cache.
+
+import dataclasses
+import hashlib
+import json
+import os
+import numpy as np
+
+from collections import OrderedDict
+from src import Schema
+from src import StrandFactory
+
+GENERATOR_VERSION = 1
+
+
+def get_settings_key(settings: StrandFactory.Settings):
+    # Independent of the process (unlike hash), so it names the disk entries too.
+    fields = json.dumps(dict(dataclasses.asdict(settings), generator_version=GENERATOR_VERSION), sort_keys=True)
+    return hashlib.sha1(fields.encode()).hexdigest()
+
+
+def get_byte_size(strands: StrandFactory.Strands):
+    return strands.particle_positions.nbytes
+
+
+class StrandCache:
+
+    def __init__(self, byte_budget=256 * 1024 * 1024, directory=None):
+        self.byte_budget = byte_budget
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.byte_size = 0
+
+        # Lookups served from memory, from disk and built.
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, key):
+        path = self.get_path(key)
+
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as archive:
+            return StrandFactory.Strands(int(archive["strand_count"]), int(archive["strand_particle_count"]),
+                                         Schema.STRAND_DATA.view(archive["positions"]),
+                                         int(archive["memory_layout"]))
+
+    def save(self, key, strands: StrandFactory.Strands):
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Written next to the entry and renamed, so a concurrent reader never sees half a file.
+        temporary_path = self.get_path(key) + ".tmp.npz"
+
+        np.savez(temporary_path,
+                 strand_count=strands.strand_count,
+                 strand_particle_count=strands.strand_particle_count,
+                 positions=strands.particle_positions["strandPositionOS"],
+                 memory_layout=strands.memory_layout)
+
+        os.replace(temporary_path, self.get_path(key))
+
+    def insert(self, key, strands: StrandFactory.Strands):
+        strands.particle_positions.flags.writeable = False
+
+        self.entries[key] = strands
+        self.byte_size += get_byte_size(strands)
+
+        # The new entry stays, even alone over the budget.
+        while self.byte_size > self.byte_budget and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.byte_size -= get_byte_size(evicted)
+
+    def get(self, settings: StrandFactory.Settings = StrandFactory.Settings()):
+        key = get_settings_key(settings)
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        strands = self.load(key) if self.directory is not None else None
+
+        if strands is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            strands = StrandFactory.build_procedural(settings)
+
+            if self.directory is not None:
+                self.save(key, strands)
+
+        self.insert(key, strands)
+
+        return strands
+
+    def clear(self):
+        self.entries.clear()
+        self.byte_size = 0
+
+
+# Shared by the callers of build_procedural below (the HairFile command line), for the lifetime of the process.
+s_procedural_cache = StrandCache()
+
+
+def build_procedural(settings: StrandFactory.Settings = StrandFactory.Settings()):
+    # StrandFactory.build_procedural through the shared cache.
+    return s_procedural_cache.get(settings)
@@ -2,142 +2,435 @@ import math
 import coalpy.gpu as gpu
 import numpy as np
 
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
 from src import Budgets
-from src import Utility
+from src import PoolAllocator
+from src import Schema
+
+
+class PositionFormat(Enum):
+    FLOAT32 = 0  # float3 object space positions.
+    UNORM16 = 1  # 3 x 16 bit, relative to the bounds of the strand cluster.
+    UNORM10 = 2  # 10:10:10 packed in a uint, relative to the bounds of the strand cluster.
+
+
+POSITION_FORMAT_BYTE_SIZES = {
+    PositionFormat.FLOAT32: 4 * 3,
+    PositionFormat.UNORM16: 2 * 3,
+    PositionFormat.UNORM10: 4
+}
+
+POSITION_FORMAT_BITS = {
+    PositionFormat.UNORM16: 16,
+    PositionFormat.UNORM10: 10
+}
+
+
+def get_cluster_bounds(positions, strand_count, strand_particle_count, strands_per_cluster):
+    # Bounds of every cluster of strands_per_cluster consecutive strands, (cluster count, 6) float3 min and extent.
+    # positions is (strand_count * strand_particle_count, 3) in the sequential layout VertexSetup reads.
+    cluster_count = math.ceil(strand_count / strands_per_cluster)
+    padding = cluster_count * strands_per_cluster - strand_count
+
+    strands = positions.reshape(strand_count, strand_particle_count, 3)
+    strand_min = np.concatenate([strands.min(axis=1), np.full((padding, 3), np.inf)])
+    strand_max = np.concatenate([strands.max(axis=1), np.full((padding, 3), -np.inf)])
+
+    cluster_min = strand_min.reshape(cluster_count, strands_per_cluster, 3).min(axis=1)
+    cluster_max = strand_max.reshape(cluster_count, strands_per_cluster, 3).max(axis=1)
+
+    return np.concatenate([cluster_min, cluster_max - cluster_min], axis=1).astype('f')
+
+
+def get_particle_clusters(strand_count, strand_particle_count, strands_per_cluster):
+    return np.arange(strand_count * strand_particle_count) // strand_particle_count // strands_per_cluster
+
+
+def quantize_positions(positions, strand_count, strand_particle_count, position_format, strands_per_cluster):
+    # Encodes positions, returns the uint32 words to upload and the cluster bounds (None for FLOAT32).
+    positions = np.asarray(positions, dtype='f').reshape(-1, 3)
+
+    if position_format == PositionFormat.FLOAT32:
+        return positions.reshape(-1).view(np.uint32), None
+
+    bounds = get_cluster_bounds(positions, strand_count, strand_particle_count, strands_per_cluster)
+    cluster = get_particle_clusters(strand_count, strand_particle_count, strands_per_cluster)
+
+    lo = bounds[cluster, 0:3]
+    extent = bounds[cluster, 3:6]
+
+    # Flat clusters (extent 0) decode to their min whatever the value.
+    max_value = (1 << POSITION_FORMAT_BITS[position_format]) - 1
+    normalized = np.where(extent > 0, (positions - lo) / np.where(extent > 0, extent, 1), 0)
+    q = np.round(np.clip(normalized, 0, 1) * max_value).astype(np.uint32)
+
+    if position_format == PositionFormat.UNORM10:
+        return q[:, 0] | (q[:, 1] << 10) | (q[:, 2] << 20), bounds
+
+    # Tightly packed 16 bit values, padded to whole words.
+    halves = q.reshape(-1).astype(np.uint16)
+    if len(halves) % 2:
+        halves = np.append(halves, np.uint16(0))
+
+    return halves.view(np.uint32), bounds
+
+
+def dequantize_positions(words, bounds, strand_count, strand_particle_count, position_format, strands_per_cluster):
+    # Mirror of the VertexSetup decoding.
+    count = strand_count * strand_particle_count
+
+    if position_format == PositionFormat.FLOAT32:
+        return words.view('f')[:count * 3].reshape(-1, 3)
+
+    if position_format == PositionFormat.UNORM10:
+        q = np.stack([words[:count] & 0x3ff, (words[:count] >> 10) & 0x3ff, (words[:count] >> 20) & 0x3ff], axis=1)
+    else:
+        q = words.view(np.uint16)[:count * 3].reshape(-1, 3)
+
+    max_value = (1 << POSITION_FORMAT_BITS[position_format]) - 1
+    cluster = get_particle_clusters(strand_count, strand_particle_count, strands_per_cluster)
+
+    return (bounds[cluster, 0:3] + bounds[cluster, 3:6] * (q.astype('f') / max_value)).astype('f')
+
+
+@dataclass
+class StrandAllocation:
+    # Handle of the strands of one asset resident in the pools, see StrandDeviceMemory.upload.
+    key: object
+    strand_count: int
+    strand_particle_count: int
+    position_offset: int  # First position (particle) in the strand data pool.
+    position_count: int
+    cluster_offset: int  # First cluster bounds in the bounds pool, quantized formats only.
+    cluster_count: int
+    byte_size: int
+
+
+class StrandUpload:
+    # Upload of encoded strands into their allocation, recorded in slices (see StrandDeviceMemory.begin_upload).
+
+    def __init__(self, device_memory, allocation, words, bounds):
+        self.device_memory = device_memory
+        self.allocation = allocation
+        self.words = words
+        self.bounds = bounds
+        self.uploaded_word_count = 0
+
+    @property
+    def done(self):
+        return self.uploaded_word_count == len(self.words)
+
+    @property
+    def progress(self):
+        return self.uploaded_word_count / len(self.words) if len(self.words) else 1.0
+
+    def record(self, cmd, max_byte_size=None):
+        # Records the next slice of at most max_byte_size bytes of positions (all of them by default), the bounds
+        # along with the first slice.
+        device_memory = self.device_memory
+
+        if self.uploaded_word_count == 0 and self.bounds is not None and len(self.bounds):
+            cmd.upload_resource(
+                source=Schema.STRAND_BOUNDS.view(self.bounds),
+                destination=device_memory.b_strand_bounds,
+                destination_offset=self.allocation.cluster_offset * Budgets.BYTE_SIZE_STRAND_BOUNDS_FORMAT
+            )
+
+        begin = self.uploaded_word_count
+        end = len(self.words) if max_byte_size is None else min(len(self.words), begin + max(1, max_byte_size // 4))
+
+        if end > begin:
+            position_byte_size = POSITION_FORMAT_BYTE_SIZES[device_memory.position_format]
+
+            cmd.upload_resource(
+                source=self.words[begin:end],
+                destination=device_memory.b_strands,
+                destination_offset=self.allocation.position_offset * position_byte_size + 4 * begin
+            )
+
+        self.uploaded_word_count = end
 
 
 class StrandDeviceMemory:
 
-    def __init__(self):
+    def __init__(self, position_format=PositionFormat.FLOAT32, strands_per_cluster=Budgets.STRANDS_PER_CLUSTER,
+                 residency_budget=Budgets.BYTE_SIZE_STRAND_DATA_POOL):
 
-        self.b_vertices = gpu.Buffer(
-            name="GlobalVertexBuffer",
-            type=gpu.BufferType.Structured,
-            stride=Budgets.BYTE_SIZE_VERTEX_FORMAT,
-            element_count=math.ceil(Budgets.BYTE_SIZE_VERTEX_POOL / Budgets.BYTE_SIZE_VERTEX_FORMAT)
-        )
+        # Bumped whenever the contents change, frame reuse (see FrameCache.py) keys on it.
+        self.version = 0
 
-        self.b_indices = gpu.Buffer(
-            name="GlobalIndexBuffer",
-            type=gpu.BufferType.Standard,
-            format=gpu.Format.R32_UINT,
-            element_count=math.ceil(Budgets.BYTE_SIZE_INDEX_POOL / Budgets.BYTE_SIZE_INDEX_FORMAT)
-        )
+        # Storage of the strand positions, the quantized formats decode relative to the bounds of each cluster of
+        # strands_per_cluster strands (1 for per-strand bounds).
+        self.position_format = position_format
+        self.strands_per_cluster = strands_per_cluster
+        self.strand_count = 0
+        self.strand_particle_count = 0
+
+        # Placed copies of the strands (see StrandScene.py), none draws the strands once as they are.
+        self.instance_count = 0
 
-        self.b_strands = gpu.Buffer(
-            name="GlobalStrandPositionBuffer",
+        # Several assets are resident at once, sub-allocated in the pools. Switching to a resident asset (use) only
+        # changes the offsets vertex setup reads the strands at. The least recently used assets are evicted once the
+        # resident bytes would exceed the residency budget, or a pool has no free range large enough.
+        self.residency_budget = residency_budget
+        self.allocations = OrderedDict()
+        self.active = None
+
+        # Allocations of the uploads in flight (see begin_upload), resident once they end.
+        self.pending = {}
+
+        self.create_pools()
+
+        self.b_strand_instances = gpu.Buffer(
+            name="GlobalStrandInstanceBuffer",
             type=gpu.BufferType.Structured,
-            stride=Budgets.BYTE_SIZE_STRAND_DATA_FORMAT,
-            element_count=math.ceil(
-                Budgets.BYTE_SIZE_STRAND_DATA_POOL / Budgets.BYTE_SIZE_STRAND_DATA_FORMAT)
+            stride=Budgets.BYTE_SIZE_STRAND_INSTANCE_FORMAT,
+            element_count=Budgets.MAX_STRAND_INSTANCES
         )
 
+    def create_pools(self):
+        # Empty strand data and bounds pools in the position format.
+        position_format = self.position_format
+
+        position_capacity = math.ceil(Budgets.BYTE_SIZE_STRAND_DATA_POOL / Budgets.BYTE_SIZE_STRAND_DATA_FORMAT)
+        bounds_capacity = Budgets.BYTE_SIZE_STRAND_BOUNDS_POOL // Budgets.BYTE_SIZE_STRAND_BOUNDS_FORMAT
+
+        # Positions are allocated in pairs, so the 16 bit positions of every allocation start on a word.
+        self.position_allocator = PoolAllocator.FreeListAllocator(position_capacity, alignment=2)
+        self.cluster_allocator = PoolAllocator.FreeListAllocator(bounds_capacity)
+
+        if position_format == PositionFormat.FLOAT32:
+            self.b_strands = gpu.Buffer(
+                name="GlobalStrandPositionBuffer",
+                type=gpu.BufferType.Structured,
+                stride=Budgets.BYTE_SIZE_STRAND_DATA_FORMAT,
+                element_count=position_capacity
+            )
+
+            self.b_strand_bounds = None
+        else:
+            # Same position capacity, in a fraction of the memory.
+            self.b_strands = gpu.Buffer(
+                name="GlobalStrandPositionBuffer",
+                type=gpu.BufferType.Raw,
+                element_count=math.ceil(position_capacity * POSITION_FORMAT_BYTE_SIZES[position_format] / 4)
+            )
+
+            self.b_strand_bounds = gpu.Buffer(
+                name="GlobalStrandBoundsBuffer",
+                type=gpu.BufferType.Structured,
+                stride=Budgets.BYTE_SIZE_STRAND_BOUNDS_FORMAT,
+                element_count=bounds_capacity
+            )
+
+    def set_position_format(self, position_format):
+        # Rebuilds the pools in another position format. Every asset is evicted (the uploads in flight are dropped),
+        # upload them again.
+        if position_format == self.position_format:
+            return
+
+        self.position_format = position_format
+
+        self.allocations.clear()
+        self.pending.clear()
+        self.active = None
+
+        self.create_pools()
+        self.layout(0, 0)
+
+    @property
+    def instanced(self):
+        return self.instance_count > 0
+
+    @property
+    def position_offset(self):
+        return self.active.position_offset if self.active is not None else 0
+
+    @property
+    def cluster_offset(self):
+        return self.active.cluster_offset if self.active is not None else 0
+
+    @property
+    def resident_byte_size(self):
+        allocations = list(self.allocations.values()) + list(self.pending.values())
+        return sum(allocation.byte_size for allocation in allocations)
+
+    def get_position_buffers(self):
+        # The buffers vertex setup reads the positions from, in register order.
+        buffers = [self.b_strands]
+
+        if self.b_strand_bounds is not None:
+            buffers.append(self.b_strand_bounds)
+
+        if self.instanced:
+            buffers.append(self.b_strand_instances)
+
+        return buffers
+
     def layout(self, strand_count, strand_particle_count):
+        # The topology is procedural: vertex IDs and UVs (VertexSetup) and segment indices (SegmentSetup) are derived
+        # from the dispatch index and the strand particle count, nothing is uploaded.
+        # Lays out the strands of the next bind_strand_position_data.
+        self.version += 1
+
+        self.strand_count = strand_count
+        self.strand_particle_count = strand_particle_count
+
+        # Instances address the strands of the previous layout.
+        self.instance_count = 0
 
-        perLineVertices = strand_particle_count
-        perLineSegments = perLineVertices - 1
-        perLineIndices = perLineSegments * 2
-
-        vertexID = np.zeros(strand_count * perLineVertices, dtype='f')
-        vertexIDIdx = 0
-        vertexUV = np.zeros(strand_count * perLineVertices, dtype='f')
-        vertexUVIdx = 0
-        indices = np.zeros(strand_count * perLineIndices, dtype='i')
-        indicesIdx = 0
-
-        unormU0 = int(65535 * 0.5)
-        unormVk = int(65535 / perLineSegments)
-
-        # Vertex ID
-        i, k = 0, 0
-        while i != strand_count:
-
-            begin, stride, end = Utility.get_strand_iterator(Utility.MemoryLayout.Interleaved,
-                                                             i, strand_count, strand_particle_count)
-
-            j = begin
-            while (j < end):
-                vertexID[vertexIDIdx] = k
-
-                k += 1
-                vertexIDIdx += 1
-                j += stride
-
-            i += 1
-
-        # Vertex UV
-        i = 0
-        while i != strand_count:
-
-            begin, stride, end = Utility.get_strand_iterator(Utility.MemoryLayout.Interleaved,
-                                                             i, strand_count, strand_particle_count)
-
-            j, k = begin, 0
-            while j < end:
-                unormV = unormVk * k
-                vertexUV[vertexUVIdx] = ((unormV << 16) | unormU0) / 0xffffffff  # Lazy integer normalization
-                k += 1
-                vertexUVIdx += 1
-                j += stride
-
-            i += 1
-
-        # Interleave these IDs and UVs lists for buffer upload
-        # Temporarily just write everything as floats and type cast in HLSL
-        vertices = np.array([val for pair in zip(vertexID, vertexUV) for val in pair], dtype='f')
-
-        # Indices
-        i, s = 0, 0
-        while i != strand_count:
-            j = 0
-            while j != perLineSegments:
-                indices[indicesIdx] = s + 0
-                indicesIdx += 1
-                indices[indicesIdx] = s + 1
-                indicesIdx += 1
-                j += 1
-                s += 1
-            i += 1
-            s += 1
-
-        # Upload
+    def bind_strand_position_data(self, positions: np.ndarray, key=None):
+        # Uploads the strands laid out by the last call to layout as the resident asset key (replacing it), and
+        # switches to them.
+        return self.use(self.upload(key, self.strand_count, self.strand_particle_count, positions).key)
+
+    def is_resident(self, key):
+        return key in self.allocations
+
+    def use(self, key):
+        # Switches to a resident asset, returns its allocation.
+        allocation = self.allocations[key]
+        self.allocations.move_to_end(key)
+
+        if allocation is not self.active:
+            self.layout(allocation.strand_count, allocation.strand_particle_count)
+            self.active = allocation
+
+        return allocation
 
-        cmd = gpu.CommandList()
+    def evict(self, key):
+        allocation = self.allocations.pop(key)
 
-        cmd.upload_resource(
-            source=vertices,
-            destination=self.b_vertices
-        )
+        self.position_allocator.free(allocation.position_offset, allocation.position_count)
+        self.cluster_allocator.free(allocation.cluster_offset, allocation.cluster_count)
+
+        if allocation is self.active:
+            self.active = None
+            self.layout(0, 0)
 
-        cmd.upload_resource(
-            source=indices,
-            destination=self.b_indices
-        )
+    def get_byte_size(self, position_count, cluster_count):
+        position_count = self.position_allocator.align(position_count)
+        return (position_count * POSITION_FORMAT_BYTE_SIZES[self.position_format] +
+                cluster_count * Budgets.BYTE_SIZE_STRAND_BOUNDS_FORMAT)
+
+    def allocate(self, key, strand_count, strand_particle_count, evict_active=True):
+        # Sub-allocates the strands, evicting the least recently used assets until they fit. Without evict_active the
+        # active strands stay (they render while the new ones upload), ValueError if the new ones don't fit next to
+        # them.
+        position_count = strand_count * strand_particle_count
+        cluster_count = math.ceil(strand_count / self.strands_per_cluster) if self.b_strand_bounds is not None else 0
+        byte_size = self.get_byte_size(position_count, cluster_count)
+
+        if (byte_size > self.residency_budget or
+                self.position_allocator.align(position_count) > self.position_allocator.capacity or
+                cluster_count > self.cluster_allocator.capacity):
+            raise ValueError("{} strands of {} particles exceed the strand pools, increase the strands per cluster or "
+                             "the residency budget.".format(strand_count, strand_particle_count))
+
+        while True:
+            if self.resident_byte_size + byte_size <= self.residency_budget:
+                position_offset = self.position_allocator.allocate(position_count)
+                cluster_offset = self.cluster_allocator.allocate(cluster_count)
+
+                if position_offset is not None and cluster_offset is not None:
+                    return StrandAllocation(key, strand_count, strand_particle_count, position_offset,
+                                            position_count, cluster_offset, cluster_count, byte_size)
+
+                # Fragmented, release the range that fitted.
+                if position_offset is not None:
+                    self.position_allocator.free(position_offset, position_count)
+                if cluster_offset is not None:
+                    self.cluster_allocator.free(cluster_offset, cluster_count)
 
+            # The empty pools fit any strands that passed the checks above, unless uploads in flight (or the pinned
+            # active strands) hold them.
+            candidates = [k for k, resident in self.allocations.items()
+                          if evict_active or resident is not self.active]
+
+            if not candidates:
+                raise ValueError("{} strands of {} particles don't fit next to the {}.".format(
+                    strand_count, strand_particle_count,
+                    "uploads in flight" if evict_active else "active strands and the uploads in flight"))
+
+            self.evict(candidates[0])
+
+    def encode(self, strand_count, strand_particle_count, positions: np.ndarray):
+        # The uint32 words and cluster bounds (None for FLOAT32) of the strands in the storage format. Only reads the
+        # format, so it may run on any thread (see AssetLoader.py).
+
+        # Schema.STRAND_DATA records (see StrandFactory.py) or an (n, 3) array, the float format uploads a view of them.
+        if positions.dtype != Schema.STRAND_DATA.dtype:
+            positions = Schema.STRAND_DATA.view(np.asarray(positions, dtype='f'))
+
+        return quantize_positions(positions["strandPositionOS"], strand_count, strand_particle_count,
+                                  self.position_format, self.strands_per_cluster)
+
+    def begin_upload(self, key, strand_count, strand_particle_count, words, bounds, evict_active=True):
+        # Allocates encoded strands as key (replacing it), their upload is recorded by the returned StrandUpload and
+        # they are resident once end_upload is called. Without evict_active the active strands are pinned until then,
+        # even when they are the ones replaced.
+        if key in self.allocations and (evict_active or self.allocations[key] is not self.active):
+            self.evict(key)
+
+        self.cancel_upload(key)
+
+        allocation = self.allocate(key, strand_count, strand_particle_count, evict_active)
+        self.pending[key] = allocation
+
+        return StrandUpload(self, allocation, words, bounds)
+
+    def end_upload(self, upload: StrandUpload):
+        # A pinned active copy of the same key is released, the caller switches to the new one (use).
+        if upload.allocation.key in self.allocations:
+            replaced = self.allocations.pop(upload.allocation.key)
+            self.position_allocator.free(replaced.position_offset, replaced.position_count)
+            self.cluster_allocator.free(replaced.cluster_offset, replaced.cluster_count)
+
+            if replaced is self.active:
+                self.active = None
+
+        allocation = self.pending.pop(upload.allocation.key)
+        self.allocations[allocation.key] = allocation
+
+        return allocation
+
+    def cancel_upload(self, key):
+        allocation = self.pending.pop(key, None)
+
+        if allocation is not None:
+            self.position_allocator.free(allocation.position_offset, allocation.position_count)
+            self.cluster_allocator.free(allocation.cluster_offset, allocation.cluster_count)
+
+    def upload(self, key, strand_count, strand_particle_count, positions: np.ndarray):
+        # Makes the strands resident as key (replacing it) without switching to them, returns their allocation.
+        upload = self.begin_upload(key, strand_count, strand_particle_count,
+                                   *self.encode(strand_count, strand_particle_count, positions))
+
+        cmd = gpu.CommandList()
+        upload.record(cmd)
         gpu.schedule(cmd)
 
-        return
+        return self.end_upload(upload)
 
-    def bind_strand_position_data(self, positions: np.ndarray):
+    def bind_strand_instance_data(self, instances: np.ndarray):
+        # Schema.STRAND_INSTANCE records, sorted by their first strand (see StrandScene.get_instance_data).
+        if len(instances) > Budgets.MAX_STRAND_INSTANCES:
+            raise ValueError("{} instances exceed the instance cap ({} instances).".format(
+                len(instances), Budgets.MAX_STRAND_INSTANCES))
 
-        # Dumb flattening of the object list
-        positionsGPU = np.zeros(positions.size * 3, 'f')
+        self.version += 1
+        self.instance_count = len(instances)
 
-        i, j = 0, 0
-        while i != positions.size * 3:
-            positionsGPU[i + 0] = positions[j].x
-            positionsGPU[i + 1] = positions[j].y
-            positionsGPU[i + 2] = positions[j].z
-            i += 3
-            j += 1
+        if not self.instanced:
+            return
 
         cmd = gpu.CommandList()
 
         cmd.upload_resource(
-            source=positionsGPU,
-            destination=self.b_strands
+            source=Schema.STRAND_INSTANCE.view(instances),
+            destination=self.b_strand_instances
         )
 
         gpu.schedule(cmd)
-
-        return
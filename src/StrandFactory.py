@@ -3,6 +3,9 @@ import os
 import numpy as np
 import random
 
+from src import HairFile
+from src import Schema
+from src import StrandOrder
 from src import Utility
 from dataclasses import dataclass
 
@@ -28,6 +31,7 @@ class Settings:
     strand_length: float = 2
     strand_length_variation: bool = False
     strand_length_variation_amount: float = 0.2
+    seed: int = 0  # Of the random placement and variations, equal settings build equal strands.
 
     # Curls
     curl: bool = True
@@ -51,8 +55,9 @@ class Roots:
 class Strands:
     strand_count: int
     strand_particle_count: int
-    particle_positions: np.ndarray  # Flatted list of positions
+    particle_positions: np.ndarray  # Flattened positions, Schema.STRAND_DATA records
     memory_layout: Utility.MemoryLayout
+    strand_remap: np.ndarray = None  # Source strand of every strand once reordered (see StrandOrder.py)
 
 
 def generate_roots(settings: Settings) -> Roots:
@@ -130,7 +135,8 @@ def generate_roots(settings: Settings) -> Roots:
 
 
 def generate_strands(roots: Roots, settings: Settings) -> Strands:
-    strand_pos = np.zeros(settings.strand_count * settings.strand_particle_count, dtype='object')
+    strand_pos = Schema.STRAND_DATA.zeros(settings.strand_count * settings.strand_particle_count)
+    strand_pos_os = strand_pos["strandPositionOS"]
 
     particle_interval = settings.strand_length / (settings.strand_particle_count - 1)
     particle_interval_variation = settings.strand_length_variation_amount if settings.strand_length_variation else 0.0
@@ -182,7 +188,7 @@ def generate_strands(roots: Roots, settings: Settings) -> Strands:
                 dv = target_radius * math.sin(t * a)
                 dn = stepSlope * t
 
-                strand_pos[j] = Utility.Vector3(
+                strand_pos_os[j] = (
                     cur_pos.x + (du * cur_plane_u.x) + (dv * cur_plane_v.x) + (dn * cur_dir.x),
                     cur_pos.y + (du * cur_plane_u.y) + (dv * cur_plane_v.y) + (dn * cur_dir.y),
                     cur_pos.z + (du * cur_plane_u.z) + (dv * cur_plane_v.z) + (dn * cur_dir.z)
@@ -195,7 +201,7 @@ def generate_strands(roots: Roots, settings: Settings) -> Strands:
             j = begin
             while j != end:
                 # TODO: Overload
-                strand_pos[j] = Utility.Vector3(
+                strand_pos_os[j] = (
                     cur_pos.x + (k * step * cur_dir.x),
                     cur_pos.y + (k * step * cur_dir.y),
                     cur_pos.z + (k * step * cur_dir.z)
@@ -216,22 +222,38 @@ def generate_strands(roots: Roots, settings: Settings) -> Strands:
 
 # Build a strand group based on procedural settings
 def build_procedural(settings: Settings = Settings()):
-    # Generate the roots based on the primitive placement type.
-    roots = generate_roots(settings)
+    # The generation draws from the global random state, seeded for the build and restored after.
+    state = random.getstate()
+    random.seed(settings.seed)
 
-    # Generate the strands based on the roots and other settings.
-    return generate_strands(roots, settings)
+    try:
+        # Generate the roots based on the primitive placement type.
+        roots = generate_roots(settings)
+
+        # Generate the strands based on the roots and other settings.
+        return generate_strands(roots, settings)
+    finally:
+        random.setstate(state)
 
 
-# Build a strand group based on a line OBJ.
-def build_from_asset(path):
+# Build a strand group based on a binary .hair file, or else a line OBJ, optionally reordered along a space-filling
+# curve for the locality of the binning (see StrandOrder.py).
+def build_from_asset(path, curve=StrandOrder.Curve.NONE, anchor=StrandOrder.Anchor.ROOT):
     print("ASSET:" +path)
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    hair_path = "{}/data/{}.hair".format(root, path)
+
+    if os.path.exists(hair_path):
+        # Memory mapped, uploaded as is (see HairFile.py) unless reordered.
+        strand_count, strand_particle_count, strand_pos = HairFile.read(hair_path)
+        strands = Strands(strand_count, strand_particle_count, strand_pos, Utility.MemoryLayout.Sequential)
+        return StrandOrder.reorder(strands, curve, anchor)
+
     strand_pos = []
     strand_count = 0
     strand_particle_count = 0
 
-    root = os.path.dirname(os.path.abspath(__file__))
-
     try:
         f = open("{}/data/{}.obj".format(root, path))
         for line in f:
@@ -240,8 +262,7 @@ def build_from_asset(path):
                 i1 = line.find(" ", i0 + 1)
                 i2 = line.find(" ", i1 + 1)
 
-                # Technically pointless as the list is flattened before bound to GPU
-                strand_pos.append(Utility.Vector3(
+                strand_pos.append((
                     float(line[i0:i1]),
                     float(line[i1:i2]),
                     float(line[i2:-1])
@@ -254,4 +275,8 @@ def build_from_asset(path):
     except IOError:
         print("Failed to find file at path.")
 
-    return Strands(strand_count, strand_particle_count, np.array(strand_pos), Utility.MemoryLayout.Sequential)
+    # Uploaded as is, see StrandDeviceMemory.bind_strand_position_data.
+    strand_pos = Schema.STRAND_DATA.view(np.array(strand_pos, dtype='f'))
+
+    strands = Strands(strand_count, strand_particle_count, strand_pos, Utility.MemoryLayout.Sequential)
+    return StrandOrder.reorder(strands, curve, anchor)
@@ -0,0 +1,136 @@
+# Spatial strand order.
+# Strands come in the order of the asset (or of the procedural roots), so the segments of neighbouring RasterBin threads
+# land in unrelated bins. Sorting the strands along a space-filling curve over their root (or centroid) makes the
+# threads of a wave touch a few neighbouring bin counters, and the segments of a bin come from nearby vertex outputs.
+# A reordered group keeps the source index of every strand (strand_remap) for per-strand attribute lookups.
+# See StrandOrderReport.py for the measurement.
+
+import dataclasses
+import numpy as np
+
+from enum import Enum
+from src import Schema
+from src import Utility
+
+
+class Curve(Enum):
+    NONE = 0
+    MORTON = 1
+    HILBERT = 2
+
+
+class Anchor(Enum):
+    ROOT = 0  # First particle of the strand.
+    CENTROID = 1  # Mean of the particles.
+
+
+# Bits per axis of the quantized anchors, the codes fit in 30 bits.
+CURVE_BITS = 10
+
+
+def get_morton_codes(q):
+    # Interleaved bits of the (n, 3) quantized coordinates, x in the lowest bit.
+    codes = np.zeros(len(q), dtype=np.uint64)
+
+    for bit in range(CURVE_BITS):
+        for axis in range(3):
+            codes |= ((q[:, axis].astype(np.uint64) >> bit) & 1) << (3 * bit + axis)
+
+    return codes
+
+
+def get_hilbert_codes(q):
+    # Distance along the Hilbert curve of the (n, 3) quantized coordinates (Skilling, "Programming the Hilbert curve",
+    # axes to transpose), then the transposed bits interleaved x first.
+    x = [q[:, axis].astype(np.uint64) for axis in range(3)]
+
+    m = np.uint64(1 << (CURVE_BITS - 1))
+
+    # Inverse undo.
+    b = m
+    while b > 1:
+        p = b - np.uint64(1)
+
+        for i in range(3):
+            high = (x[i] & b) != 0
+
+            # Invert the low bits of x, or exchange them with the low bits of axis i.
+            t = np.where(high, np.uint64(0), (x[0] ^ x[i]) & p)
+            x[0] = np.where(high, x[0] ^ p, x[0] ^ t)
+
+            if i > 0:
+                x[i] ^= t
+
+        b >>= np.uint64(1)
+
+    # Gray encode.
+    x[1] ^= x[0]
+    x[2] ^= x[1]
+
+    t = np.zeros(len(q), dtype=np.uint64)
+
+    b = m
+    while b > 1:
+        t = np.where((x[2] & b) != 0, t ^ (b - np.uint64(1)), t)
+        b >>= np.uint64(1)
+
+    x = [axis ^ t for axis in x]
+
+    codes = np.zeros(len(q), dtype=np.uint64)
+
+    for bit in range(CURVE_BITS - 1, -1, -1):
+        for axis in range(3):
+            codes = (codes << np.uint64(1)) | ((x[axis] >> np.uint64(bit)) & np.uint64(1))
+
+    return codes
+
+
+def get_sequential_positions(strands):
+    # (strand_count, strand_particle_count, 3) positions, whatever the layout of the strands.
+    begin, stride, _ = Utility.get_strand_iterator(strands.memory_layout, np.arange(strands.strand_count)[:, None],
+                                                   strands.strand_count, strands.strand_particle_count)
+    order = (begin + stride * np.arange(strands.strand_particle_count)).reshape(-1)
+
+    return strands.particle_positions["strandPositionOS"][order].reshape(
+        strands.strand_count, strands.strand_particle_count, 3)
+
+
+def get_strand_order(strands, curve=Curve.HILBERT, anchor=Anchor.ROOT):
+    # Source strand of every strand along the curve.
+    if curve == Curve.NONE or strands.strand_count == 0:
+        return np.arange(strands.strand_count)
+
+    positions = get_sequential_positions(strands)
+    anchors = positions[:, 0] if anchor == Anchor.ROOT else positions.mean(axis=1)
+
+    # Quantized over the bounds of the anchors, with the same scale on every axis so the curve keeps its locality.
+    lo = anchors.min(axis=0)
+    extent = max(float((anchors.max(axis=0) - lo).max()), 1e-20)
+    max_value = (1 << CURVE_BITS) - 1
+    q = np.clip(np.round((anchors - lo) / extent * max_value), 0, max_value).astype(np.uint32)
+
+    codes = get_morton_codes(q) if curve == Curve.MORTON else get_hilbert_codes(q)
+
+    return np.argsort(codes, kind='stable')
+
+
+def reorder(strands, curve=Curve.HILBERT, anchor=Anchor.ROOT):
+    # The strands along the curve, sequentially laid out, with the source index of every strand (strand_remap).
+    if curve == Curve.NONE:
+        return strands
+
+    order = get_strand_order(strands, curve, anchor)
+    positions = get_sequential_positions(strands)[order].reshape(-1, 3)
+
+    # Reordering a reordered group composes the remap tables.
+    remap = order if strands.strand_remap is None else strands.strand_remap[order]
+
+    return dataclasses.replace(strands,
+                               particle_positions=Schema.STRAND_DATA.view(positions),
+                               memory_layout=Utility.MemoryLayout.Sequential,
+                               strand_remap=remap)
+
+
+def get_asset_key(asset, curve=Curve.NONE):
+    # Residency key of an asset in an order (see StrandDeviceMemory.use).
+    return asset if curve == Curve.NONE else "{} ({})".format(asset, curve.name.lower())
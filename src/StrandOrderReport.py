@@ -0,0 +1,93 @@
+# Measures what the spatial strand order (StrandOrder.py) does to the locality of the binning on a frame of the CPU
+# mirror (RasterizerCPU.py). RasterBin runs one thread per surviving segment in segment order and increments the counter
+# of every bin the segment covers, so per wave of threads the report counts:
+#   - the distinct bin counters and counter cache lines the wave's atomics touch (the scatter),
+#   - the longest run of atomics on one counter (the serialization of same-address atomics),
+# and per bin, the distinct vertex output cache lines the fine pass loads for its segments.
+
+import numpy as np
+
+from src import Budgets
+from src import CurveReference
+from src import StrandFactory
+from src import StrandOrder
+from src import RasterizerCPU
+from src import CPUScalingReport
+
+WAVE_SIZE = 32
+CACHE_LINE_BYTE_SIZE = 128
+
+
+def count_distinct(groups, values):
+    # Distinct (group, value) pairs.
+    pairs = np.unique(np.stack([groups, values], axis=1), axis=0)
+    return len(pairs)
+
+
+def get_locality(buffers):
+    segment_index, bin_index, _ = RasterizerCPU.get_bin_records(buffers)
+
+    # The binning thread of every record: the position of its segment in the compacted (sorted) segments.
+    thread = np.searchsorted(buffers["compacted_segments"], segment_index)
+    wave = thread // WAVE_SIZE
+    wave_count = max(int(wave.max()) + 1 if len(wave) else 0, 1)
+
+    counters_per_line = CACHE_LINE_BYTE_SIZE // 4
+    pairs, multiplicity = np.unique(np.stack([wave, bin_index], axis=1), axis=0, return_counts=True)
+    serialization = np.zeros(wave_count, dtype=np.int64)
+    np.maximum.at(serialization, pairs[:, 0], multiplicity)
+
+    # Vertex output lines of the segments of every bin, both end points.
+    vi = buffers["segment_data"][segment_index]
+    lines = vi * Budgets.BYTE_SIZE_VERTEX_OUTPUT_FORMAT // CACHE_LINE_BYTE_SIZE
+    bin_count = max(len(np.unique(bin_index)), 1)
+
+    return dict(
+        bins_per_wave=len(pairs) / wave_count,
+        counter_lines_per_wave=count_distinct(wave, bin_index // counters_per_line) / wave_count,
+        serialization_per_wave=serialization.mean(),
+        vertex_lines_per_bin=count_distinct(np.repeat(bin_index, 2), lines.reshape(-1)) / bin_count,
+        records=len(segment_index)
+    )
+
+
+def run(asset="fur_field", w=1920, h=1080):
+    source = StrandFactory.build_from_asset(asset)
+    target = np.zeros((h, w, 4), dtype='f')
+
+    print("{} ({}x{}, waves of {} threads, {} byte lines)".format(asset, w, h, WAVE_SIZE, CACHE_LINE_BYTE_SIZE))
+    print("  {:<18} {:>9} {:>12} {:>16} {:>16} {:>18}".format(
+        "order", "records", "bins/wave", "counter lines", "serialization", "vertex lines/bin"))
+
+    reference = None
+
+    for curve in StrandOrder.Curve:
+        for anchor in (StrandOrder.Anchor if curve != StrandOrder.Curve.NONE else [StrandOrder.Anchor.ROOT]):
+            strands = StrandOrder.reorder(source, curve, anchor)
+            vertices = CurveReference.get_strand_vertices(strands)
+
+            # The remap table finds the source strand of every strand.
+            if strands.strand_remap is not None:
+                source_vertices = CurveReference.get_strand_vertices(source).reshape(source.strand_count, -1, 3)
+                assert np.array_equal(vertices.reshape(strands.strand_count, -1, 3),
+                                      source_vertices[strands.strand_remap])
+
+            rasterizer = RasterizerCPU.RasterizerCPU(w, h)
+            context = CPUScalingReport.build_context(strands, vertices, target, w, h, False)
+            rasterizer.setup(context)
+
+            locality = get_locality(rasterizer.buffers)
+
+            # Reordering moves work around, it neither adds nor removes any.
+            reference = reference or locality["records"]
+            assert locality["records"] == reference
+
+            name = "none" if curve == StrandOrder.Curve.NONE else "{} {}".format(curve.name.lower(),
+                                                                                 anchor.name.lower())
+            print("  {:<18} {:>9} {:>12.1f} {:>16.1f} {:>16.2f} {:>18.1f}".format(
+                name, locality["records"], locality["bins_per_wave"], locality["counter_lines_per_wave"],
+                locality["serialization_per_wave"], locality["vertex_lines_per_bin"]))
+
+
+if __name__ == "__main__":
+    run()
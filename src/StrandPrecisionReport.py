@@ -0,0 +1,62 @@
+# Reports the storage and the precision of the strand position formats (see StrandDeviceMemory.PositionFormat) for a
+# few cluster sizes: bytes per position (bounds included), and the decoding error in object space and in pixels for
+# the default camera.
+
+import numpy as np
+
+from src import Camera
+from src import Vector
+from src import CurveReference
+from src import StrandFactory
+from src import StrandDeviceMemory
+
+
+def project(positions, camera, w, h):
+    # Pixel coordinates, see RasterizerCPU.vertex_setup.
+    positions = np.concatenate([positions, np.ones((len(positions), 1), dtype='f')], axis=1)
+    positions_cs = positions @ camera.view_matrix.T @ camera.proj_matrix.T
+    ndc = positions_cs[:, 0:2] / positions_cs[:, 3:4]
+    return (ndc * 0.5 + 0.5) * np.array([w, h])
+
+
+def run(assets=("fur_field", "cube_hair"), w=1920, h=1080, cluster_sizes=(1, 32, 256)):
+    camera = Camera.Camera(w, h)
+    camera.pos = Vector.float3(0.0, 0.0, -10.690)
+    camera.transform.update_mats()
+
+    for asset in assets:
+        strands = StrandFactory.build_from_asset(asset)
+        positions = CurveReference.get_strand_vertices(strands)
+        reference = project(positions, camera, w, h)
+
+        count = len(positions)
+        extent = np.max(positions.max(axis=0) - positions.min(axis=0))
+
+        print("{} ({} strands, {} positions, extent {:.3f})".format(asset, strands.strand_count, count, extent))
+        print("  {:<8} {:>8} {:>14} {:>10} {:>14} {:>14} {:>12}".format(
+            "format", "cluster", "bytes / pos", "upload", "max error", "rms error", "max px"))
+
+        for position_format in StrandDeviceMemory.PositionFormat:
+            quantized = position_format != StrandDeviceMemory.PositionFormat.FLOAT32
+
+            for cluster_size in (cluster_sizes if quantized else [1]):
+                words, bounds = StrandDeviceMemory.quantize_positions(
+                    positions, strands.strand_count, strands.strand_particle_count, position_format, cluster_size)
+
+                decoded = StrandDeviceMemory.dequantize_positions(
+                    words, bounds, strands.strand_count, strands.strand_particle_count, position_format, cluster_size)
+
+                error = np.linalg.norm(decoded - positions, axis=1)
+                pixel_error = np.linalg.norm(project(decoded, camera, w, h) - reference, axis=1)
+
+                byte_size = words.nbytes + (bounds.nbytes if bounds is not None else 0)
+
+                print("  {:<8} {:>8} {:>14.2f} {:>9.0f}% {:>14.3e} {:>14.3e} {:>12.4f}".format(
+                    position_format.name, cluster_size if quantized else "-", byte_size / count,
+                    100.0 * byte_size / (count * StrandDeviceMemory.POSITION_FORMAT_BYTE_SIZES[
+                        StrandDeviceMemory.PositionFormat.FLOAT32]),
+                    error.max(), np.sqrt(np.mean(error ** 2)), np.nanmax(pixel_error)))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,138 @@
+# Instanced strand groups.
+# A scene places copies of the strands bound to a StrandDeviceMemory: the strand data is stored and uploaded once,
+# every instance only adds a transform and a LOD (see Schema.STRAND_INSTANCE). The vertex setup expands the instances
+# (INSTANCED permutation of VertexSetup.hlsl), so the vertex and segment work grows with the rendered strands while the
+# strand memory does not. The rendered strands of all instances are contiguous: the context strand and segment counts
+# are the scene's (get_strand_count, get_segment_count), and a lower LOD renders an evenly spaced subset of the strands
+# so it frees vertex and segment slots rather than culling them.
+# A scene without instances draws the strands once, untransformed.
+
+import math
+import numpy as np
+
+from dataclasses import dataclass
+from src import Budgets
+from src import Schema
+from src import StrandDeviceMemory
+
+
+@dataclass
+class StrandInstance:
+    transform: np.ndarray  # (4, 4) object to world, column vectors (see Transform.py).
+    lod: float = 1.0  # Fraction of the strands rendered, 0 skips the instance.
+
+
+def get_grid_transforms(instance_count, spacing):
+    # Translations of instance_count copies on a square grid in the xz plane, centered on the origin.
+    side = math.ceil(math.sqrt(instance_count))
+    transforms = []
+
+    for i in range(instance_count):
+        transform = np.identity(4, dtype='f')
+        transform[0, 3] = ((i % side) - 0.5 * (side - 1)) * spacing
+        transform[2, 3] = ((i // side) - 0.5 * (side - 1)) * spacing
+        transforms.append(transform)
+
+    return transforms
+
+
+class StrandScene:
+
+    def __init__(self, device_memory: StrandDeviceMemory.StrandDeviceMemory):
+        self.device_memory = device_memory
+        self.instances = []
+
+    def clear(self):
+        self.instances = []
+
+    def add_instance(self, transform, lod=1.0):
+        self.instances.append(StrandInstance(np.asarray(transform, dtype='f'), lod))
+        return len(self.instances) - 1
+
+    def update_distance_lod(self, camera_position, full_detail_distance, min_lod=0.1):
+        # The screen size of an instance falls off with its distance, so does the fraction of its strands rendered.
+        for instance in self.instances:
+            distance = np.linalg.norm(instance.transform[0:3, 3] - np.asarray(camera_position))
+            instance.lod = float(np.clip(full_detail_distance / max(distance, 1e-6), min_lod, 1.0))
+
+    def get_instance_strand_counts(self):
+        # Rendered strands and the step between the rendered strands of every instance.
+        strand_count = self.device_memory.strand_count
+        counts = [min(strand_count, round(instance.lod * strand_count)) for instance in self.instances]
+        return [(n, strand_count // n if n > 0 else 0) for n in counts]
+
+    def get_instance_data(self):
+        # Schema.STRAND_INSTANCE records of the instances with rendered strands, in rendered strand order.
+        counts = self.get_instance_strand_counts()
+        drawn = [(instance, n, stride) for instance, (n, stride) in zip(self.instances, counts) if n > 0]
+
+        records = Schema.STRAND_INSTANCE.zeros(len(drawn))
+        strand_offset = 0
+
+        for record, (instance, n, stride) in zip(records, drawn):
+            record["objectToWorld0"] = instance.transform[0]
+            record["objectToWorld1"] = instance.transform[1]
+            record["objectToWorld2"] = instance.transform[2]
+            record["strandOffset"] = strand_offset
+            record["strandCount"] = n
+            record["strandStride"] = stride
+            strand_offset += n
+
+        return records
+
+    def get_strand_count(self):
+        if not self.instances:
+            return self.device_memory.strand_count
+
+        return sum(n for n, _ in self.get_instance_strand_counts())
+
+    def get_segment_count(self):
+        return self.get_strand_count() * (self.device_memory.strand_particle_count - 1)
+
+    def check_capacity(self):
+        vertex_count = self.get_strand_count() * self.device_memory.strand_particle_count
+        vertex_capacity = Budgets.BYTE_SIZE_VERTEX_OUTPUT_POOL // Budgets.BYTE_SIZE_VERTEX_OUTPUT_FORMAT
+
+        if vertex_count > vertex_capacity:
+            raise ValueError("{} instances render {} vertices, more than the vertex output pool ({} vertices).".format(
+                len(self.instances), vertex_count, vertex_capacity))
+
+        if self.get_segment_count() > Budgets.MAX_SEGMENTS:
+            raise ValueError("{} instances render {} segments, more than the segment cap ({} segments).".format(
+                len(self.instances), self.get_segment_count(), Budgets.MAX_SEGMENTS))
+
+    def get_max_instance_count(self):
+        # Most full detail copies of the strands the pipeline budgets fit, lower LODs fit more.
+        strand_count = self.device_memory.strand_count
+        strand_particle_count = self.device_memory.strand_particle_count
+
+        if strand_count == 0 or strand_particle_count < 2:
+            return Budgets.MAX_STRAND_INSTANCES
+
+        vertex_capacity = Budgets.BYTE_SIZE_VERTEX_OUTPUT_POOL // Budgets.BYTE_SIZE_VERTEX_OUTPUT_FORMAT
+
+        return max(1, min(vertex_capacity // (strand_count * strand_particle_count),
+                          Budgets.MAX_SEGMENTS // (strand_count * (strand_particle_count - 1)),
+                          Budgets.MAX_STRAND_INSTANCES))
+
+    def bind(self):
+        # Uploads the instances, call after any change to them (or to the strand layout).
+        self.check_capacity()
+        self.device_memory.bind_strand_instance_data(self.get_instance_data())
+
+    def get_instanced_vertices(self, vertices):
+        # NumPy mirror of the instanced vertex setup: the rendered world space positions, in vertex ID order, from the
+        # (strand_count * strand_particle_count, 3) object space positions (see CurveReference.get_strand_vertices).
+        if not self.instances:
+            return vertices
+
+        strand_particle_count = self.device_memory.strand_particle_count
+        strands = vertices.reshape(-1, strand_particle_count, 3)
+        rendered = [np.zeros((0, 3), dtype='f')]
+
+        for record in self.get_instance_data():
+            source = strands[np.arange(record["strandCount"]) * record["strandStride"]].reshape(-1, 3)
+            matrix = np.stack([record["objectToWorld0"], record["objectToWorld1"], record["objectToWorld2"]])
+            rendered.append(source @ matrix[:, 0:3].T + matrix[:, 3])
+
+        return np.concatenate(rendered).astype('f')
@@ -0,0 +1,107 @@
+# Transient resource aliasing.
+# A transient buffer only holds data while the frame graph that declares it executes, so buffers with disjoint lifetimes
+# (in the pass order of one graph) can share one backing allocation. Graphs execute one after another on the queue, so
+# every graph in the process (several viewports or rasterizers) shares the same pool of backing buffers.
+# Transient buffers are raw (byte address) buffers, so any two of them can alias regardless of their element format.
+
+import math
+import coalpy.gpu as gpu
+
+
+class TransientBuffer:
+
+    def __init__(self, name, byte_size):
+        self.name = name
+        self.byte_size = byte_size
+
+        # Backing buffer, bound by the pool when the frame graph compiles.
+        self.buffer = None
+        self.slot = -1
+
+
+class TransientPool:
+
+    def __init__(self):
+        # Backing raw buffers and their byte sizes.
+        self.buffers = []
+        self.sizes = []
+
+        # Incremented whenever a backing buffer is (re)allocated, so graphs holding old buffers recompile.
+        self.generation = 0
+
+        # Transient buffers bound per graph, for the footprint report.
+        self.bindings = {}
+
+    def grow(self, slot, byte_size):
+        if slot == len(self.sizes):
+            self.buffers.append(None)
+            self.sizes.append(0)
+
+        self.sizes[slot] = byte_size
+        self.buffers[slot] = gpu.Buffer(
+            name="TransientBuffer{}".format(slot),
+            type=gpu.BufferType.Raw,
+            element_count=math.ceil(byte_size / 4)
+        )
+        self.generation += 1
+
+    def assign(self, lifetimes):
+        # Greedy interval allocation, returns True if a backing buffer had to grow.
+        busy_until = [-1] * len(self.sizes)
+        grew = False
+
+        for transient, first, last in sorted(lifetimes, key=lambda l: (l[1], -l[0].byte_size)):
+            free = [s for s in range(len(self.sizes)) if busy_until[s] < first]
+
+            fits = [s for s in free if self.sizes[s] >= transient.byte_size]
+
+            if fits:
+                # Best fit among the free backing buffers.
+                slot = min(fits, key=lambda s: self.sizes[s])
+            elif free:
+                # Grow the largest free backing buffer.
+                slot = max(free, key=lambda s: self.sizes[s])
+                self.grow(slot, transient.byte_size)
+                grew = True
+            else:
+                slot = len(self.sizes)
+                self.grow(slot, transient.byte_size)
+                busy_until.append(-1)
+                grew = True
+
+            busy_until[slot] = last
+            transient.buffer = self.buffers[slot]
+            transient.slot = slot
+
+        return grew
+
+    def allocate(self, owner, lifetimes):
+        # lifetimes is a list of (transient, first pass index, last pass index) for one graph.
+        # Re-assign after growing so no transient keeps a buffer that was replaced.
+        while self.assign(lifetimes):
+            pass
+
+        self.bindings[owner] = [l[0] for l in lifetimes]
+
+    def summed_footprint(self):
+        # Bytes needed without aliasing.
+        return sum(t.byte_size for transients in self.bindings.values() for t in transients)
+
+    def peak_footprint(self):
+        # Bytes actually allocated.
+        return sum(self.sizes)
+
+    def report(self):
+        lines = []
+        for owner, transients in self.bindings.items():
+            for t in transients:
+                lines.append("  {:<20} {:<20} {:>8.1f} MB -> TransientBuffer{}".format(
+                    owner.name, t.name, t.byte_size / (1 << 20), t.slot))
+
+        lines.append("  Summed footprint {:>8.1f} MB".format(self.summed_footprint() / (1 << 20)))
+        lines.append("  Peak footprint   {:>8.1f} MB".format(self.peak_footprint() / (1 << 20)))
+        return "\n".join(lines)
+
+
+# Process wide pool shared by every rasterizer.
+default_pool = TransientPool()
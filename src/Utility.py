@@ -1,9 +1,9 @@
-import coalpy.gpu as gpu
 import random
 import math
 
 from enum import Enum
 from dataclasses import dataclass
+from src import ShaderCache
 
 
 class ClearMode(Enum):
@@ -11,9 +11,10 @@ class ClearMode(Enum):
     UINT   = 1
 
 
-s_clear_target      = gpu.Shader(file="utility/ClearTarget.hlsl",     name="ClearTarget",     main_function="ClearTarget")
-s_clear_buffer_raw  = gpu.Shader(file="utility/ClearBufferRaw.hlsl",  name="ClearBufferRaw",  main_function="ClearBuffer")
-s_clear_buffer_uint = gpu.Shader(file="utility/ClearBufferUInt.hlsl", name="ClearBufferUInt", main_function="ClearBuffer")
+s_clear_target      = ShaderCache.LazyShader(file="utility/ClearTarget.hlsl",     name="ClearTarget",     main_function="ClearTarget")
+s_upscale           = ShaderCache.LazyShader(file="utility/Upscale.hlsl",         name="Upscale",         main_function="Upscale")
+s_clear_buffer_raw  = ShaderCache.LazyShader(file="utility/ClearBufferRaw.hlsl",  name="ClearBufferRaw",  main_function="ClearBuffer")
+s_clear_buffer_uint = ShaderCache.LazyShader(file="utility/ClearBufferUInt.hlsl", name="ClearBufferUInt", main_function="ClearBuffer")
 
 s_clear_buffer_shaders = {ClearMode.RAW:  s_clear_buffer_raw,
                           ClearMode.UINT: s_clear_buffer_uint}
@@ -125,7 +126,7 @@ def alignup(a, b):
 
 def clear_target(cmd, color, target, w, h):
     cmd.dispatch(
-        shader=s_clear_target,
+        shader=s_clear_target.get(),
         constants=color,
         x=math.ceil(w / 8),
         y=math.ceil(h / 8),
@@ -134,9 +135,22 @@ def clear_target(cmd, color, target, w, h):
     )
 
 
+def upscale(cmd, source, source_w, source_h, target, w, h):
+    # Bilinear upscale of the top left source_w x source_h region of source into target.
+    cmd.dispatch(
+        shader=s_upscale.get(),
+        constants=[float(source_w), float(source_h), float(w), float(h)],
+        inputs=source,
+        outputs=target,
+        x=math.ceil(w / 8),
+        y=math.ceil(h / 8),
+        z=1
+    )
+
+
 def clear_buffer(cmd, value, count, target, mode):
     cmd.dispatch(
-        shader=s_clear_buffer_shaders[mode],
+        shader=s_clear_buffer_shaders[mode].get(),
 
         constants=[
             int(value),
@@ -1,18 +1,30 @@
 import os
 import sys
-import coalpy.gpu as gpu
 
-print ("Devices:")
-[print("{}: {}".format(idx, nm)) for (idx, nm) in gpu.get_adapters()]
+# GPU-less render nodes run without coalpy: the NumPy renderers (RasterizerCPU.py), the worker processes of
+# RasterizerCPUTiled.py and the strand factory import cleanly, only the GPU modules need it.
+try:
+    import coalpy.gpu as gpu
+except ImportError:
+    gpu = None
 
-settings_obj = gpu.get_settings()
-settings_obj.adapter_index = 0
-settings_obj.dump_shader_pdbs = True
+# Production start mode (RASTERIZER_MODE=production) is meant for batch jobs: it skips the adapter listing and
+# shader PDB dumping. Shaders are constructed on first use in either mode, see ShaderCache.py.
+production = os.environ.get("RASTERIZER_MODE", "").lower() == "production"
 
 # try:
 root = os.path.dirname(os.path.abspath(__file__))
 # except NameError:
 #     root = "{}/../src/".format(os.path.dirname(os.path.abspath(sys.argv[0])))
 
-gpu.add_data_path("{}/shaders/".format(root))
-gpu.add_data_path("{}/data/".format(root))
+if gpu is not None:
+    if not production:
+        print ("Devices:")
+        [print("{}: {}".format(idx, nm)) for (idx, nm) in gpu.get_adapters()]
+
+    settings_obj = gpu.get_settings()
+    settings_obj.adapter_index = 0
+    settings_obj.dump_shader_pdbs = not production
+
+    gpu.add_data_path("{}/shaders/".format(root))
+    gpu.add_data_path("{}/data/".format(root))
@@ -1,9 +1,13 @@
 import coalpy.gpu as gpu
-import time
+import sys
 
 from src import Utility
 from src import Editor
 from src import Debug
+from src import FrameCache
+from src import ProgressiveRefinement
+from src import DynamicResolution
+from src import GpuTimer
 from src import StrandFactory
 from src import StrandDeviceMemory
 from src import Rasterizer
@@ -13,15 +17,24 @@ from src import RasterizerBinned
 initial_width  = 1280
 initial_height = 720
 
+# Storage format of the strand positions, also an editor setting (see Editor.rebuild_position_format).
+position_formats = [f.name for f in StrandDeviceMemory.PositionFormat]
+
+if len(sys.argv) > 1 and sys.argv[1].upper() not in position_formats:
+    print("usage: python -m src [{}]".format(" | ".join(position_formats)))
+    sys.exit(1)
+
+position_format = StrandDeviceMemory.PositionFormat[sys.argv[1].upper() if len(sys.argv) > 1 else "FLOAT32"]
+
 # Allocate a chunk of device memory resources
-device_memory = StrandDeviceMemory.StrandDeviceMemory()
+device_memory = StrandDeviceMemory.StrandDeviceMemory(position_format)
 
 # Create a default strand
 strands = StrandFactory.build_from_asset("long_hair")
 
 # Layout the initial memory and bind the position data
 device_memory.layout(strands.strand_count, strands.strand_particle_count)
-device_memory.bind_strand_position_data(strands.particle_positions)
+device_memory.bind_strand_position_data(strands.particle_positions, key="long_hair")
 
 # Create the rasterizer, allocating internal resources.
 # rasterizer = RasterizerBrute.RasterizerBrute(initial_width, initial_height)
@@ -32,27 +45,45 @@ debug = Debug.Debug()
 
 editor = Editor.Editor(device_memory, strands)
 
+# Last rendered frame, re-presented while its inputs don't change.
+frame_cache = FrameCache.FrameCache()
+
+# Reduced quality while the camera moves, refined to full quality once it stops.
+progressive_refinement = ProgressiveRefinement.ProgressiveRefinement()
+
+# Internal resolution steered to hold the rasterizer time budget.
+dynamic_resolution = DynamicResolution.DynamicResolution()
+
+# GPU time of the rasterizer passes, the frame time would also count the UI, the present and vsync.
+raster_timer = GpuTimer.GpuTimer("Rasterizer")
+
 
 def on_render(render_args: gpu.RenderArgs):
+    # The rasterizer time of an earlier frame, tagged with the scale it rendered at.
+    raster_time = raster_timer.poll()
+
+    if editor.dynamic_resolution:
+        dynamic_resolution.budget_ms = editor.dynamic_resolution_budget
+
+        if raster_time is not None:
+            dynamic_resolution.update(*raster_time)
+    else:
+        dynamic_resolution.reset()
+
     output_target = render_args.window.display_texture
 
     w = render_args.width
     h = render_args.height
 
     # Process user input and interface
+    editor.update_assets()
     editor.update_camera(w, h, render_args.delta_time, render_args.window)
     editor.update_mouse_pos(render_args.window)
 
     cmd = gpu.CommandList()
 
-    # Clear the color target.
-    cmd.begin_marker("ClearColorTarget")
-    Utility.clear_target(
-        cmd,
-        [0.0, 0.0, 0.0, 0.0],
-        output_target, w, h
-    )
-    cmd.end_marker()
+    # The frame is rendered into the cache target, and presented from it.
+    frame_target = frame_cache.get_target(w, h)
 
     # Create the new frame context.
     context = Rasterizer.Context(
@@ -60,19 +91,56 @@ def on_render(render_args: gpu.RenderArgs):
         editor.camera.view_matrix,
         editor.camera.proj_matrix,
         device_memory,
-        editor.strands.strand_count,
-        editor.strands.strand_count * (editor.strands.strand_particle_count - 1),
-        editor.strands.strand_particle_count,
+        editor.scene.get_strand_count(),
+        editor.scene.get_segment_count(),
+        device_memory.strand_particle_count,
         editor.tesselation,
         editor.tesselation_sample_count,
+        editor.tesselation_error_bound if editor.tesselation_adaptive else 0.0,
         editor.oit,
         editor.oit_opacity,
         editor.oit_heatmap_overlay,
-        output_target
+        editor.oit_slice_count,
+        editor.oit_mode,
+        editor.oit_kbuffer_size,
+        frame_target
+    )
+
+    # Render at the internal resolution (and refinement level) into the top left of the target, it's upscaled when
+    # presented.
+    if editor.dynamic_resolution:
+        context = dynamic_resolution.apply(context)
+
+    progressive_refinement.update(editor.camera_moving)
+
+    if editor.progressive_refinement:
+        context = progressive_refinement.apply(context)
+
+    editor.internal_resolution = (context.w, context.h)
+
+    # Nothing that draws into the image changed, re-present the last frame.
+    frame_key = FrameCache.get_frame_key(context, extra=(type(rasterizer), editor.debug_bin_overlay))
+
+    if editor.idle_frame_reuse and frame_cache.is_valid(frame_key):
+        frame_cache.present(cmd, output_target, w, h)
+        editor.render(frame_cache.results, render_args.imgui)
+        gpu.schedule(cmd)
+        return
+
+    # Clear the color target.
+    cmd.begin_marker("ClearColorTarget")
+    Utility.clear_target(
+        cmd,
+        [0.0, 0.0, 0.0, 0.0],
+        frame_target, context.w, context.h
     )
+    cmd.end_marker()
 
-    # Invoke the hair strand rasterizer.
-    rasterizer.go(context)
+    # Invoke the hair strand rasterizer (replaying its recorded frame graph).
+    # The segment output is exported since the debug stats read it back.
+    cmd.begin_marker("Rasterizer")
+    rasterizer.record(context, exports=[rasterizer.b_segment_output])
+    cmd.end_marker()
 
     # Crunch some numbers about the rasterizer for this frame.
     stats = debug.compute_stats(
@@ -90,11 +158,23 @@ def on_render(render_args: gpu.RenderArgs):
             editor.debug_bin_overlay
         )
 
+    frame_cache.store(frame_key, stats, context.w, context.h)
+    frame_cache.present(cmd, output_target, w, h)
+
     editor.render(stats, render_args.imgui)
 
+    # Only full quality frames are timed, refinement levels are cheaper by design.
+    timed = editor.dynamic_resolution and (not editor.progressive_refinement or progressive_refinement.is_final)
+
     # Schedule the work.
+    if timed:
+        raster_timer.begin()
+
     gpu.schedule(cmd)
 
+    if timed:
+        raster_timer.end(dynamic_resolution.scale)
+
 
 # Invoke the window creation and register our render loop.
 window = gpu.Window("StrandRasterizer", initial_width, initial_height, on_render)
@@ -6,16 +6,24 @@ cbuffer Constants : register(b0)
 {
     float4 _Params0;
     float4 _Params1;
+    float4 _Params2;
 };
 
 ByteAddressBuffer               _SegmentOutputBuffer : register(t0);
 StructuredBuffer<SegmentData>   _SegmentDataBuffer   : register(t1);
 StructuredBuffer<VertexOutput>  _VertexOutputBuffer  : register(t2);
-StructuredBuffer<SegmentRecord> _SegmentRecordBuffer : register(t3);
+ByteAddressBuffer               _SegmentRecordBuffer : register(t3);
+
+#if COMPACTED_SEGMENTS
+// Dense list of the first segment of every surviving segment (or curve), and the inclusive offsets that built it
+// (see SegmentCompaction.hlsl). The last offset is the list length.
+ByteAddressBuffer               _CompactedSegments   : register(t4);
+Buffer<uint>                    _CompactionOffsets   : register(t5);
+#endif
 
 // Outputs
 // ----------------------------------------
-RWStructuredBuffer<BinRecord> _BinRecords        : register(u0);
+RWByteAddressBuffer           _BinRecords        : register(u0);
 RWBuffer<uint>                _BinRecordsCounter : register(u1);
 RWBuffer<uint>                _BinCounters       : register(u2);
 RWBuffer<uint>                _BinMinZ           : register(u3);
@@ -29,10 +37,13 @@ RWBuffer<uint>                _BinMaxZ           : register(u4);
 #define _TileSizeSS   2.0 * float2(_TileSize.xx / _ScreenParams)
 #define _TileDim      _Params1.xy
 #define _CurveSamples _Params1.z
+#define _CurveErrorBound _Params1.w
+#define _SegmentStride _Params2.x
+#define _CompactionElementCount _Params2.y
 
 // Utility
 // ----------------------------------------
-bool ExitThread(uint i)
+bool ExitThread(uint i, uint segmentOffset)
 {
     if (i > _SegmentCount)
         return true;
@@ -40,10 +51,10 @@ bool ExitThread(uint i)
 #if RASTER_CURVE
     // Find the start segment index
     i = 3 * floor(i / 3);
-    return !any(_SegmentOutputBuffer.Load3(4 * i));
+    return !any(_SegmentOutputBuffer.Load3(4 * (segmentOffset + i)));
 #else
     // Did the segment pass the clipper?
-    return _SegmentOutputBuffer.Load(4 * i) == 0;
+    return _SegmentOutputBuffer.Load(4 * (segmentOffset + i)) == 0;
 #endif
 }
 
@@ -85,8 +96,10 @@ bool CurveIntersectsBin(uint x, uint y, float2 controlPoints[4])
     // Get the tile's center.
     float2 center = aabbTile.Center();
 
+    const uint sampleCount = GetCurveSampleCount(controlPoints, _ScreenParams, _CurveSamples, _CurveErrorBound);
+
     float unused;
-    float d = DistanceToCubicBezierAndTValue(center.xy, controlPoints, unused, _CurveSamples);
+    float d = DistanceToCubicBezierAndTValue(center.xy, controlPoints, unused, sampleCount);
 
     // Compute the segment coverage provided by the segment distance.
     // TODO: Looks like screen params not updated when going from big -> small window size.
@@ -112,8 +125,8 @@ void RecordBin(uint binIndex, uint segmentIndex, float t)
         const VertexOutput v0 = _VertexOutputBuffer[segment.vi0];
         const VertexOutput v1 = _VertexOutputBuffer[segment.vi1];
 
-        const float z0 = v0.positionCS.z * rcp(v0.positionCS.w);
-        const float z1 = v1.positionCS.z * rcp(v1.positionCS.w);
+        const float z0 = GetVertexDepth(v0);
+        const float z1 = GetVertexDepth(v1);
 
         const float2 coords = float2(
             t,
@@ -136,7 +149,7 @@ void RecordBin(uint binIndex, uint segmentIndex, float t)
         record.binIndex     = binIndex;
         record.binOffset    = binOffset;
     }
-    _BinRecords[recordIndex] = record;
+    StoreBinRecord(_BinRecords, recordIndex, record);
 }
 
 void GetCurveBoundingBox(float2 controlPoints[4], out uint2 tilesB, out uint2 tilesE)
@@ -238,15 +251,42 @@ void GetSegmentBoundingBox(SegmentRecord segment, out uint2 tilesB, out uint2 ti
 void RasterBin(uint3 dispatchThreadID : SV_DispatchThreadID, uint groupIndex : SV_GroupIndex)
 {
     // See note: [NOTE-BINNING-PERSISTENT-THREADS]
+#if COMPACTED_SEGMENTS
+    // Indirect launch over the compacted segments, so there is no culled segment to exit on.
+    if (dispatchThreadID.x >= _CompactionOffsets[(uint)_CompactionElementCount - 1])
+        return;
+
+    const uint s = _CompactedSegments.Load(4 * dispatchThreadID.x);
+
+#if MULTI_VIEW
+    // The views are compacted together, the view follows from the segment stride.
+    const uint binIndexOffset = (s / (uint)_SegmentStride) * (uint)(_TileDim.x * _TileDim.y);
+#else
+    const uint binIndexOffset = 0;
+#endif
+#else
 #if RASTER_CURVE
-    const uint s = dispatchThreadID.x * 3;
+    const uint localIndex = dispatchThreadID.x * 3;
 #else
-    const uint s = dispatchThreadID.x;
+    const uint localIndex = dispatchThreadID.x;
 #endif
 
-    if (ExitThread(s))
+#if MULTI_VIEW
+    // One dispatch row per view, with per-view segment and bin ranges.
+    const uint view = dispatchThreadID.y;
+    const uint segmentOffset = view * (uint)_SegmentStride;
+    const uint binIndexOffset = view * (uint)(_TileDim.x * _TileDim.y);
+#else
+    const uint segmentOffset = 0;
+    const uint binIndexOffset = 0;
+#endif
+
+    if (ExitThread(localIndex, segmentOffset))
         return;
 
+    const uint s = segmentOffset + localIndex;
+#endif
+
 #if RASTER_CURVE
     float2 controlPoints[4];
     LoadControlPoints(s, _SegmentDataBuffer, _VertexOutputBuffer, controlPoints);
@@ -255,7 +295,7 @@ void RasterBin(uint3 dispatchThreadID : SV_DispatchThreadID, uint groupIndex : S
     GetCurveBoundingBox(controlPoints, tilesB, tilesE);
 #else
     // Pick a segment from the ring buffer.
-    const SegmentRecord segment = _SegmentRecordBuffer[s];
+    const SegmentRecord segment = LoadSegmentRecord(_SegmentRecordBuffer, s);
 
     uint2 tilesB, tilesE;
     GetSegmentBoundingBox(segment, tilesB, tilesE);
@@ -279,7 +319,7 @@ void RasterBin(uint3 dispatchThreadID : SV_DispatchThreadID, uint groupIndex : S
            continue;
 
         // Compute the flatted bin index.
-        const uint binIndex = y * _TileDim.x + x;
+        const uint binIndex = binIndexOffset + y * _TileDim.x + x;
 
         RecordBin(binIndex, s, t);
     }
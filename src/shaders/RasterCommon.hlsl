@@ -26,43 +26,16 @@
 
 // Structures
 // -----------------------------------------------------
-struct FragmentData
-{
-    float4 color;
-    float  depth;
-    uint   next;
-};
-
-struct StrandData
-{
-    float3 strandPositionOS;
-};
-
-struct VertexInput
-{
-    float vertexID;
-    float vertexUV;
-};
-
-struct VertexOutput
-{
-    float4 positionCS;
-    float  texCoord;
-};
+// Storage formats and their byte sizes, generated from Schema.py.
+#include "Schema.hlsl"
 
+// Unpacked records, see the load and store functions below.
 struct SegmentRecord
 {
     float2 v0;
     float2 v1;
 };
 
-struct SegmentData
-{
-    // Vertex Indices
-    uint vi0;
-    uint vi1;
-};
-
 struct BinRecord
 {
     uint segmentIndex;
@@ -81,6 +54,118 @@ struct AABB
     }
 };
 
+// Vertex output: the NDC depth in front of the near plane is in [1, 2] (see Transform.projection_matrix), it is stored
+// as a 24 bit unorm of depth - 1, at least the precision of the float depth in that range. The top 8 bits are flags.
+// -----------------------------------------------------
+#define VERTEX_DEPTH_MAX   ((1u << VERTEX_DEPTH_BITS) - 1)
+#define VERTEX_FLAG_CULLED (1u << VERTEX_DEPTH_BITS) // Behind the near plane, the position is undefined.
+
+VertexOutput PackVertexOutput(float4 positionCS)
+{
+    VertexOutput output;
+
+    if (0 < positionCS.w)
+    {
+        output.positionNDC = 0;
+        output.depthFlags  = VERTEX_FLAG_CULLED;
+        return output;
+    }
+
+    const float3 positionNDC = positionCS.xyz * rcp(positionCS.w);
+
+    output.positionNDC = positionNDC.xy;
+    output.depthFlags  = (uint)round(saturate(positionNDC.z - 1.0) * VERTEX_DEPTH_MAX);
+    return output;
+}
+
+float GetVertexDepth(VertexOutput v)
+{
+    return 1.0 + (v.depthFlags & VERTEX_DEPTH_MAX) / (float)VERTEX_DEPTH_MAX;
+}
+
+bool IsVertexCulled(VertexOutput v)
+{
+    return (v.depthFlags & VERTEX_FLAG_CULLED) != 0;
+}
+
+// The vertex UV is procedural: 16 bit unorm U (constant) and V (along the strand) packed and normalized to a float.
+// The vertices are laid out strand by strand.
+float ComputeVertexUV(uint vertexIndex, uint strandParticleCount)
+{
+    const uint unormU0 = 32767;
+    const uint unormVk = 65535 / (strandParticleCount - 1);
+
+    return (((unormVk * (vertexIndex % strandParticleCount)) << 16) | unormU0) / 4294967295.0;
+}
+
+// Transient buffers are raw so they can alias each other (see TransientPool.py), these load and store their records.
+// -----------------------------------------------------
+// The record byte sizes and field bits are in Schema.hlsl. The low bits of the bin offset share the first word with the
+// segment index, the high bits the second word with the bin index.
+#define BIN_RECORD_OFFSET_LOW_BITS  (32 - BIN_RECORD_SEGMENT_BITS)
+#define BIN_RECORD_OFFSET_HIGH_BITS (BIN_RECORD_OFFSET_BITS - BIN_RECORD_OFFSET_LOW_BITS)
+
+// The clipped end points are inside the window, stored as 16 bit unorms of [-1, 1].
+void StoreSegmentRecord(RWByteAddressBuffer buffer, uint i, SegmentRecord record)
+{
+    const uint4 q = (uint4)round(saturate(float4(record.v0, record.v1) * 0.5 + 0.5) * 65535.0);
+    buffer.Store2(BYTE_SIZE_SEGMENT_RECORD * i, uint2(q.x | (q.y << 16), q.z | (q.w << 16)));
+}
+
+SegmentRecord LoadSegmentRecord(ByteAddressBuffer buffer, uint i)
+{
+    const uint2 q = buffer.Load2(BYTE_SIZE_SEGMENT_RECORD * i);
+    const float4 v = float4(q.x & 0xffff, q.x >> 16, q.y & 0xffff, q.y >> 16) * (2.0 / 65535.0) - 1.0;
+
+    SegmentRecord record;
+    {
+        record.v0 = v.xy;
+        record.v1 = v.zw;
+    }
+    return record;
+}
+
+void StoreBinRecord(RWByteAddressBuffer buffer, uint i, BinRecord record)
+{
+    buffer.Store2(BYTE_SIZE_BIN_RECORD * i, uint2(
+        record.segmentIndex | (record.binOffset << BIN_RECORD_SEGMENT_BITS),
+        (record.binOffset >> BIN_RECORD_OFFSET_LOW_BITS) | (record.binIndex << BIN_RECORD_OFFSET_HIGH_BITS)
+    ));
+}
+
+BinRecord LoadBinRecord(ByteAddressBuffer buffer, uint i)
+{
+    const uint2 v = buffer.Load2(BYTE_SIZE_BIN_RECORD * i);
+
+    BinRecord record;
+    {
+        record.segmentIndex = v.x & ((1u << BIN_RECORD_SEGMENT_BITS) - 1);
+        record.binOffset    = (v.x >> BIN_RECORD_SEGMENT_BITS) |
+                              ((v.y & ((1u << BIN_RECORD_OFFSET_HIGH_BITS) - 1)) << BIN_RECORD_OFFSET_LOW_BITS);
+        record.binIndex     = v.y >> BIN_RECORD_OFFSET_HIGH_BITS;
+    }
+    return record;
+}
+
+void StoreFragmentData(RWByteAddressBuffer buffer, uint i, FragmentData data)
+{
+    buffer.Store4(BYTE_SIZE_FRAGMENT_DATA * i + 0,  asuint(data.color));
+    buffer.Store2(BYTE_SIZE_FRAGMENT_DATA * i + 16, uint2(asuint(data.depth), data.next));
+}
+
+FragmentData LoadFragmentData(ByteAddressBuffer buffer, uint i)
+{
+    const uint2 v = buffer.Load2(BYTE_SIZE_FRAGMENT_DATA * i + 16);
+
+    FragmentData data;
+    {
+        data.color = asfloat(buffer.Load4(BYTE_SIZE_FRAGMENT_DATA * i));
+        data.depth = asfloat(v.x);
+        data.next  = v.y;
+    }
+    return data;
+}
+
 // Helpers
 // -----------------------------------------------------
 bool WaveIsLastLane()
@@ -146,6 +231,42 @@ float DistanceToCubicBezierAndTValue(float2 P, float2 controlPoints[4], out floa
     return sqrt(res.x);
 }
 
+// Choose a per-curve sample count from the flatness and length of the projected control polygon.
+// Ref: Wang's formula. A polyline through N + 1 uniform samples of a cubic stays within the tolerance of the curve when
+//      N >= sqrt(3/4 * max(|P0 - 2P1 + P2|, |P1 - 2P2 + P3|) / tolerance).
+uint ComputeCurveSampleCount(float2 controlPoints[4], float2 screenParams, float errorBound, uint maxSampleCount)
+{
+    // Transform the control polygon: NDC -> Raster Space.
+    const float2 scale = 0.5 * screenParams;
+    const float2 A = controlPoints[0] * scale;
+    const float2 B = controlPoints[1] * scale;
+    const float2 C = controlPoints[2] * scale;
+    const float2 D = controlPoints[3] * scale;
+
+    // Flatness of the control polygon (second differences).
+    const float2 d0 = A - 2 * B + C;
+    const float2 d1 = B - 2 * C + D;
+    const float  m  = sqrt(max(dot(d0, d0), dot(d1, d1)));
+
+    // Polyline segment count required to hold the error bound.
+    float segments = ceil(sqrt(0.75 * m / max(errorBound, 1e-3)));
+
+    // There is no point in polyline segments shorter than a pixel.
+    const float polygonLength = length(B - A) + length(C - B) + length(D - C);
+    segments = min(segments, ceil(polygonLength));
+
+    return clamp((uint)segments + 1, 2, maxSampleCount);
+}
+
+// A zero error bound selects the fixed (global) sample count.
+uint GetCurveSampleCount(float2 controlPoints[4], float2 screenParams, float sampleCount, float errorBound)
+{
+    if (errorBound <= 0)
+        return sampleCount;
+
+    return ComputeCurveSampleCount(controlPoints, screenParams, errorBound, sampleCount);
+}
+
 void LoadControlPoints(uint segmentIndex,
                        StructuredBuffer<SegmentData> data,
                        StructuredBuffer<VertexOutput> vertices,
@@ -164,9 +285,8 @@ void LoadControlPoints(uint segmentIndex,
     const VertexOutput vC = vertices[segment1.vi0];
     const VertexOutput vD = vertices[segment1.vi1];
 
-    // Transform clip space -> NDC.
-    controlPoints[0] = vA.positionCS.xy * rcp(vA.positionCS.w);
-    controlPoints[1] = vB.positionCS.xy * rcp(vB.positionCS.w);
-    controlPoints[2] = vC.positionCS.xy * rcp(vC.positionCS.w);
-    controlPoints[3] = vD.positionCS.xy * rcp(vD.positionCS.w);
+    controlPoints[0] = vA.positionNDC;
+    controlPoints[1] = vB.positionNDC;
+    controlPoints[2] = vC.positionNDC;
+    controlPoints[3] = vD.positionNDC;
 }
\ No newline at end of file
@@ -6,10 +6,11 @@ cbuffer Constants : register(b0)
 {
     float4 _Params0;
     float4 _Params1;
+    float4 _Params2;
 };
 
 
-Buffer<uint> _WorkQueueBuffer  : register(t0);
+ByteAddressBuffer _WorkQueueBuffer : register(t0);
 Buffer<uint> _BinOffsetBuffer  : register(t1);
 Buffer<uint> _BinCounterBuffer : register(t2);
 
@@ -25,6 +26,9 @@ RWTexture2D<float4> _OutputTarget : register(u0);
 #define _TileSizeSS   2.0 * float2(_TileSize.xx / _ScreenParams)
 #define _TileDim      uint2(_Params0.w, _Params1.x)
 #define _CurveSamples _Params1.y
+#define _CurveErrorBound _Params2.x
+#define _AtlasColumns _Params2.y
+#define _StrandParticleCount (uint)_Params2.w
 
 // Local
 groupshared uint g_BinOffset;
@@ -34,6 +38,16 @@ groupshared uint g_BinCount;
 [numthreads(16, 16, 1)]
 void RasterFine(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID : SV_GroupID, uint groupIndex : SV_GroupIndex)
 {
+#if MULTI_VIEW
+    // One dispatch slice per view, every view is rendered to its own tile of the atlas.
+    const uint view = groupID.z;
+    const uint binIndexOffset = view * _TileDim.x * _TileDim.y;
+    const uint2 viewOrigin = uint2(view % (uint)_AtlasColumns, view / (uint)_AtlasColumns) * (uint2)_ScreenParams;
+#else
+    const uint binIndexOffset = 0;
+    const uint2 viewOrigin = 0;
+#endif
+
     // Convert the dispatch coordinates to NDC.
     const float2 UV = ((float2)dispatchThreadID.xy + 0.5) * rcp(_ScreenParams);
     const float2 UVh = -1 + 2 * UV;
@@ -43,7 +57,7 @@ void RasterFine(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID : SV
     // Load the tile data into LDS.
     if (groupIndex == 0)
     {
-        const uint binIndex = groupID.x + _TileDim.x * groupID.y;
+        const uint binIndex = binIndexOffset + groupID.x + _TileDim.x * groupID.y;
         g_BinOffset = _BinOffsetBuffer[binIndex];
         g_BinCount  = _BinCounterBuffer[binIndex];
     }
@@ -59,7 +73,7 @@ void RasterFine(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID : SV
     for (uint s = 0; s < segmentCount; ++s)
     {
         // Load the segment index.
-        uint segmentIndex = _WorkQueueBuffer[binOffset + s];
+        uint segmentIndex = _WorkQueueBuffer.Load(4 * (binOffset + s));
 
         // Load the segment indices.
         SegmentData data = _SegmentDataBuffer[segmentIndex];
@@ -69,8 +83,8 @@ void RasterFine(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID : SV
         const VertexOutput v1 = _VertexOutputBuffer[data.vi1];
 
         // We want the barycentric between the original segment vertices, not the clipped vertices.
-        float3 p0 = v0.positionCS.xyz * rcp(v0.positionCS.w);
-        float3 p1 = v1.positionCS.xyz * rcp(v1.positionCS.w);
+        float3 p0 = float3(v0.positionNDC, GetVertexDepth(v0));
+        float3 p1 = float3(v1.positionNDC, GetVertexDepth(v1));
 
         // Compute the segment coverage and 'barycentric' coord.
 #ifndef RASTER_CURVE
@@ -80,8 +94,10 @@ void RasterFine(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID : SV
         float2 controlPoints[4];
         LoadControlPoints(segmentIndex, _SegmentDataBuffer, _VertexOutputBuffer, controlPoints);
 
+        const uint sampleCount = GetCurveSampleCount(controlPoints, _ScreenParams, _CurveSamples, _CurveErrorBound);
+
         float t;
-        float distance = DistanceToCubicBezierAndTValue(UVh, controlPoints, t, _CurveSamples);
+        float distance = DistanceToCubicBezierAndTValue(UVh, controlPoints, t, sampleCount);
 #endif
 
         // Compute the segment coverage provided by the segment distance.
@@ -94,7 +110,8 @@ void RasterFine(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID : SV
 
         // Interpolate Vertex Data
         const float z  = INTERP(coords, p0.z, p1.z);
-        const float texCoord = INTERP(coords, v0.texCoord, v1.texCoord);
+        const float texCoord = INTERP(coords, ComputeVertexUV(data.vi0, _StrandParticleCount),
+                                              ComputeVertexUV(data.vi1, _StrandParticleCount));
 
         if (coverage && z > Z)
         {
@@ -104,5 +121,11 @@ void RasterFine(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID : SV
         }
     }
 
-    _OutputTarget[dispatchThreadID.xy] = float4(result, 1);
+#if MULTI_VIEW
+    // Don't spill into the neighbouring views of the atlas.
+    if (any(dispatchThreadID.xy >= (uint2)_ScreenParams))
+        return;
+#endif
+
+    _OutputTarget[viewOrigin + dispatchThreadID.xy] = float4(result, 1);
 }
\ No newline at end of file
@@ -6,10 +6,11 @@ cbuffer Constants : register(b0)
 {
     float4 _Params0;
     float4 _Params1;
+    float4 _Params2;
 };
 
 
-Buffer<uint> _WorkQueueBuffer  : register(t0);
+ByteAddressBuffer _WorkQueueBuffer : register(t0);
 Buffer<uint> _BinOffsetBuffer  : register(t1);
 Buffer<uint> _BinCounterBuffer : register(t2);
 
@@ -28,11 +29,38 @@ RWTexture2D<float4> _OutputTarget : register(u0);
 #define _TileSizeSS   2.0 * float2(_TileSize.xx / _ScreenParams)
 #define _TileDim      uint2(_Params0.w, _Params1.x)
 #define _CurveSamples _Params1.y
+#define _CurveErrorBound _Params2.x
+#define _AtlasColumns _Params2.y
+#define _SliceCount   (uint)_Params2.z
+#define _StrandParticleCount (uint)_Params2.w
 #define _Opacity        _Params1.z
 #define _HeatmapOverlay _Params1.w
 
-// Hardcoded for 32 slices due to the slice mask.
+// Capacity of the slice buffers, at most 128 slices due to the slice mask. _SliceCount of them are used, permutations
+// with fewer slices (and less per-thread state) are selected for the smaller counts.
+#ifndef NUM_SLICES
 #define NUM_SLICES 128
+#endif
+
+// The adaptive mode distributes the slices with a depth histogram of the bin instead of linearly over its depth range,
+// so that an outlier segment stretching the range doesn't collapse the rest of the bin into a few slices. On a bin
+// without such gaps the equalized slices resolve worse than the linear ones, so the distribution is blended with the
+// linear one by the empty buckets of the histogram: linear without any, fully equalized from HISTOGRAM_EMPTY_BUCKETS.
+#define HISTOGRAM_SIZE 64
+#define HISTOGRAM_EMPTY_BUCKETS 16
+
+// The k-buffer mode keeps the KBUFFER_SIZE nearest fragments sorted front to back instead of the slices, and blends
+// the fragments behind them into an order independent tail. Far less per-thread state than the slice buffers.
+#ifndef KBUFFER_SIZE
+#define KBUFFER_SIZE 8
+#endif
+
+// Fragments tracked per pixel, the range of the heatmap overlay.
+#if KBUFFER
+#define MAX_FRAGMENTS KBUFFER_SIZE
+#else
+#define MAX_FRAGMENTS NUM_SLICES
+#endif
 
 // Static Global
 // Warning, slice mask can only support up to 128 slices.
@@ -44,6 +72,12 @@ groupshared uint g_BinCount;
 groupshared uint g_BinMinZ;
 groupshared uint g_BinMaxZ;
 
+#if ADAPTIVE_SLICES
+// Depth histogram of the bin segments, and its normalized cumulative distribution (front to back).
+groupshared uint  g_DepthHistogram[HISTOGRAM_SIZE];
+groupshared float g_DepthCDF[HISTOGRAM_SIZE + 1];
+#endif
+
 // Utility
 
 uint GetLeastSignificantBit(uint mask)
@@ -61,8 +95,78 @@ uint GetLeastSignificantBit(uint mask)
 
 uint ComputeSliceIndex(float binStart, float binEnd, float z)
 {
+#if ADAPTIVE_SLICES
+    // Equalize the slice occupancy, the slice follows the (piecewise linear) depth distribution of the bin.
+    const float bucket = saturate((z - binStart) * rcp(binEnd - binStart)) * HISTOGRAM_SIZE;
+    const uint b = min((uint)bucket, HISTOGRAM_SIZE - 1);
+
+    const float cdf = lerp(g_DepthCDF[b], g_DepthCDF[b + 1], bucket - b);
+    return min((uint)(cdf * _SliceCount), _SliceCount - 1);
+#else
     const float fraction = (z - binStart) * rcp(binEnd - binStart);
-    return clamp(fraction * NUM_SLICES, 0, NUM_SLICES - 1);
+    return clamp(fraction * _SliceCount, 0, _SliceCount - 1);
+#endif
+}
+
+#if ADAPTIVE_SLICES
+void BuildDepthHistogram(uint groupIndex, uint2 groupID, uint binOffset, uint segmentCount, float binStart, float binEnd)
+{
+    if (groupIndex < HISTOGRAM_SIZE)
+        g_DepthHistogram[groupIndex] = 0;
+    GroupMemoryBarrierWithGroupSync();
+
+    // Bin the depth of every segment where it's closest to the bin center, like the bin depth range.
+    const float2 binCenter = -1 + ((float2)groupID + 0.5) * _TileSizeSS;
+
+    for (uint s = groupIndex; s < segmentCount; s += 16 * 16)
+    {
+        const SegmentData data = _SegmentDataBuffer[_WorkQueueBuffer.Load(4 * (binOffset + s))];
+
+        const VertexOutput v0 = _VertexOutputBuffer[data.vi0];
+        const VertexOutput v1 = _VertexOutputBuffer[data.vi1];
+
+        const float3 p0 = float3(v0.positionNDC, GetVertexDepth(v0));
+        const float3 p1 = float3(v1.positionNDC, GetVertexDepth(v1));
+
+        float t;
+        DistanceToSegmentAndTValue(binCenter, p0.xy, p1.xy, t);
+
+        const float z = INTERP(float2(t, 1 - t), p0.z, p1.z);
+        const float fraction = saturate((z - binStart) * rcp(binEnd - binStart));
+
+        InterlockedAdd(g_DepthHistogram[min((uint)(fraction * HISTOGRAM_SIZE), HISTOGRAM_SIZE - 1)], 1);
+    }
+    GroupMemoryBarrierWithGroupSync();
+
+    if (groupIndex == 0)
+    {
+        // Prefix sum of the histogram.
+        float sum = 0;
+        uint emptyCount = 0;
+        for (uint b = 0; b < HISTOGRAM_SIZE; ++b)
+        {
+            g_DepthCDF[b] = sum;
+            sum += g_DepthHistogram[b];
+            emptyCount += g_DepthHistogram[b] == 0 ? 1 : 0;
+        }
+
+        // Blended with the linear distribution, see HISTOGRAM_EMPTY_BUCKETS.
+        const float weight = saturate((float)emptyCount / HISTOGRAM_EMPTY_BUCKETS);
+
+        for (uint i = 0; i < HISTOGRAM_SIZE; ++i)
+            g_DepthCDF[i] = lerp((float)i / HISTOGRAM_SIZE, g_DepthCDF[i] * rcp(sum), weight);
+
+        g_DepthCDF[HISTOGRAM_SIZE] = 1;
+    }
+    GroupMemoryBarrierWithGroupSync();
+}
+#endif
+
+float ComputeBlendWeight(float binStart, float binEnd, float z)
+{
+    // McGuire and Bavoil 2013, with the depth normalized to the bin depth range (0 is the nearest).
+    const float d = saturate((z - binStart) * rcp(binEnd - binStart));
+    return clamp(3e3 * pow(1 - d, 3), 1e-2, 3e3);
 }
 
 bool IsSliceEmpty(uint sliceIndex)
@@ -89,6 +193,16 @@ void WriteSlice(uint sliceIndex)
 [numthreads(16, 16, 1)]
 void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID : SV_GroupID, uint groupIndex : SV_GroupIndex)
 {
+#if MULTI_VIEW
+    // One dispatch slice per view, every view is rendered to its own tile of the atlas.
+    const uint view = groupID.z;
+    const uint binIndexOffset = view * _TileDim.x * _TileDim.y;
+    const uint2 viewOrigin = uint2(view % (uint)_AtlasColumns, view / (uint)_AtlasColumns) * (uint2)_ScreenParams;
+#else
+    const uint binIndexOffset = 0;
+    const uint2 viewOrigin = 0;
+#endif
+
     // Convert the dispatch coordinates to NDC.
     const float2 UV = ((float2)dispatchThreadID.xy + 0.5) * rcp(_ScreenParams);
     const float2 UVh = -1 + 2 * UV;
@@ -98,7 +212,7 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
     // Load the tile data into LDS.
     if (groupIndex == 0)
     {
-        const uint binIndex = groupID.x + _TileDim.x * groupID.y;
+        const uint binIndex = binIndexOffset + groupID.x + _TileDim.x * groupID.y;
         g_BinOffset = _BinOffsetBuffer[binIndex];
         g_BinCount  = _BinCounterBuffer[binIndex];
         g_BinMinZ   = _BinMinZ[binIndex];
@@ -115,12 +229,30 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
     if (segmentCount == 0)
         return;
 
+#if ADAPTIVE_SLICES
+    BuildDepthHistogram(groupIndex, groupID.xy, binOffset, segmentCount, binMaxZ, binMinZ);
+#endif
+
+#if KBUFFER
+    // Nearest fragments and their depth, front to back.
+    float  kDepths    [KBUFFER_SIZE];
+    float4 kFragments [KBUFFER_SIZE];
+
+    // Premultiplied color and alpha sum, and transmittance of the tail fragments.
+    float4 tail = 0;
+    float  tailTransmittance = 1;
+#elif WEIGHTED_BLENDED
+    // Weighted premultiplied color and alpha sum, and the revealage (transmittance) of the pixel.
+    float4 accumulation = 0;
+    float  revealage = 1;
+#else
     // Slice and fragment buffers.
     uint   slices    [NUM_SLICES];
     float4 fragments [NUM_SLICES];
 
     // Maintain a bit mask to check for slice buffer occupants.
     s_SliceMask = 0;
+#endif
 
     // Track a fragment counter for new entries to the fragment buffer.
     uint fragmentCounter = 0;
@@ -128,7 +260,7 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
     for (uint s = 0; s < segmentCount; ++s)
     {
         // Load the segment index.
-        uint segmentIndex = _WorkQueueBuffer[binOffset + s];
+        uint segmentIndex = _WorkQueueBuffer.Load(4 * (binOffset + s));
 
         // Load the segment indices.
         SegmentData data = _SegmentDataBuffer[segmentIndex];
@@ -138,8 +270,8 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
         const VertexOutput v1 = _VertexOutputBuffer[data.vi1];
 
         // We want the barycentric between the original segment vertices, not the clipped vertices.
-        float3 p0 = v0.positionCS.xyz * rcp(v0.positionCS.w);
-        float3 p1 = v1.positionCS.xyz * rcp(v1.positionCS.w);
+        float3 p0 = float3(v0.positionNDC, GetVertexDepth(v0));
+        float3 p1 = float3(v1.positionNDC, GetVertexDepth(v1));
 
         // Compute the segment coverage and 'barycentric' coord.
 #ifndef RASTER_CURVE
@@ -149,8 +281,10 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
         float2 controlPoints[4];
         LoadControlPoints(segmentIndex, _SegmentDataBuffer, _VertexOutputBuffer, controlPoints);
 
+        const uint sampleCount = GetCurveSampleCount(controlPoints, _ScreenParams, _CurveSamples, _CurveErrorBound);
+
         float t;
-        float distance = DistanceToCubicBezierAndTValue(UVh, controlPoints, t, _CurveSamples);
+        float distance = DistanceToCubicBezierAndTValue(UVh, controlPoints, t, sampleCount);
 #endif
 
         // Compute the segment coverage provided by the segment distance.
@@ -169,12 +303,54 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
 
         // Interpolate vertex data.
         const float z = INTERP(coords, p0.z, p1.z);
-        const float texCoord = INTERP(coords, v0.texCoord, v1.texCoord);
+        const float texCoord = INTERP(coords, ComputeVertexUV(data.vi0, _StrandParticleCount),
+                                              ComputeVertexUV(data.vi1, _StrandParticleCount));
 
         // Invoke fragment shader / sample and blend offscreen shading.
         // float4 fragment = float4(ColorCycle(floor(segmentIndex / 10), 100) * coverage, coverage);
         float4 fragment = float4(lerp(float3(1, 0, 1), float3(0, 1, 1), texCoord) * coverage, coverage);
 
+#if KBUFFER
+        if (fragmentCounter < KBUFFER_SIZE || z > kDepths[KBUFFER_SIZE - 1])
+        {
+            if (fragmentCounter == KBUFFER_SIZE)
+            {
+                // Full, evict the farthest fragment into the tail.
+                tail += kFragments[KBUFFER_SIZE - 1];
+                tailTransmittance *= 1 - kFragments[KBUFFER_SIZE - 1].a;
+            }
+            else
+            {
+                fragmentCounter++;
+            }
+
+            // Insertion sort, the nearest fragment (largest z) first and ties in arrival order.
+            uint k = fragmentCounter - 1;
+
+            for (; k > 0; --k)
+            {
+                if (z <= kDepths[k - 1])
+                    break;
+
+                kDepths[k]    = kDepths[k - 1];
+                kFragments[k] = kFragments[k - 1];
+            }
+
+            kDepths[k]    = z;
+            kFragments[k] = fragment;
+        }
+        else
+        {
+            // Behind every kept fragment, blend into the tail.
+            tail += fragment;
+            tailTransmittance *= 1 - fragment.a;
+        }
+#elif WEIGHTED_BLENDED
+        accumulation += fragment * ComputeBlendWeight(binMaxZ, binMinZ, z);
+        revealage    *= 1 - fragment.a;
+
+        fragmentCounter++;
+#else
         // Compute the slice index for this depth value.
         const uint sliceIndex = ComputeSliceIndex(binMaxZ, binMinZ, z);
 
@@ -206,6 +382,7 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
 
         // Iterate the counter for future entries.
         fragmentCounter++;
+#endif
     }
 
     if (fragmentCounter == 0)
@@ -213,6 +390,27 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
 
     float4 pixelColorAndAlpha = float4(0, 0, 0, 1);
 
+#if KBUFFER
+    // Composite the kept fragments in order.
+    for (uint k = 0; k < fragmentCounter; ++k)
+    {
+        pixelColorAndAlpha.rgb += kFragments[k].rgb * pixelColorAndAlpha.a;
+        pixelColorAndAlpha.a   *= 1 - kFragments[k].a;
+    }
+
+    // Then the tail behind them, its average color with the opacity of all the tail fragments.
+    if (tail.a > 0)
+    {
+        pixelColorAndAlpha.rgb += (tail.rgb * rcp(tail.a)) * (1 - tailTransmittance) * pixelColorAndAlpha.a;
+        pixelColorAndAlpha.a   *= tailTransmittance;
+    }
+#elif WEIGHTED_BLENDED
+    // The weighted blended mode keeps no fragments at all, only a depth weighted color average and the revealage of
+    // the pixel. Approximate, the order of the fragments is only hinted by their weight.
+    // Resolve, the weighted average color with the opacity of all the fragments.
+    pixelColorAndAlpha.rgb = accumulation.rgb * rcp(max(accumulation.a, 1e-5)) * (1 - revealage);
+    pixelColorAndAlpha.a   = revealage;
+#else
     // Scan the slices in order to resolve the per-pixel transmittance function.
     for (uint i = 0; i < NUM_SLICES; ++i)
     {
@@ -230,10 +428,18 @@ void RasterFineOIT(uint3 dispatchThreadID : SV_DispatchThreadID, uint3 groupID :
         pixelColorAndAlpha.rgb += fragmentColorAndAlpha.rgb * pixelColorAndAlpha.a;
         pixelColorAndAlpha.a   *= 1 - fragmentColorAndAlpha.a;
     }
+#endif
 
     // Debug heatmap of fragment count per-pixel.
     const float a = _HeatmapOverlay;
     const float4 base = pixelColorAndAlpha;
-    const float4 heat = OverlayHeatMap(dispatchThreadID.xy, uint2(0, 0), fragmentCounter, NUM_SLICES, 1.0);
-    _OutputTarget[dispatchThreadID.xy] = lerp(base, heat, a);
+    const float4 heat = OverlayHeatMap(dispatchThreadID.xy, uint2(0, 0), fragmentCounter, MAX_FRAGMENTS, 1.0);
+
+#if MULTI_VIEW
+    // Don't spill into the neighbouring views of the atlas.
+    if (any(dispatchThreadID.xy >= (uint2)_ScreenParams))
+        return;
+#endif
+
+    _OutputTarget[viewOrigin + dispatchThreadID.xy] = lerp(base, heat, a);
 }
\ No newline at end of file
@@ -0,0 +1,63 @@
+// Generated by Schema.py (python -m src.Schema), do not edit.
+
+#define VERTEX_DEPTH_BITS       24
+#define BIN_RECORD_SEGMENT_BITS 22
+#define BIN_RECORD_OFFSET_BITS  22
+#define BIN_RECORD_BIN_BITS     20
+
+#define BYTE_SIZE_STRAND_DATA 12
+struct StrandData
+{
+    float3 strandPositionOS;
+};
+
+#define BYTE_SIZE_STRAND_BOUNDS 24
+struct StrandBounds
+{
+    float3 positionMin;
+    float3 extent;
+};
+
+#define BYTE_SIZE_STRAND_INSTANCE 64
+struct StrandInstance
+{
+    // Rows of the object to world transform.
+    float4 objectToWorld0;
+    float4 objectToWorld1;
+    float4 objectToWorld2;
+    // First rendered strand.
+    uint   strandOffset;
+    // Rendered strands, fewer than the groom at lower LODs.
+    uint   strandCount;
+    // Step between the groom strands rendered.
+    uint   strandStride;
+    uint   padding;
+};
+
+#define BYTE_SIZE_VERTEX_OUTPUT 12
+struct VertexOutput
+{
+    // Post perspective divide, see PackVertexOutput.
+    float2 positionNDC;
+    uint   depthFlags;
+};
+
+#define BYTE_SIZE_SEGMENT_DATA 8
+struct SegmentData
+{
+    // Vertex Indices
+    uint vi0;
+    uint vi1;
+};
+
+#define BYTE_SIZE_SEGMENT_RECORD 8
+
+#define BYTE_SIZE_BIN_RECORD 8
+
+#define BYTE_SIZE_FRAGMENT_DATA 24
+struct FragmentData
+{
+    float4 color;
+    float  depth;
+    uint   next;
+};
@@ -0,0 +1,89 @@
+#include "RasterCommon.hlsl"
+
+// Segment Compaction:
+// Builds a dense list of the segments (or curves, groups of 3 segments) that passed the segment setup, so the binning
+// stage only launches threads for them. The offsets are the inclusive prefix sum (see PrefixSum.py) of the flags.
+// ------------------------------------------------------------------
+
+cbuffer Constants : register(b0)
+{
+    float4 _Params;
+}
+
+#define _ElementCount       _Params.x
+#define _SegmentsPerElement _Params.y
+
+// Compaction Flags:
+// 1 for every element with at least one segment that passed the clipper.
+// ------------------------------------------------------------------
+
+// Input
+ByteAddressBuffer _SegmentOutputBuffer : register(t0);
+
+// Output
+RWBuffer<uint> _CompactionFlags : register(u0);
+
+[numthreads(NUM_LANE_PER_WAVE, 1, 1)]
+void BuildCompactionFlags(uint3 dispatchThreadID : SV_DispatchThreadID)
+{
+    const uint i = dispatchThreadID.x;
+
+    if (i >= _ElementCount)
+        return;
+
+    uint flag = 0;
+
+    for (uint k = 0; k < (uint)_SegmentsPerElement; ++k)
+        flag |= _SegmentOutputBuffer.Load(4 * (i * (uint)_SegmentsPerElement + k));
+
+    _CompactionFlags[i] = flag != 0;
+}
+
+// Compact Segments:
+// Scatter the first segment index of every flagged element to its offset.
+// ------------------------------------------------------------------
+
+// Input
+Buffer<uint> _CompactionFlags0   : register(t0);
+Buffer<uint> _CompactionOffsets0 : register(t1);
+
+// Output
+RWByteAddressBuffer _CompactedSegments : register(u0);
+
+[numthreads(NUM_LANE_PER_WAVE, 1, 1)]
+void CompactSegments(uint3 dispatchThreadID : SV_DispatchThreadID)
+{
+    const uint i = dispatchThreadID.x;
+
+    if (i >= _ElementCount)
+        return;
+
+    if (!_CompactionFlags0[i])
+        return;
+
+    // Inclusive offsets, the first flagged element ends at 1.
+    _CompactedSegments.Store(4 * (_CompactionOffsets0[i] - 1), i * (uint)_SegmentsPerElement);
+}
+
+// Compaction Args:
+// Transforms the indirect binning dispatch width based on the compacted segment count.
+// ------------------------------------------------------------------
+
+// Input
+Buffer<uint> _CompactionOffsets1 : register(t0);
+
+// Output
+RWBuffer<uint4> _CompactionArgs : register(u0);
+
+[numthreads(1, 1, 1)]
+void BuildCompactionArgs()
+{
+    const uint compactedCount = _ElementCount > 0 ? _CompactionOffsets1[(uint)_ElementCount - 1] : 0;
+
+    _CompactionArgs[0] = uint4(
+        (compactedCount + NUM_LANE_PER_WAVE - 1) / NUM_LANE_PER_WAVE, // Dim X
+        1,                                                            // Dim Y
+        1,                                                            // Dim Z
+        0
+    );
+}
@@ -8,17 +8,19 @@ cbuffer ConstantsSetup : register(b0)
 }
 
 StructuredBuffer<VertexOutput> _VertexBuffer     : register(t0);
-ByteAddressBuffer              _IndexBuffer      : register(t1);
 
 // Outputs
 // ----------------------------------------
 RWByteAddressBuffer               _SegmentCountBuffer  : register(u0);
-RWStructuredBuffer<SegmentRecord> _SegmentRecordBuffer : register(u1);
+RWByteAddressBuffer               _SegmentRecordBuffer : register(u1);
 RWStructuredBuffer<SegmentData>   _SegmentDataBuffer   : register(u2);
 
 // Defines
 // ----------------------------------------
-#define _SegmentCount _Params.x
+#define _SegmentCount        _Params.x
+#define _VertexCount         _Params.y
+#define _SegmentStride       _Params.z
+#define _StrandParticleCount _Params.w
 
 // Defines
 // ----------------------------------------
@@ -55,6 +57,15 @@ uint ComputeOutCode(float x, float y)
 	return code;
 }
 
+// Procedural indices, the segments are laid out strand by strand and segment k of a strand joins its vertices k and k + 1.
+uint2 ComputeSegmentIndices(uint i)
+{
+    const uint perStrandSegmentCount = (uint)_StrandParticleCount - 1;
+    const uint vi0 = (i / perStrandSegmentCount) * (uint)_StrandParticleCount + (i % perStrandSegmentCount);
+
+    return uint2(vi0, vi0 + 1);
+}
+
 // TODO: Investigate "Improvement in the Cohen-Sutherland Line Segment Clipping Algorithm" for something faster.
 bool ClipSegmentCohenSutherland(inout float x0, inout float y0, inout float x1, inout float y1)
 {
@@ -119,53 +130,68 @@ void SegmentSetup(uint3 dispatchThreadID : SV_DispatchThreadID)
 {
     const uint i = dispatchThreadID.x;
 
+#if MULTI_VIEW
+    // One dispatch row per view. Segments are stored with a per-view stride that is a multiple of 3,
+    // so that curves never straddle two views. The padding is culled.
+    const uint view = dispatchThreadID.y;
+    const uint o = view * (uint)_SegmentStride + i;
+    const uint vertexOffset = view * (uint)_VertexCount;
+
+    if (i >= _SegmentStride)
+        return;
+
+    if (i >= _SegmentCount)
+    {
+        CULL_SEGMENT(o);
+        return;
+    }
+#else
+    const uint o = i;
+    const uint vertexOffset = 0;
+
     if (i >= _SegmentCount)
         return;
+#endif
 
-    // Load Indices
-    const uint2 segmentIndices = _IndexBuffer.Load2(8 * i);
+    // Compute Indices
+    const uint2 segmentIndices = ComputeSegmentIndices(i) + vertexOffset;
 
     // Load Vertices
     VertexOutput o_v0 = _VertexBuffer[segmentIndices.x];
     VertexOutput o_v1 = _VertexBuffer[segmentIndices.y];
 
-    float4 v[2] = {
-        o_v0.positionCS,
-        o_v1.positionCS
-    };
-
     // Fast rejection for segments behind the near clipping plane.
-    if (0 < v[0].w || 0 < v[1].w)
+    if (IsVertexCulled(o_v0) || IsVertexCulled(o_v1))
     {
-        CULL_SEGMENT(i);
+        CULL_SEGMENT(o);
         return;
     }
 
-    // Perspective divide. Homogenous -> NDC.
-    float3 p0 = v[0].xyz / v[0].w;
-    float3 p1 = v[1].xyz / v[1].w;
+    // The vertex setup did the perspective divide.
+    float2 p0 = o_v0.positionNDC;
+    float2 p1 = o_v1.positionNDC;
 
     // Cohen-Sutherland algorithm to perform line segment clipping in NDC space. TODO: Do it in clip space.
     if(!ClipSegmentCohenSutherland(p0.x, p0.y, p1.x, p1.y))
     {
-        CULL_SEGMENT(i);
+        CULL_SEGMENT(o);
         return;
     }
 
     // NOTE: This should potentially expand to greater than one if we tessellate the segment.
-    PASS_SEGMENT(i);
+    PASS_SEGMENT(o);
 
     SegmentRecord record;
     {
         record.v0 = p0.xy;
         record.v1 = p1.xy;
     }
-    _SegmentRecordBuffer[i] = record;
+    StoreSegmentRecord(_SegmentRecordBuffer, o, record);
 
     SegmentData data;
     {
         data.vi0 = segmentIndices.x;
         data.vi1 = segmentIndices.y;
     }
-    _SegmentDataBuffer[i] = data;
+    _SegmentDataBuffer[o] = data;
 }
\ No newline at end of file
@@ -6,10 +6,47 @@ cbuffer Constants : register(b0)
     float4x4 _MatrixV;
     float4x4 _MatrixP;
     float4   _VertexParams;
+    float4   _StrandAllocation;
 }
 
-StructuredBuffer<VertexInput> _VertexInputBuffer : register(t0);
-StructuredBuffer<StrandData>  _StrandDataBuffer  : register(t1);
+// Quantized positions are stored relative to the bounds of their strand cluster (see StrandDeviceMemory.py).
+#if POSITION_FORMAT_UNORM16 || POSITION_FORMAT_UNORM10
+#define QUANTIZED_POSITIONS 1
+#endif
+
+#if QUANTIZED_POSITIONS
+ByteAddressBuffer             _StrandDataBuffer  : register(t0);
+#else
+StructuredBuffer<StrandData>  _StrandDataBuffer  : register(t0);
+#endif
+
+#if MULTI_VIEW
+// View and projection matrix of every view, interleaved.
+StructuredBuffer<float4x4>    _ViewMatrices      : register(t1);
+#endif
+
+// The optional inputs follow the strand data (and the view matrices), in order.
+#if MULTI_VIEW && QUANTIZED_POSITIONS
+#define REGISTER_STRAND_BOUNDS    t2
+#define REGISTER_STRAND_INSTANCES t3
+#elif MULTI_VIEW
+#define REGISTER_STRAND_INSTANCES t2
+#elif QUANTIZED_POSITIONS
+#define REGISTER_STRAND_BOUNDS    t1
+#define REGISTER_STRAND_INSTANCES t2
+#else
+#define REGISTER_STRAND_INSTANCES t1
+#endif
+
+#if QUANTIZED_POSITIONS
+// Bounds of every cluster of _StrandsPerCluster strands.
+StructuredBuffer<StrandBounds> _StrandBoundsBuffer : register(REGISTER_STRAND_BOUNDS);
+#endif
+
+#if INSTANCED
+// Placed copies of the strands, sorted by their first rendered strand (see StrandScene.py).
+StructuredBuffer<StrandInstance> _StrandInstanceBuffer : register(REGISTER_STRAND_INSTANCES);
+#endif
 
 // Outputs
 RWStructuredBuffer<VertexOutput> _VertexOutputBuffer : register(u0);
@@ -17,6 +54,10 @@ RWStructuredBuffer<VertexOutput> _VertexOutputBuffer : register(u0);
 // Defines
 #define _StrandCount           _VertexParams.x
 #define _StrandParticleCount   _VertexParams.y
+#define _StrandsPerCluster     _VertexParams.z
+#define _InstanceCount         _VertexParams.w
+#define _StrandPositionOffset  _StrandAllocation.x
+#define _StrandClusterOffset   _StrandAllocation.y
 #define _PerStrandVertexCount  _StrandParticleCount
 #define _PerStrandSegmentCount (_PerStrandVertexCount - 1)
 #define _PerStrandIndexCount   (_PerStrandSegmentCount * 2)
@@ -37,26 +78,85 @@ RWStructuredBuffer<VertexOutput> _VertexOutputBuffer : register(u0);
         const uint strandParticleEnd = strandParticleBegin + strandParticleStride * _StrandParticleCount;
 #endif
 
-// Basically a vertex shader.
-VertexOutput Vert(VertexInput input)
+// The pools hold several assets, i and strandIndex are relative to the active one (see StrandDeviceMemory.py).
+float3 LoadStrandPosition(uint i, uint strandIndex)
 {
+    i += (uint)_StrandPositionOffset;
+
+#if QUANTIZED_POSITIONS
+#if POSITION_FORMAT_UNORM16
+    // Tightly packed 3 x 16 bit, the position starts on a word or a half word.
+    const uint offset = 6 * i;
+    const uint2 words = _StrandDataBuffer.Load2(offset & ~3);
+
+    const uint3 q = (offset & 2) ? uint3(words.x >> 16, words.y & 0xffff, words.y >> 16) :
+                                   uint3(words.x & 0xffff, words.x >> 16, words.y & 0xffff);
+    const float3 normalized = q / 65535.0;
+#else
+    const uint word = _StrandDataBuffer.Load(4 * i);
+    const float3 normalized = uint3(word & 0x3ff, (word >> 10) & 0x3ff, (word >> 20) & 0x3ff) / 1023.0;
+#endif
+
+    const StrandBounds bounds = _StrandBoundsBuffer[(uint)_StrandClusterOffset + strandIndex / (uint)_StrandsPerCluster];
+    return bounds.positionMin + bounds.extent * normalized;
+#else
+    return _StrandDataBuffer[i].strandPositionOS;
+#endif
+}
+
+#if INSTANCED
+// The instance a rendered strand belongs to, the last one starting at or before it.
+StrandInstance FindStrandInstance(uint renderedStrandIndex)
+{
+    uint lo = 0;
+    uint hi = (uint)_InstanceCount - 1;
+
+    while (lo < hi)
+    {
+        const uint mid = (lo + hi + 1) / 2;
+
+        if (_StrandInstanceBuffer[mid].strandOffset <= renderedStrandIndex)
+            lo = mid;
+        else
+            hi = mid - 1;
+    }
+
+    return _StrandInstanceBuffer[lo];
+}
+#endif
+
+// Basically a vertex shader. The vertices are laid out strand by strand, the vertex ID is the dispatch index.
+VertexOutput Vert(uint vertexID, float4x4 matrixV, float4x4 matrixP)
+{
+    const uint renderedStrandIndex = vertexID / (uint)_StrandParticleCount;
+
+#if INSTANCED
+    // Instances render an evenly spaced subset of the strands at lower LODs.
+    const StrandInstance instance = FindStrandInstance(renderedStrandIndex);
+    const uint sourceStrandIndex = (renderedStrandIndex - instance.strandOffset) * instance.strandStride;
+#else
+    const uint sourceStrandIndex = renderedStrandIndex;
+#endif
+
     // Setup the strand iterator.
-    uint linearParticleIndex = input.vertexID;
-    DECLARE_STRAND(input.vertexID / _StrandParticleCount)
+    DECLARE_STRAND(sourceStrandIndex)
+    const uint strandVertexIndex = vertexID % (uint)_StrandParticleCount;
 
     // Compute the strand index.
-    const uint i = strandParticleBegin + (linearParticleIndex % _StrandParticleCount) * strandParticleStride;
+    const uint i = strandParticleBegin + strandVertexIndex * strandParticleStride;
 
     // Read the strand data.
-    const StrandData strandData = _StrandDataBuffer[i];
+    float3 positionOS = LoadStrandPosition(i, strandIndex);
 
-    // Compute the output vertex data.
-    VertexOutput output;
-    {
-        output.positionCS = mul(mul(float4(strandData.strandPositionOS, 1.0), _MatrixV), _MatrixP);
-        output.texCoord   = input.vertexUV;
-    }
-    return output;
+#if INSTANCED
+    const float4 position = float4(positionOS, 1.0);
+    positionOS = float3(dot(instance.objectToWorld0, position),
+                        dot(instance.objectToWorld1, position),
+                        dot(instance.objectToWorld2, position));
+#endif
+
+    // Compute the output vertex data, the UV is procedural (see ComputeVertexUV).
+    return PackVertexOutput(mul(mul(float4(positionOS, 1.0), matrixV), matrixP));
 }
 
 [numthreads(NUM_LANE_PER_WAVE, 1, 1)]
@@ -67,9 +167,12 @@ void VertexSetup(uint3 dispatchThreadID : SV_DispatchThreadID)
     if (i >= _VertexCount)
         return;
 
-    // Read the input vertex.
-    const VertexInput input = _VertexInputBuffer[i];
-
     // Invoke the vertex shader and write back to output.
-    _VertexOutputBuffer[i] = Vert(input);
+#if MULTI_VIEW
+    // One dispatch row per view, the outputs of each view are stored contiguously.
+    const uint view = dispatchThreadID.y;
+    _VertexOutputBuffer[view * (uint)_VertexCount + i] = Vert(i, _ViewMatrices[2 * view + 0], _ViewMatrices[2 * view + 1]);
+#else
+    _VertexOutputBuffer[i] = Vert(i, _MatrixV, _MatrixP);
+#endif
 }
\ No newline at end of file
@@ -28,12 +28,12 @@ void BuildWorkQueueArgs()
 // ------------------------------------------------------------------
 
 // Input
-Buffer<uint>                _BinOffsets         : register(t0);
-StructuredBuffer<BinRecord> _BinRecords         : register(t1);
-Buffer<uint>                _BinRecordsCounter1 : register(t2);
+Buffer<uint>      _BinOffsets         : register(t0);
+ByteAddressBuffer _BinRecords         : register(t1);
+Buffer<uint>      _BinRecordsCounter1 : register(t2);
 
 // Output
-RWBuffer<uint> _WorkQueue : register(u0);
+RWByteAddressBuffer _WorkQueue : register(u0);
 
 // Local
 groupshared uint g_RecordCount;
@@ -52,11 +52,11 @@ void BuildWorkQueue(uint3 dispatchThreadID : SV_DispatchThreadID, uint groupInde
         return;
 
     // Load the record for this index.
-    const BinRecord record = _BinRecords[i];
+    const BinRecord record = LoadBinRecord(_BinRecords, i);
 
     // Compute the new index into the work queue.
     uint workQueueIndex = _BinOffsets[record.binIndex] + record.binOffset;
 
     // Write the bin segment into the work queue at this index.
-    _WorkQueue[workQueueIndex] = record.segmentIndex;
+    _WorkQueue.Store(4 * workQueueIndex, record.segmentIndex);
 }
\ No newline at end of file
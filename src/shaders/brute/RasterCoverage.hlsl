@@ -8,14 +8,14 @@ cbuffer Constants : register(b0)
 };
 
 ByteAddressBuffer               _SegmentOutputBuffer : register(t0);
-StructuredBuffer<SegmentRecord> _SegmentRecordBuffer : register(t1);
+ByteAddressBuffer               _SegmentRecordBuffer : register(t1);
 StructuredBuffer<SegmentData>   _SegmentDataBuffer   : register(t2);
 StructuredBuffer<VertexOutput>  _VertexOutputBuffer  : register(t3);
 
 // Output
 RWBuffer<uint>                   _CounterBuffer      : register(u0);
 RWByteAddressBuffer              _HeadPointerBuffer  : register(u1);
-RWStructuredBuffer<FragmentData> _FragmentDataBuffer : register(u2);
+RWByteAddressBuffer              _FragmentDataBuffer : register(u2);
 
 // Defines
 #define _SegmentCount _Params0.x
@@ -39,7 +39,7 @@ void RasterCoverage(uint3 dti : SV_DispatchThreadID)
     if (segmentCount < 1)
         return;
 
-    const SegmentRecord segment = _SegmentRecordBuffer[i];
+    const SegmentRecord segment = LoadSegmentRecord(_SegmentRecordBuffer, i);
     const SegmentData   data    = _SegmentDataBuffer[i];
 
     // Load Vertex Data
@@ -72,8 +72,8 @@ void RasterCoverage(uint3 dti : SV_DispatchThreadID)
             float2 center = aabbTile.Center();
 
             // We want the barycentric between the original segment vertices, not the clipped vertices.
-            float2 p0 = v0.positionCS.xy / v0.positionCS.w;
-            float2 p1 = v1.positionCS.xy / v1.positionCS.w;
+            float2 p0 = v0.positionNDC;
+            float2 p1 = v1.positionNDC;
 
             float t;
             const float distance = DistanceToSegmentAndTValue(center, p0, p1, t);
@@ -89,9 +89,7 @@ void RasterCoverage(uint3 dti : SV_DispatchThreadID)
                 1 - t
             );
 
-            const float z = INTERP(b, v0.positionCS.z, v1.positionCS.z);
-            const float w = INTERP(b, v0.positionCS.w, v1.positionCS.w);
-            const float d = z / w;
+            const float d = INTERP(b, GetVertexDepth(v0), GetVertexDepth(v1));
 
             uint fragmentCount;
             InterlockedAdd(_CounterBuffer[0], 1, fragmentCount);
@@ -106,7 +104,7 @@ void RasterCoverage(uint3 dti : SV_DispatchThreadID)
                 data.depth = d;
                 data.next  = next;
             }
-            _FragmentDataBuffer[fragmentCount] = data;
+            StoreFragmentData(_FragmentDataBuffer, fragmentCount, data);
         }
     }
 }
\ No newline at end of file
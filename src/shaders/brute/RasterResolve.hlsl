@@ -14,7 +14,7 @@ cbuffer Constants : register(b0)
 };
 
 ByteAddressBuffer              _HeadPointerBuffer  : register(t0);
-StructuredBuffer<FragmentData> _FragmentDataBuffer : register(t1);
+ByteAddressBuffer              _FragmentDataBuffer : register(t1);
 
 // Outputs
 RWTexture2D<float4> _OutputTarget : register(u0);
@@ -82,7 +82,7 @@ void RasterResolve(uint3 dispatchThreadID : SV_DispatchThreadID)
     // Walk down the per-pixel fragment linked list and sort the blending array.
     while (next != LAST_NODE)
     {
-         const FragmentData node = _FragmentDataBuffer[next];
+         const FragmentData node = LoadFragmentData(_FragmentDataBuffer, next);
          {
             Fragment f;
             f.a = node.color.rgb * node.color.a;
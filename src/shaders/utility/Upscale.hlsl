@@ -0,0 +1,34 @@
+cbuffer UpscaleConstants : register(b0)
+{
+    float4 _Params;
+}
+
+Texture2D<float4>   _Source       : register(t0);
+RWTexture2D<float4> _OutputTarget : register(u0);
+
+#define _SourceSize _Params.xy
+#define _TargetSize _Params.zw
+
+// Bilinear upscale of the top left _SourceSize region of the source into the target. Filtered by hand, since the
+// region only covers part of the source texture.
+[numthreads(8, 8, 1)]
+void Upscale(uint2 dispatchThreadID : SV_DispatchThreadID)
+{
+    if (any(dispatchThreadID >= (uint2)_TargetSize))
+        return;
+
+    const float2 p = ((float2)dispatchThreadID + 0.5) * (_SourceSize / _TargetSize) - 0.5;
+    const float2 i = floor(p);
+    const float2 f = p - i;
+
+    const int2 maxCoord = (int2)_SourceSize - 1;
+    const int2 p0 = clamp((int2)i,     0, maxCoord);
+    const int2 p1 = clamp((int2)i + 1, 0, maxCoord);
+
+    const float4 a = _Source.Load(int3(p0.x, p0.y, 0));
+    const float4 b = _Source.Load(int3(p1.x, p0.y, 0));
+    const float4 c = _Source.Load(int3(p0.x, p1.y, 0));
+    const float4 d = _Source.Load(int3(p1.x, p1.y, 0));
+
+    _OutputTarget[dispatchThreadID] = lerp(lerp(a, b, f.x), lerp(c, d, f.x), f.y);
+}